@@ -0,0 +1,140 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, buang tanda baca dan spasi berlebih."""
+    question = re.sub(r"[^\w\s]", " ", question.lower())
+    return " ".join(question.split())
+
+
+class _Entry:
+    __slots__ = ("answer", "embedding", "doc_ids", "cost", "expires_at")
+
+    def __init__(self, answer, embedding, doc_ids, cost, expires_at):
+        self.answer = answer
+        self.embedding = embedding
+        self.doc_ids = doc_ids
+        self.cost = cost
+        self.expires_at = expires_at
+
+
+class AnswerCache:
+    """
+    Cache jawaban /chat/ask dua level:
+    1. exact  - pertanyaan yang sama setelah dinormalisasi (tanpa embedding/RPC/LLM)
+    2. semantic - embedding pertanyaan baru dalam cosine threshold dari pertanyaan
+       yang sudah di-cache DAN dokumen hasil retrieval sama (tanpa LLM)
+
+    LRU + TTL, dan seluruh isi cache dibuang jika version knowledge base berubah.
+    """
+
+    def __init__(self, maxsize=256, ttl=300.0, threshold=0.95):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._entries = OrderedDict()
+        self._kb_version = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, kb_version):
+        # Dipanggil dengan self._lock
+        if kb_version != self._kb_version:
+            self._entries.clear()
+            self._kb_version = kb_version
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            del self._entries[key]
+            return None
+        return entry
+
+    def get_exact(self, question: str, kb_version: str):
+        key = normalize_question(question)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(kb_version)
+            entry = self._live(key, now)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            self.saved_seconds += entry.cost
+            return entry.answer
+
+    def get_semantic(self, question: str, embedding, doc_ids, kb_version: str, spent: float = 0.0):
+        """
+        Cari entry dengan cosine similarity >= threshold dan doc set yang sama.
+        spent = waktu yang sudah terpakai untuk embedding + retrieval request ini.
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        doc_ids = frozenset(doc_ids)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(kb_version)
+            candidates = [
+                (key, e) for key, e in list(self._entries.items())
+                if self._live(key, now) is not None and e.doc_ids == doc_ids
+            ]
+            if candidates:
+                matrix = np.stack([e.embedding for _, e in candidates])
+                similarity = matrix @ query
+                best = int(np.argmax(similarity))
+                if similarity[best] >= self.threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    # Simpan juga sebagai exact entry untuk pertanyaan ini
+                    self._store(normalize_question(question), entry.answer, query, doc_ids, entry.cost, now)
+                    self.semantic_hits += 1
+                    self.saved_seconds += max(entry.cost - spent, 0.0)
+                    return entry.answer
+            self.misses += 1
+            return None
+
+    def put(self, question: str, embedding, doc_ids, answer: str, kb_version: str, cost: float):
+        """Simpan jawaban baru; cost = total waktu menghasilkan jawaban (detik)."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        with self._lock:
+            self._check_version(kb_version)
+            self._store(normalize_question(question), answer, vector, frozenset(doc_ids), cost, time.monotonic())
+
+    def _store(self, key, answer, vector, doc_ids, cost, now):
+        # Dipanggil dengan self._lock
+        self._entries[key] = _Entry(answer, vector, doc_ids, cost, now + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "kb_version": self._kb_version,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+answer_cache = AnswerCache(
+    maxsize=int(os.getenv("ANSWER_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "300")),
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+)
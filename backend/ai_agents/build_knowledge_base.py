@@ -1,11 +1,19 @@
+import argparse
+import hashlib
+import json
 import os
+import sys
 from supabase import create_client, Client
 import google.generativeai as genai
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
 
 load_dotenv()
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from controllers.ticket_controller import price_features
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -14,6 +22,25 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 genai.configure(api_key=GEMINI_API_KEY)
 embedding_model = 'models/text-embedding-004'
 
+# Kolom transactions yang dipakai builder (bukan select("*")). Hanya kolom
+# yang memang ditulis build_transaction_row; kolom yang tidak ada membuat
+# PostgREST menolak seluruh query (400)
+TRANSACTION_COLUMNS = (
+    "id, created_at, fraud_flag, anomaly_label_id, anomaly_score, total_amount, num_tickets, "
+    "station_from_id, station_to_id, device_fingerprint, ip_address, is_refund, "
+    "is_popular_route, ticket_class_id, discount_amount, "
+    "booking_channels(name), payment_methods(name)"
+)
+PAGE_SIZE = 1000
+EMBED_BATCH_SIZE = 100
+# created_at disimpan UTC; peak hour / weekend / malam dihitung di waktu lokal
+LOCAL_TZ = ZoneInfo(os.getenv("KB_TIMEZONE", "Asia/Jakarta"))
+
+# State build terakhir (watermark + agregat) untuk mode incremental
+STATE_PATH = os.getenv(
+    "KB_STATE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "kb_build_state.json")
+)
+
 def create_embedding(text: str):
     """Buat embedding dari text menggunakan Gemini"""
     result = genai.embed_content(
@@ -23,21 +50,212 @@ def create_embedding(text: str):
     )
     return result['embedding']
 
-def build_anomaly_overview():
+def create_embeddings(texts: list):
+    """Embedding banyak dokumen sekaligus (batch per EMBED_BATCH_SIZE)"""
+    embeddings = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        result = genai.embed_content(
+            model=embedding_model,
+            content=texts[start:start + EMBED_BATCH_SIZE],
+            task_type="retrieval_document"
+        )
+        embeddings.extend(result['embedding'])
+    return embeddings
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+# ---------------- Fetch ---------------- #
+
+def fetch_transactions(after=None, page_size: int = PAGE_SIZE):
+    """
+    Generator transaksi urut (created_at, id), halaman per halaman (keyset).
+    after = (created_at, id) watermark; hanya transaksi sesudahnya yang diambil.
+    """
+    while True:
+        query = supabase.table("transactions").select(TRANSACTION_COLUMNS)
+        if after is not None:
+            created_at, txn_id = after
+            query = query.or_(
+                f'created_at.gt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.gt.{txn_id})'
+            )
+        rows = query.order("created_at").order("id").limit(page_size).execute().data
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after = (rows[-1]["created_at"], rows[-1]["id"])
+
+def latest_update():
+    """updated_at terbaru di transactions (None jika tabel kosong)"""
+    rows = supabase.table("transactions").select("updated_at").order("updated_at", desc=True).limit(1).execute().data
+    return rows[0]["updated_at"] if rows else None
+
+def find_update_since(updated_at, created_before, page_size: int = PAGE_SIZE):
+    """
+    Id transaksi yang sudah diagregasi (created_at <= watermark) tapi berubah
+    sesudah updated_at, atau None. Row yang baru di-insert selama build
+    sebelumnya juga punya updated_at lebih baru; dibedakan dari update asli
+    karena updated_at == created_at.
+    """
+    after = None
+    while True:
+        query = (
+            supabase.table("transactions").select("id, created_at, updated_at")
+            .gt("updated_at", updated_at).lte("created_at", created_before)
+        )
+        if after is not None:
+            query = query.gt("id", after)
+        rows = query.order("id").limit(page_size).execute().data
+        for row in rows:
+            if row["updated_at"] != row["created_at"]:
+                return row["id"]
+        if len(rows) < page_size:
+            return None
+        after = rows[-1]["id"]
+
+def local_time(created_at: str) -> datetime:
+    t = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return t.astimezone(LOCAL_TZ)
+
+def fetch_label_severity() -> dict:
+    """Satu query anomaly_labels -> dict id: severity_level"""
+    labels = supabase.table("anomaly_labels").select("id, severity_level").execute()
+    return {label['id']: label.get('severity_level') for label in labels.data}
+
+# ---------------- Agregasi ---------------- #
+
+def _inc(counter: dict, key, by=1):
+    counter[key] = counter.get(key, 0) + by
+
+class TransactionAggregate:
+    """
+    Semua angka yang dibutuhkan builder, dihitung dalam satu pass atas transaksi.
+    Bisa disimpan ke / di-load dari state file sehingga build incremental
+    cukup menambahkan transaksi baru.
+    """
+
+    # high_markup / popular_route_anomaly hanya dari row yang menyimpan
+    # ticket_class_id / is_popular_route (row lama: NULL, tidak dihitung);
+    # peak/weekend/night dari created_at (waktu lokal, aturan sama dengan
+    # build_ticket_response)
+    COUNTERS = (
+        "total", "anomalies", "anomaly_score_count", "anomaly_score_sum", "anomaly_amount_count",
+        "anomaly_amount_sum", "normal_amount_count", "normal_amount_sum", "high_markup",
+        "bulk_buyers", "bulk_tickets", "popular_route_anomaly", "peak_anomalies",
+        "weekend_anomalies", "night_anomalies", "refund_anomalies",
+    )
+    EXTREMES = ("anomaly_score_min", "anomaly_score_max", "anomaly_amount_min", "anomaly_amount_max")
+    MAPS = (
+        "risk_levels", "channel_total", "channel_anomaly", "payment_total", "payment_anomaly",
+        "route_anomalies", "device_anomalies", "ip_anomalies",
+    )
+
+    def __init__(self):
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        for name in self.EXTREMES:
+            setattr(self, name, None)
+        for name in self.MAPS:
+            setattr(self, name, {})
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.COUNTERS + self.EXTREMES + self.MAPS}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        aggregate = cls()
+        for name, value in data.items():
+            setattr(aggregate, name, value)
+        return aggregate
+
+    def _extreme(self, name_min, name_max, value):
+        current_min, current_max = getattr(self, name_min), getattr(self, name_max)
+        setattr(self, name_min, value if current_min is None else min(current_min, value))
+        setattr(self, name_max, value if current_max is None else max(current_max, value))
+
+    def add(self, txn: dict, severity: dict):
+        is_anomaly = bool(txn.get('fraud_flag'))
+        self.total += 1
+
+        channel = (txn.get('booking_channels') or {}).get('name', 'Unknown')
+        payment = (txn.get('payment_methods') or {}).get('name', 'Unknown')
+        _inc(self.channel_total, channel)
+        _inc(self.payment_total, payment)
+
+        amount = txn.get('total_amount')
+        if not is_anomaly:
+            if amount is not None:
+                self.normal_amount_count += 1
+                self.normal_amount_sum += float(amount)
+            return
+
+        self.anomalies += 1
+        _inc(self.channel_anomaly, channel)
+        _inc(self.payment_anomaly, payment)
+
+        # Label severity lewat lookup dict, bukan satu query per transaksi
+        label_id = txn.get('anomaly_label_id')
+        if label_id in severity:
+            level = severity[label_id]
+            _inc(self.risk_levels, str(level) if level is not None else 'unknown')
+
+        if txn.get('anomaly_score') is not None:
+            score = float(txn['anomaly_score'])
+            self.anomaly_score_count += 1
+            self.anomaly_score_sum += score
+            self._extreme("anomaly_score_min", "anomaly_score_max", score)
+        if amount is not None:
+            amount = float(amount)
+            self.anomaly_amount_count += 1
+            self.anomaly_amount_sum += amount
+            self._extreme("anomaly_amount_min", "anomaly_amount_max", amount)
+
+        if txn.get('ticket_class_id') is not None and amount is not None:
+            discount = float(txn.get('discount_amount') or 0)
+            if price_features(txn['ticket_class_id'], amount, discount)['is_price_above_max']:
+                self.high_markup += 1
+        if txn.get('is_popular_route'):
+            self.popular_route_anomaly += 1
+        if txn.get('created_at'):
+            t = local_time(txn['created_at'])
+            if t.hour in (7, 8, 17, 18):
+                self.peak_anomalies += 1
+            if t.weekday() >= 5:
+                self.weekend_anomalies += 1
+            if t.hour < 6 or t.hour >= 22:
+                self.night_anomalies += 1
+
+        if (txn.get('num_tickets') or 0) > 5:
+            self.bulk_buyers += 1
+            self.bulk_tickets += txn.get('num_tickets') or 0
+        if txn.get('station_from_id') and txn.get('station_to_id'):
+            _inc(self.route_anomalies, f"{txn['station_from_id']}->{txn['station_to_id']}")
+        if txn.get('device_fingerprint'):
+            _inc(self.device_anomalies, txn['device_fingerprint'])
+        if txn.get('ip_address'):
+            _inc(self.ip_anomalies, txn['ip_address'])
+        if txn.get('is_refund'):
+            self.refund_anomalies += 1
+
+# ---------------- Builders ---------------- #
+
+def build_anomaly_overview(agg: TransactionAggregate):
     """Overview anomali dan fraud detection"""
     print("🔍 Building anomaly detection overview...")
     
-    transactions = supabase.table("transactions").select("*").execute()
     documents = []
     
-    total = len(transactions.data)
-    anomaly_txns = [t for t in transactions.data if t.get('fraud_flag')]
-    normal_txns = [t for t in transactions.data if not t.get('fraud_flag')]
+    total = agg.total
+    anomalies = agg.anomalies
+    normal = total - anomalies
     
     # Overview utama
     overview = f"""Sistem monitoring anomaly pembelian tiket memantau {total} transaksi. 
-Terdapat {len(anomaly_txns)} transaksi terdeteksi anomali ({len(anomaly_txns)/total*100:.1f}%) dan 
-{len(normal_txns)} transaksi normal ({len(normal_txns)/total*100:.1f}%). 
+Terdapat {anomalies} transaksi terdeteksi anomali ({anomalies/max(total, 1)*100:.1f}%) dan 
+{normal} transaksi normal ({normal/max(total, 1)*100:.1f}%). 
 Sistem menggunakan risk score 0-100 dengan kategori: Low (<30), Medium (30-60), High (60-80), dan Critical (>80)."""
     
     documents.append({
@@ -45,36 +263,24 @@ Sistem menggunakan risk score 0-100 dengan kategori: Low (<30), Medium (30-60),
         "metadata": {
             "type": "anomaly_overview",
             "total_transactions": total,
-            "total_anomalies": len(anomaly_txns)
+            "total_anomalies": anomalies
         }
     })
     
     print(f"   ✓ Created {len(documents)} overview documents")
     return documents
 
-def build_risk_analysis():
+def build_risk_analysis(agg: TransactionAggregate):
     """Analisis risk score dan risk level"""
     print("⚠️  Analyzing risk scores and levels...")
     
-    transactions = supabase.table("transactions").select("*").execute()
-    anomaly_txns = [t for t in transactions.data if t.get('fraud_flag')]
     documents = []
     
-    if not anomaly_txns:
+    if not agg.anomalies:
         return documents
     
     # Analisis risk level distribution
-    risk_levels = {}
-    for txn in anomaly_txns:
-        labels = supabase.table("anomaly_labels").select("*").eq(
-            "id", txn.get('anomaly_label_id')
-        ).execute()
-        
-        if labels.data:
-            level = labels.data[0].get('severity_level', 'unknown')
-            # Convert ke string jika integer
-            level_str = str(level) if level is not None else 'unknown'
-            risk_levels[level_str] = risk_levels.get(level_str, 0) + 1
+    risk_levels = agg.risk_levels
     
     if risk_levels:
         # Map severity level untuk display
@@ -85,7 +291,7 @@ def build_risk_analysis():
         }
         
         risk_text = f"""Distribusi risk level pada anomali: {', '.join([
-            f'{severity_map.get(k.lower(), k)}: {v} transaksi ({v/len(anomaly_txns)*100:.1f}%)' 
+            f'{severity_map.get(k.lower(), k)}: {v} transaksi ({v/agg.anomalies*100:.1f}%)' 
             for k, v in sorted(risk_levels.items(), key=lambda x: x[1], reverse=True)
         ])}. Transaksi dengan risk level Critical memerlukan investigasi segera."""
         
@@ -98,11 +304,10 @@ def build_risk_analysis():
         })
     
     # Analisis anomaly score distribution
-    scores = [float(t.get('anomaly_score', 0)) for t in anomaly_txns if t.get('anomaly_score') is not None]
-    if scores:
-        avg_score = sum(scores) / len(scores)
-        max_score = max(scores)
-        min_score = min(scores)
+    if agg.anomaly_score_count:
+        avg_score = agg.anomaly_score_sum / agg.anomaly_score_count
+        max_score = agg.anomaly_score_max
+        min_score = agg.anomaly_score_min
         
         score_text = f"""Anomaly score berkisar dari {min_score:.2f} hingga {max_score:.2f} dengan rata-rata {avg_score:.2f}. 
 Score mendekati -1 menunjukkan outlier kuat, sedangkan mendekati 1 menunjukkan data normal. 
@@ -121,26 +326,18 @@ Semakin rendah score, semakin tinggi tingkat keparahan anomali."""
     print(f"   ✓ Created {len(documents)} risk analysis documents")
     return documents
 
-def build_price_anomaly_analysis():
+def build_price_anomaly_analysis(agg: TransactionAggregate):
     """Analisis anomali berdasarkan pricing (final_price, base_price, discount)"""
     print("💰 Analyzing price-based anomalies...")
     
-    transactions = supabase.table("transactions").select("*").execute()
-    anomaly_txns = [t for t in transactions.data if t.get('fraud_flag')]
-    normal_txns = [t for t in transactions.data if not t.get('fraud_flag')]
     documents = []
     
-    # Total amount comparison - filter None values
-    anomaly_amounts = [float(t.get('total_amount')) for t in anomaly_txns 
-                       if t.get('total_amount') is not None]
-    normal_amounts = [float(t.get('total_amount')) for t in normal_txns 
-                      if t.get('total_amount') is not None]
-    
-    if anomaly_amounts and normal_amounts:
-        avg_anomaly = sum(anomaly_amounts) / len(anomaly_amounts)
-        avg_normal = sum(normal_amounts) / len(normal_amounts)
-        max_anomaly = max(anomaly_amounts)
-        min_anomaly = min(anomaly_amounts)
+    # Total amount comparison (nilai None tidak dihitung)
+    if agg.anomaly_amount_count and agg.normal_amount_count:
+        avg_anomaly = agg.anomaly_amount_sum / agg.anomaly_amount_count
+        avg_normal = agg.normal_amount_sum / agg.normal_amount_count
+        max_anomaly = agg.anomaly_amount_max
+        min_anomaly = agg.anomaly_amount_min
         
         price_text = f"""Analisis harga transaksi anomali: rata-rata Rp {avg_anomaly:,.0f} vs normal Rp {avg_normal:,.0f}. 
 Range harga anomali dari Rp {min_anomaly:,.0f} hingga Rp {max_anomaly:,.0f}. """
@@ -160,38 +357,31 @@ Range harga anomali dari Rp {min_anomaly:,.0f} hingga Rp {max_anomaly:,.0f}. """
         })
     
     # Price markup analysis
-    high_markup = [t for t in anomaly_txns if t.get('price_category') == 3]  # Assuming 3 = high price
-    if high_markup:
-        markup_text = f"""{len(high_markup)} transaksi anomali terdeteksi dengan harga di atas kategori maksimal (is_price_above_max). 
+    if agg.high_markup:
+        markup_text = f"""{agg.high_markup} transaksi anomali terdeteksi dengan harga di atas kategori maksimal (is_price_above_max). 
 Ini bisa mengindikasikan price manipulation atau unusual pricing conditions."""
         
         documents.append({
             "content": markup_text,
             "metadata": {
                 "type": "price_markup_anomaly",
-                "count": len(high_markup)
+                "count": agg.high_markup
             }
         })
     
     print(f"   ✓ Created {len(documents)} price anomaly documents")
     return documents
 
-def build_scalper_detection_analysis():
+def build_scalper_detection_analysis(agg: TransactionAggregate):
     """Analisis perilaku scalper"""
     print("🎫 Analyzing scalper behavior patterns...")
     
-    transactions = supabase.table("transactions").select(
-        "*, booking_channels(name)"
-    ).execute()
     documents = []
     
     # Transaksi dengan multiple tickets (potential scalper)
-    bulk_buyers = [t for t in transactions.data 
-                   if (t.get('num_tickets') or 0) > 5 and t.get('fraud_flag')]
-    
-    if bulk_buyers:
-        avg_tickets = sum([(t.get('num_tickets') or 0) for t in bulk_buyers]) / len(bulk_buyers)
-        scalper_text = f"""Terdeteksi {len(bulk_buyers)} transaksi dengan pembelian bulk tickets (>5 tiket) yang flagged sebagai anomali. 
+    if agg.bulk_buyers:
+        avg_tickets = agg.bulk_tickets / agg.bulk_buyers
+        scalper_text = f"""Terdeteksi {agg.bulk_buyers} transaksi dengan pembelian bulk tickets (>5 tiket) yang flagged sebagai anomali. 
 Rata-rata {avg_tickets:.1f} tiket per transaksi. Pola ini mengindikasikan potential scalper behavior. 
 Scalper biasanya membeli tiket dalam jumlah besar untuk dijual kembali dengan harga lebih tinggi."""
         
@@ -199,17 +389,14 @@ Scalper biasanya membeli tiket dalam jumlah besar untuk dijual kembali dengan ha
             "content": scalper_text,
             "metadata": {
                 "type": "scalper_detection",
-                "count": len(bulk_buyers),
+                "count": agg.bulk_buyers,
                 "avg_tickets": avg_tickets
             }
         })
     
     # Analisis popular route dengan anomaly
-    popular_route_anomaly = [t for t in transactions.data 
-                             if t.get('is_popular_route') and t.get('fraud_flag')]
-    
-    if popular_route_anomaly:
-        route_text = f"""{len(popular_route_anomaly)} anomali terjadi pada rute populer. 
+    if agg.popular_route_anomaly:
+        route_text = f"""{agg.popular_route_anomaly} anomali terjadi pada rute populer. 
 Rute populer sering menjadi target scalper karena tingginya demand. 
 Monitoring ketat diperlukan pada rute-rute ini terutama saat peak season."""
         
@@ -217,33 +404,22 @@ Monitoring ketat diperlukan pada rute-rute ini terutama saat peak season."""
             "content": route_text,
             "metadata": {
                 "type": "popular_route_anomaly",
-                "count": len(popular_route_anomaly)
+                "count": agg.popular_route_anomaly
             }
         })
     
     print(f"   ✓ Created {len(documents)} scalper analysis documents")
     return documents
 
-def build_channel_payment_anomaly():
+def build_channel_payment_anomaly(agg: TransactionAggregate):
     """Analisis anomali per booking channel dan payment method"""
     print("📱 Analyzing channel and payment anomalies...")
     
-    transactions = supabase.table("transactions").select(
-        "*, booking_channels(name), payment_methods(name)"
-    ).execute()
-    anomaly_txns = [t for t in transactions.data if t.get('fraud_flag')]
     documents = []
     
     # Channel analysis
-    channel_stats = {}
-    total_per_channel = {}
-    
-    for txn in transactions.data:
-        channel = txn.get('booking_channels', {}).get('name', 'Unknown') if txn.get('booking_channels') else 'Unknown'
-        total_per_channel[channel] = total_per_channel.get(channel, 0) + 1
-        
-        if txn.get('fraud_flag'):
-            channel_stats[channel] = channel_stats.get(channel, 0) + 1
+    channel_stats = agg.channel_anomaly
+    total_per_channel = agg.channel_total
     
     if channel_stats:
         channel_text = "Anomali per booking channel: " + ", ".join([
@@ -260,15 +436,8 @@ def build_channel_payment_anomaly():
         })
     
     # Payment method analysis
-    payment_stats = {}
-    total_per_payment = {}
-    
-    for txn in transactions.data:
-        payment = txn.get('payment_methods', {}).get('name', 'Unknown') if txn.get('payment_methods') else 'Unknown'
-        total_per_payment[payment] = total_per_payment.get(payment, 0) + 1
-        
-        if txn.get('fraud_flag'):
-            payment_stats[payment] = payment_stats.get(payment, 0) + 1
+    payment_stats = agg.payment_anomaly
+    total_per_payment = agg.payment_total
     
     if payment_stats:
         payment_text = "Anomali per metode pembayaran: " + ", ".join([
@@ -287,22 +456,14 @@ def build_channel_payment_anomaly():
     print(f"   ✓ Created {len(documents)} channel/payment documents")
     return documents
 
-def build_route_station_anomaly():
+def build_route_station_anomaly(agg: TransactionAggregate):
     """Analisis anomali berdasarkan rute dan stasiun"""
     print("🚉 Analyzing route and station anomalies...")
     
-    transactions = supabase.table("transactions").select("*").execute()
-    anomaly_txns = [t for t in transactions.data if t.get('fraud_flag')]
     documents = []
     
     # Station pair analysis
-    route_anomalies = {}
-    for txn in anomaly_txns:
-        from_id = txn.get('station_from_id')
-        to_id = txn.get('station_to_id')
-        if from_id and to_id:
-            route = f"{from_id}->{to_id}"
-            route_anomalies[route] = route_anomalies.get(route, 0) + 1
+    route_anomalies = agg.route_anomalies
     
     if route_anomalies:
         top_routes = sorted(route_anomalies.items(), key=lambda x: x[1], reverse=True)[:5]
@@ -321,75 +482,62 @@ def build_route_station_anomaly():
     print(f"   ✓ Created {len(documents)} route/station documents")
     return documents
 
-def build_temporal_anomaly():
+def build_temporal_anomaly(agg: TransactionAggregate):
     """Analisis anomali berdasarkan waktu (hour, day_of_week, is_weekend, is_peak_hour)"""
     print("⏰ Analyzing temporal anomaly patterns...")
     
-    transactions = supabase.table("transactions").select("*").execute()
-    anomaly_txns = [t for t in transactions.data if t.get('fraud_flag')]
     documents = []
     
     # Peak hour analysis
-    peak_anomalies = [t for t in anomaly_txns if t.get('is_peak_hour')]
-    if peak_anomalies:
-        peak_text = f"""{len(peak_anomalies)} anomali terjadi pada peak hour ({len(peak_anomalies)/len(anomaly_txns)*100:.1f}% dari total anomali). 
+    if agg.peak_anomalies:
+        peak_text = f"""{agg.peak_anomalies} anomali terjadi pada peak hour ({agg.peak_anomalies/agg.anomalies*100:.1f}% dari total anomali). 
 Peak hour adalah waktu tersibuk dengan demand tinggi, sering menjadi target scalper."""
         
         documents.append({
             "content": peak_text,
             "metadata": {
                 "type": "peak_hour_anomaly",
-                "count": len(peak_anomalies)
+                "count": agg.peak_anomalies
             }
         })
     
     # Weekend analysis
-    weekend_anomalies = [t for t in anomaly_txns if t.get('is_weekend')]
-    if weekend_anomalies:
-        weekend_text = f"""{len(weekend_anomalies)} anomali terjadi pada weekend ({len(weekend_anomalies)/len(anomaly_txns)*100:.1f}% dari total anomali). 
+    if agg.weekend_anomalies:
+        weekend_text = f"""{agg.weekend_anomalies} anomali terjadi pada weekend ({agg.weekend_anomalies/agg.anomalies*100:.1f}% dari total anomali). 
 Weekend biasanya memiliki pattern berbeda dari weekday."""
         
         documents.append({
             "content": weekend_text,
             "metadata": {
                 "type": "weekend_anomaly",
-                "count": len(weekend_anomalies)
+                "count": agg.weekend_anomalies
             }
         })
     
     # Night time analysis
-    night_anomalies = [t for t in anomaly_txns if t.get('is_night')]
-    if night_anomalies:
-        night_text = f"""{len(night_anomalies)} anomali terjadi pada malam hari ({len(night_anomalies)/len(anomaly_txns)*100:.1f}% dari total anomali). 
+    if agg.night_anomalies:
+        night_text = f"""{agg.night_anomalies} anomali terjadi pada malam hari ({agg.night_anomalies/agg.anomalies*100:.1f}% dari total anomali). 
 Transaksi malam hari yang unusual perlu monitoring extra."""
         
         documents.append({
             "content": night_text,
             "metadata": {
                 "type": "night_time_anomaly",
-                "count": len(night_anomalies)
+                "count": agg.night_anomalies
             }
         })
     
     print(f"   ✓ Created {len(documents)} temporal documents")
     return documents
 
-def build_device_fingerprint_anomaly():
+def build_device_fingerprint_anomaly(agg: TransactionAggregate):
     """Analisis anomali berdasarkan device fingerprint dan IP"""
     print("🖥️  Analyzing device and IP anomalies...")
     
-    transactions = supabase.table("transactions").select("*").execute()
-    anomaly_txns = [t for t in transactions.data if t.get('fraud_flag')]
     documents = []
     
     # Duplicate device fingerprint
-    device_count = {}
-    for txn in anomaly_txns:
-        device = txn.get('device_hash')
-        if device:
-            device_count[device] = device_count.get(device, 0) + 1
-    
-    suspicious_devices = {k: v for k, v in device_count.items() if v > 3}
+    suspicious_devices = {k: v for k, v in agg.device_anomalies.items() if v > 3}
     if suspicious_devices:
         device_text = f"""{len(suspicious_devices)} device terdeteksi melakukan multiple transaksi anomali (>3 transaksi). 
 Ini mengindikasikan potential automated bot atau systematic fraud."""
@@ -403,13 +551,7 @@ Ini mengindikasikan potential automated bot atau systematic fraud."""
         })
     
     # IP hash analysis
-    ip_count = {}
-    for txn in anomaly_txns:
-        ip = txn.get('ip_hash')
-        if ip:
-            ip_count[ip] = ip_count.get(ip, 0) + 1
-    
-    suspicious_ips = {k: v for k, v in ip_count.items() if v > 3}
+    suspicious_ips = {k: v for k, v in agg.ip_anomalies.items() if v > 3}
     if suspicious_ips:
         ip_text = f"""{len(suspicious_ips)} IP address terdeteksi melakukan multiple transaksi anomali (>3 transaksi). 
 Perlu dicek apakah ini dari VPN, proxy, atau bot network."""
@@ -425,18 +567,14 @@ Perlu dicek apakah ini dari VPN, proxy, atau bot network."""
     print(f"   ✓ Created {len(documents)} device/IP documents")
     return documents
 
-def build_refund_anomaly():
+def build_refund_anomaly(agg: TransactionAggregate):
     """Analisis anomali pada transaksi refund"""
     print("↩️  Analyzing refund anomalies...")
     
-    transactions = supabase.table("transactions").select("*").execute()
     documents = []
     
-    refund_anomalies = [t for t in transactions.data 
-                        if t.get('is_refund') and t.get('fraud_flag')]
-    
-    if refund_anomalies:
-        refund_text = f"""{len(refund_anomalies)} transaksi refund terdeteksi sebagai anomali. 
+    if agg.refund_anomalies:
+        refund_text = f"""{agg.refund_anomalies} transaksi refund terdeteksi sebagai anomali. 
 Pattern refund yang unusual bisa mengindikasikan refund fraud atau policy abuse. 
 Perlu investigasi apakah ada pattern pembelian-refund berulang dari user yang sama."""
         
@@ -444,7 +582,7 @@ Perlu investigasi apakah ada pattern pembelian-refund berulang dari user yang sa
             "content": refund_text,
             "metadata": {
                 "type": "refund_anomaly",
-                "count": len(refund_anomalies)
+                "count": agg.refund_anomalies
             }
         })
     
@@ -465,7 +603,7 @@ Cek detail transaksi, verifikasi dengan user jika perlu, dan lakukan tindakan pr
 Transaksi ini sangat berbeda dari pattern normal dan perlu investigasi mendalam.""",
         
         """Scalper detection: Waspadai pembelian bulk tickets (>10 tiket) dalam waktu singkat, 
-terutama pada rute populer dan peak hour. Check device_hash dan ip_hash untuk detect bot.""",
+terutama pada rute populer dan peak hour. Check device_fingerprint dan ip_address untuk detect bot.""",
         
         """Price anomaly: Transaksi dengan price_markup_ratio tinggi atau is_price_above_max 
 perlu dicek apakah ada pricing error atau manipulation.""",
@@ -495,57 +633,141 @@ Ini bisa mengindikasikan organized fraud attempts."""
     print(f"   ✓ Created {len(documents)} guideline documents")
     return documents
 
-def store_knowledge_base():
-    """Simpan semua knowledge ke tabel rag_documents"""
+# ---------------- State & store ---------------- #
+
+def load_state():
+    if not os.path.exists(STATE_PATH):
+        return None
+    with open(STATE_PATH) as f:
+        return json.load(f)
+
+def save_state(watermark, updated_at, aggregate: TransactionAggregate):
+    tmp_path = STATE_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({
+            "watermark": watermark,
+            "updated_at": updated_at,
+            "aggregate": aggregate.to_dict(),
+            "built_at": datetime.utcnow().isoformat(),
+        }, f)
+    os.replace(tmp_path, STATE_PATH)
+
+def upsert_documents(all_docs: list):
+    """
+    Simpan dokumen ke rag_documents dengan key content_hash:
+    dokumen yang isinya tidak berubah tidak di-embed ulang, dokumen baru
+    di-embed per batch dan di-upsert sekaligus, dokumen builder lama yang
+    sudah tidak dihasilkan lagi dihapus (tidak ada duplikat antar rebuild).
+    """
+    docs_by_hash = {content_hash(doc['content']): doc for doc in all_docs}
+
+    existing = supabase.table("rag_documents").select("content_hash").not_.is_("content_hash", "null").execute()
+    existing_hashes = {row['content_hash'] for row in existing.data}
+
+    new_hashes = [h for h in docs_by_hash if h not in existing_hashes]
+    stale_hashes = [h for h in existing_hashes if h not in docs_by_hash]
+
+    print(f"   ✓ {len(docs_by_hash) - len(new_hashes)} unchanged, {len(new_hashes)} new, {len(stale_hashes)} stale")
+
+    if new_hashes:
+        embeddings = create_embeddings([docs_by_hash[h]['content'] for h in new_hashes])
+        rows = [
+            {
+                "content": docs_by_hash[h]['content'],
+                "embedding": embedding,
+                "metadata": docs_by_hash[h]['metadata'],
+                "content_hash": h,
+            }
+            for h, embedding in zip(new_hashes, embeddings)
+        ]
+        supabase.table("rag_documents").upsert(rows, on_conflict="content_hash").execute()
+
+    if stale_hashes:
+        supabase.table("rag_documents").delete().in_("content_hash", stale_hashes).execute()
+
+    return len(new_hashes), len(stale_hashes)
+
+def store_knowledge_base(incremental: bool = False):
+    """
+    Build knowledge base dan simpan ke tabel rag_documents.
+    incremental=True: hanya transaksi sesudah watermark build terakhir yang diambil,
+    agregat sebelumnya di-load dari STATE_PATH. Jika ada transaksi lama yang
+    berubah sejak build itu (updated_at, mis. refund atau rescoring), agregat
+    tidak bisa dikoreksi per row dan build otomatis menjadi full rebuild.
+    """
     print("\n" + "="*70)
     print("🔨 BUILDING ANOMALY MONITORING KNOWLEDGE BASE")
     print("="*70 + "\n")
     
+    # Diambil sebelum scan: update yang terjadi selama build terdeteksi build berikutnya
+    updated_at = latest_update()
+    state = load_state() if incremental else None
+    if state and state.get('watermark') and not state.get('updated_at'):
+        print("⚠️  State build lama tanpa updated_at, full rebuild")
+        state = None
+    if state and state.get('watermark'):
+        changed = find_update_since(state['updated_at'], state['watermark'][0])
+        if changed:
+            print(f"⚠️  Transaksi {changed} berubah sejak build terakhir, full rebuild")
+            state = None
+    if state:
+        aggregate = TransactionAggregate.from_dict(state['aggregate'])
+        watermark = tuple(state['watermark']) if state['watermark'] else None
+        print(f"📌 Incremental build sejak {watermark[0] if watermark else 'awal'}")
+    else:
+        aggregate = TransactionAggregate()
+        watermark = None
+    
+    # Satu pass atas transaksi (paginated), label via lookup dict
+    severity = fetch_label_severity()
+    new_rows = 0
+    for txn in fetch_transactions(after=watermark):
+        aggregate.add(txn, severity)
+        watermark = (txn['created_at'], txn['id'])
+        new_rows += 1
+    print(f"📥 Processed {new_rows} transactions ({aggregate.total} total)\n")
+    
     all_docs = []
-    all_docs.extend(build_anomaly_overview())
-    all_docs.extend(build_risk_analysis())
-    all_docs.extend(build_price_anomaly_analysis())
-    all_docs.extend(build_scalper_detection_analysis())
-    all_docs.extend(build_channel_payment_anomaly())
-    all_docs.extend(build_route_station_anomaly())
-    all_docs.extend(build_temporal_anomaly())
-    all_docs.extend(build_device_fingerprint_anomaly())
-    all_docs.extend(build_refund_anomaly())
+    all_docs.extend(build_anomaly_overview(aggregate))
+    all_docs.extend(build_risk_analysis(aggregate))
+    all_docs.extend(build_price_anomaly_analysis(aggregate))
+    all_docs.extend(build_scalper_detection_analysis(aggregate))
+    all_docs.extend(build_channel_payment_anomaly(aggregate))
+    all_docs.extend(build_route_station_anomaly(aggregate))
+    all_docs.extend(build_temporal_anomaly(aggregate))
+    all_docs.extend(build_device_fingerprint_anomaly(aggregate))
+    all_docs.extend(build_refund_anomaly(aggregate))
     all_docs.extend(build_monitoring_guidelines())
     
-    print(f"\n📦 Total documents to store: {len(all_docs)}")
-    print("⏳ Creating embeddings and storing...\n")
+    print(f"\n📦 Total documents: {len(all_docs)}")
+    print("⏳ Embedding new documents and storing...\n")
     
-    for i, doc in enumerate(all_docs, 1):
-        print(f"   [{i}/{len(all_docs)}] {doc['content'][:70]}...")
-        
-        embedding = create_embedding(doc['content'])
-        
-        data = {
-            "content": doc['content'],
-            "embedding": embedding,
-            "metadata": doc['metadata']
-        }
-        
-        supabase.table("rag_documents").insert(data).execute()
+    stored, removed = upsert_documents(all_docs)
+    save_state(watermark, updated_at, aggregate)
     
     print("\n" + "="*70)
     print(f"✅ Anomaly monitoring knowledge base built successfully!")
-    print(f"✅ Stored {len(all_docs)} documents to database")
+    print(f"✅ Stored {stored} new documents, removed {removed} outdated documents")
     print("="*70 + "\n")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build anomaly monitoring knowledge base")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Hanya proses transaksi baru sejak build terakhir")
+    parser.add_argument("--yes", action="store_true", help="Tanpa konfirmasi")
+    args = parser.parse_args()
     try:
-        print("\n⚠️  WARNING: This will add new documents to rag_documents table")
-        print("   If you want to rebuild from scratch, delete old data first:")
-        print("   SQL: DELETE FROM rag_documents WHERE metadata->>'type' LIKE '%anomaly%';\n")
+        print("\n⚠️  rag_documents membutuhkan kolom content_hash (unique), sekali saja:")
+        print("   SQL: ALTER TABLE rag_documents ADD COLUMN IF NOT EXISTS content_hash text UNIQUE;")
+        print("   Dokumen lama tanpa content_hash (build versi sebelumnya) bisa dihapus:")
+        print("   SQL: DELETE FROM rag_documents WHERE content_hash IS NULL AND metadata->>'type' LIKE '%anomaly%';\n")
         
-        confirm = input("Continue? (y/n): ")
+        confirm = "y" if args.yes else input("Continue? (y/n): ")
         if confirm.lower() == 'y':
-            store_knowledge_base()
+            store_knowledge_base(incremental=args.incremental)
         else:
             print("❌ Cancelled")
     except Exception as e:
         print(f"\n❌ Error: {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
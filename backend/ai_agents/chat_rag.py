@@ -1,8 +1,20 @@
+import asyncio
 import os
+import sys
+import time
 from supabase import create_client, Client
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+# Agar bisa dijalankan langsung (python ai_agents/chat_rag.py) maupun dari main.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.stats_service import transaction_stats
+from services.metrics import StageTrace, stage_metrics
+from ai_agents.answer_cache import answer_cache
+from ai_agents.kb_version import KnowledgeBaseVersion
+from ai_agents.vector_index import LocalVectorIndex
+from ai_agents.markdown_stream import MarkdownStreamCleaner
+
 load_dotenv()
 
 # Konfigurasi
@@ -17,6 +29,20 @@ genai.configure(api_key=GEMINI_API_KEY)
 model = genai.GenerativeModel('gemini-2.0-flash-exp')
 embedding_model = 'models/text-embedding-004'
 
+# Version stamp knowledge base, untuk invalidasi cache jawaban
+kb_version = KnowledgeBaseVersion(supabase, ttl=float(os.getenv("KB_VERSION_TTL", "30")))
+
+# Retrieval: "rpc" (match_rag_documents di database) atau "local" (index NumPy in-process)
+RAG_BACKEND = os.getenv("RAG_BACKEND", "rpc")
+vector_index = LocalVectorIndex(supabase, kb_version, max_documents=int(os.getenv("RAG_LOCAL_MAX_DOCS", "5000")))
+
+# Timeout per stage (detik) untuk ask_async
+STAGE_TIMEOUTS = {
+    "retrieval": float(os.getenv("CHAT_RETRIEVAL_TIMEOUT", "10")),
+    "stats": float(os.getenv("CHAT_STATS_TIMEOUT", "2")),
+    "generation": float(os.getenv("CHAT_GENERATION_TIMEOUT", "60")),
+}
+
 def query_embedding(text: str):
     """Buat embedding untuk query"""
     result = genai.embed_content(
@@ -28,8 +54,18 @@ def query_embedding(text: str):
 
 def search_documents(query: str, top_k: int = 5):
     """Cari dokumen yang relevan dari knowledge base"""
-    query_emb = query_embedding(query)
-    
+    return match_documents(query_embedding(query), top_k)
+
+def match_documents(query_emb, top_k: int = 5):
+    """Cari dokumen yang relevan untuk embedding query"""
+    if RAG_BACKEND == "local":
+        try:
+            docs = vector_index.search(query_emb, top_k)
+            if docs is not None:
+                return docs
+        except Exception as e:
+            print(f"⚠️  Local vector index gagal, fallback ke RPC: {e}")
+
     result = supabase.rpc(
         'match_rag_documents',
         {
@@ -41,17 +77,10 @@ def search_documents(query: str, top_k: int = 5):
     return result.data if result.data else []
 
 def get_realtime_stats():
-    """Ambil statistik real-time dari database untuk konteks tambahan"""
+    """Ambil statistik real-time (counter in-memory, lihat services/stats_service.py)"""
     try:
-        # Total transaksi dan anomali
-        all_txn = supabase.table("transactions").select("id, fraud_flag", count="exact").execute()
-        anomaly_txn = supabase.table("transactions").select("id", count="exact").eq("fraud_flag", True).execute()
-        
-        total = all_txn.count if all_txn.count else 0
-        anomalies = anomaly_txn.count if anomaly_txn.count else 0
-        
-        stats = f"[Real-time Stats: Total {total} transaksi, {anomalies} anomali terdeteksi]"
-        return stats
+        stats = transaction_stats.snapshot()
+        return f"[Real-time Stats: Total {stats['total']} transaksi, {stats['anomaly']} anomali terdeteksi]"
     except:
         return ""
 
@@ -66,24 +95,13 @@ def clean_formatting(text: str):
     text = re.sub(r'^#+\s*', '', text, flags=re.MULTILINE)
     return text.strip()
 
-def ask(question: str):
-    """Tanya AI dengan RAG untuk monitoring anomaly"""
-    print(f"\n🔍 Mencari informasi relevan...")
-
-    # 1. Cari dokumen yang relevan dari knowledge base
-    docs = search_documents(question, top_k=5)
+NO_DOCUMENTS_ANSWER = "Maaf, saya tidak menemukan informasi yang relevan dalam knowledge base. Pastikan knowledge base sudah di-build dengan menjalankan build_anomaly_knowledge.py terlebih dahulu."
 
-    if not docs:
-        return "Maaf, saya tidak menemukan informasi yang relevan dalam knowledge base. Pastikan knowledge base sudah di-build dengan menjalankan build_anomaly_knowledge.py terlebih dahulu."
-
-    # 2. Buat context dari dokumen
+def build_prompt(question: str, docs: list, realtime_stats: str) -> str:
+    """Prompt yang di-optimize untuk monitoring anomaly"""
     context = "\n\n".join([f"- {doc['content']}" for doc in docs])
 
-    # 3. Ambil stats real-time jika diperlukan
-    realtime_stats = get_realtime_stats()
-
-    # 4. Generate jawaban dengan prompt yang di-optimize untuk monitoring anomaly
-    prompt = f"""Kamu adalah AI Assistant untuk sistem monitoring anomaly pembelian tiket kereta api.
+    return f"""Kamu adalah AI Assistant untuk sistem monitoring anomaly pembelian tiket kereta api.
 Tugas kamu adalah membantu admin memahami dan memonitor transaksi yang terdeteksi anomali atau fraud.
 
 KONTEKS DARI KNOWLEDGE BASE:
@@ -105,13 +123,205 @@ INSTRUKSI:
 
 JAWABAN:"""
 
-    print(f"💭 Memproses jawaban...")
-    response = model.generate_content(prompt)
+def ask(question: str):
+    """Tanya AI dengan RAG untuk monitoring anomaly"""
+    started = time.perf_counter()
+    with StageTrace("/chat/ask") as trace:
+        trace.model_version = model.model_name
+        version = kb_version.get()
+
+        # 0. Pertanyaan yang sama (setelah normalisasi) sudah pernah dijawab
+        cached = answer_cache.get_exact(question, version)
+        if cached is not None:
+            return cached
+
+        print(f"\n🔍 Mencari informasi relevan...")
+
+        # 1. Cari dokumen yang relevan dari knowledge base
+        trace.stage("embedding")
+        query_emb = query_embedding(question)
+        trace.stage("match")
+        docs = match_documents(query_emb, top_k=5)
+        trace.stage(None)
+
+        if not docs:
+            return NO_DOCUMENTS_ANSWER
+
+        # Pertanyaan mirip dengan dokumen hasil retrieval yang sama sudah pernah dijawab
+        doc_ids = [doc.get('id', doc['content']) for doc in docs]
+        cached = answer_cache.get_semantic(question, query_emb, doc_ids, version, time.perf_counter() - started)
+        if cached is not None:
+            return cached
+
+        # 2. Ambil stats real-time jika diperlukan
+        trace.stage("stats")
+        realtime_stats = get_realtime_stats()
+
+        # 3. Generate jawaban dengan prompt yang di-optimize untuk monitoring anomaly
+        prompt = build_prompt(question, docs, realtime_stats)
+
+        print(f"💭 Memproses jawaban...")
+        trace.stage("generation")
+        response = model.generate_content(prompt)
+        trace.stage(None)
+
+        # 4. Bersihkan formatting dari response
+        clean_response = clean_formatting(response.text)
+
+        answer_cache.put(question, query_emb, doc_ids, clean_response, version, time.perf_counter() - started)
+        return clean_response
+
+async def ask_async(question: str):
+    """
+    Versi async dari ask untuk FastAPI. Embedding + match dokumen berjalan
+    bersamaan dengan get_realtime_stats (tidak saling bergantung), masing-masing
+    dengan timeout sendiri: stats yang lambat hanya membuat konteks stats kosong.
+    Return (jawaban, metadata) dengan latency per stage dalam ms.
+    """
+    started = time.perf_counter()
+    stages = {}
+    meta = {"cached": None, "timed_out": [], "stages_ms": stages}
+
+    def elapsed_ms(since):
+        return round((time.perf_counter() - since) * 1000, 1)
+
+    def record_stages():
+        # Latency per stage ke /metrics (stage "total" = seluruh pertanyaan)
+        observed = [(stage, ms / 1000) for stage, ms in stages.items()]
+        observed.append(("total", time.perf_counter() - started))
+        stage_metrics.observe_many("/chat/ask", observed, model.model_name)
+
+    def finish(answer):
+        meta["total_ms"] = elapsed_ms(started)
+        record_stages()
+        return answer, meta
+
+    version = await asyncio.to_thread(kb_version.get)
+    cached = answer_cache.get_exact(question, version)
+    if cached is not None:
+        meta["cached"] = "exact"
+        return finish(cached)
+
+    async def retrieve():
+        t = time.perf_counter()
+        query_emb = await asyncio.to_thread(query_embedding, question)
+        stages["embedding"] = elapsed_ms(t)
+        t = time.perf_counter()
+        docs = await asyncio.to_thread(match_documents, query_emb, 5)
+        stages["match"] = elapsed_ms(t)
+        return query_emb, docs
+
+    async def stats():
+        t = time.perf_counter()
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(get_realtime_stats), STAGE_TIMEOUTS["stats"])
+        except asyncio.TimeoutError:
+            meta["timed_out"].append("stats")
+            return ""
+        finally:
+            stages["stats"] = elapsed_ms(t)
+
+    stats_task = asyncio.create_task(stats())
+    t = time.perf_counter()
+    try:
+        query_emb, docs = await asyncio.wait_for(retrieve(), STAGE_TIMEOUTS["retrieval"])
+    except asyncio.TimeoutError:
+        stats_task.cancel()
+        meta["timed_out"].append("retrieval")
+        stages["retrieval"] = elapsed_ms(t)
+        record_stages()
+        raise TimeoutError("Pencarian dokumen knowledge base timeout")
+    stages["retrieval"] = elapsed_ms(t)
+
+    if not docs:
+        stats_task.cancel()
+        return finish(NO_DOCUMENTS_ANSWER)
+
+    doc_ids = [doc.get('id', doc['content']) for doc in docs]
+    cached = answer_cache.get_semantic(question, query_emb, doc_ids, version, time.perf_counter() - started)
+    if cached is not None:
+        stats_task.cancel()
+        meta["cached"] = "semantic"
+        return finish(cached)
+
+    prompt = build_prompt(question, docs, await stats_task)
+
+    t = time.perf_counter()
+    try:
+        response = await asyncio.wait_for(asyncio.to_thread(model.generate_content, prompt), STAGE_TIMEOUTS["generation"])
+    except asyncio.TimeoutError:
+        meta["timed_out"].append("generation")
+        stages["generation"] = elapsed_ms(t)
+        record_stages()
+        raise TimeoutError("Generate jawaban timeout")
+    stages["generation"] = elapsed_ms(t)
 
-    # 5. Bersihkan formatting dari response
     clean_response = clean_formatting(response.text)
+    answer_cache.put(question, query_emb, doc_ids, clean_response, version, time.perf_counter() - started)
+    return finish(clean_response)
+
+def generate_stream(prompt: str):
+    """Generate jawaban dalam mode streaming, yield potongan teks dari model"""
+    for chunk in model.generate_content(prompt, stream=True):
+        if chunk.text:
+            yield chunk.text
+
+def ask_stream(question: str):
+    """
+    Versi streaming dari ask: yield event dict berurutan
+    retrieval (dokumen yang dipakai) -> token (teks bersih, incremental) -> done.
+    Formatting markdown dibersihkan per chunk dengan MarkdownStreamCleaner.
+    """
+    started = time.perf_counter()
+    version = kb_version.get()
+
+    cached = answer_cache.get_exact(question, version)
+    if cached is not None:
+        yield {"event": "token", "data": {"text": cached}}
+        yield {"event": "done", "data": {"cached": True, "latency_ms": round((time.perf_counter() - started) * 1000, 1)}}
+        return
+
+    query_emb = query_embedding(question)
+    docs = match_documents(query_emb, top_k=5)
+    yield {"event": "retrieval", "data": {"documents": [
+        {"id": doc.get('id'), "content": doc['content'], "metadata": doc.get('metadata'), "similarity": doc.get('similarity')}
+        for doc in docs
+    ]}}
 
-    return clean_response
+    if not docs:
+        yield {"event": "token", "data": {"text": NO_DOCUMENTS_ANSWER}}
+        yield {"event": "done", "data": {"cached": False, "latency_ms": round((time.perf_counter() - started) * 1000, 1)}}
+        return
+
+    doc_ids = [doc.get('id', doc['content']) for doc in docs]
+    cached = answer_cache.get_semantic(question, query_emb, doc_ids, version, time.perf_counter() - started)
+    if cached is not None:
+        yield {"event": "token", "data": {"text": cached}}
+        yield {"event": "done", "data": {"cached": True, "latency_ms": round((time.perf_counter() - started) * 1000, 1)}}
+        return
+
+    prompt = build_prompt(question, docs, get_realtime_stats())
+    cleaner = MarkdownStreamCleaner()
+    answer = []
+    first_token_ms = None
+    for chunk in generate_stream(prompt):
+        text = cleaner.feed(chunk)
+        if text:
+            if first_token_ms is None:
+                first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+            answer.append(text)
+            yield {"event": "token", "data": {"text": text}}
+    text = cleaner.flush()
+    if text:
+        answer.append(text)
+        yield {"event": "token", "data": {"text": text}}
+
+    answer_cache.put(question, query_emb, doc_ids, "".join(answer), version, time.perf_counter() - started)
+    yield {"event": "done", "data": {
+        "cached": False,
+        "first_token_ms": first_token_ms,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+    }}
 
 def show_welcome():
     """Tampilkan welcome message"""
@@ -174,32 +384,24 @@ def show_realtime_stats():
     print("="*80)
     
     try:
-        # Total transaksi
-        all_txn = supabase.table("transactions").select("id, fraud_flag, anomaly_score", count="exact").execute()
-        anomaly_txn = supabase.table("transactions").select("id", count="exact").eq("fraud_flag", True).execute()
-        
-        total = all_txn.count if all_txn.count else 0
-        anomalies = anomaly_txn.count if anomaly_txn.count else 0
-        normal = total - anomalies
+        stats = transaction_stats.snapshot()
+        total = stats['total']
+        anomalies = stats['anomaly']
+        normal = stats['normal']
         
         print(f"\n📈 Total Transaksi: {total:,}")
-        print(f"✅ Normal: {normal:,} ({normal/total*100:.1f}%)")
-        print(f"🚨 Anomali: {anomalies:,} ({anomalies/total*100:.1f}%)")
+        print(f"✅ Normal: {normal:,} ({normal/max(total, 1)*100:.1f}%)")
+        print(f"🚨 Anomali: {anomalies:,} ({anomalies/max(total, 1)*100:.1f}%)")
         
-        # Anomali labels (severity)
-        if anomalies > 0:
-            labels = supabase.table("anomaly_labels").select("severity_level", count="exact").execute()
-            
+        # Breakdown per risk level
+        if total > 0:
             print(f"\n⚠️  Breakdown Severity:")
-            severity_count = {}
-            for label in labels.data:
-                sev = label.get('severity_level', 'unknown')
-                severity_count[sev] = severity_count.get(sev, 0) + 1
-            
-            for sev, count in sorted(severity_count.items(), key=lambda x: x[1], reverse=True):
+            for sev, count in sorted(stats['severity'].items(), key=lambda x: x[1], reverse=True):
                 emoji = "🔴" if sev == "critical" else "🟠" if sev == "high" else "🟡" if sev == "medium" else "🟢"
                 print(f"   {emoji} {sev.capitalize()}: {count} transaksi")
         
+        if stats['age_seconds'] is not None:
+            print(f"\n🕒 Data per {stats['age_seconds']:.0f} detik lalu")
         print("\n" + "="*80)
         
     except Exception as e:
@@ -0,0 +1,41 @@
+import threading
+import time
+
+
+class KnowledgeBaseVersion:
+    """
+    Version stamp tabel rag_documents (jumlah row + id terbaru).
+    Di-cache selama ttl detik agar tidak menambah query di setiap request;
+    dipakai untuk meng-invalidate cache yang bergantung pada knowledge base.
+    """
+
+    def __init__(self, client, table="rag_documents", ttl=30.0):
+        self.client = client
+        self.table = table
+        self.ttl = ttl
+        self.count = None
+        self._stamp = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch(self) -> str:
+        count = self.client.table(self.table).select("id", count="exact", head=True).execute().count or 0
+        self.count = count
+        latest = self.client.table(self.table).select("id").order("id", desc=True).limit(1).execute().data
+        return f"{count}:{latest[0]['id'] if latest else 0}"
+
+    def get(self) -> str:
+        with self._lock:
+            if self._stamp is None or time.monotonic() - self._checked_at > self.ttl:
+                try:
+                    self._stamp = self._fetch()
+                except Exception:
+                    # Pakai stamp lama jika database sementara tidak bisa diakses
+                    self._stamp = self._stamp or "unknown"
+                self._checked_at = time.monotonic()
+            return self._stamp
+
+    def invalidate(self):
+        """Paksa cek ulang (mis. setelah knowledge base di-build di proses ini)."""
+        with self._lock:
+            self._checked_at = 0.0
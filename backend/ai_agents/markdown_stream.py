@@ -0,0 +1,92 @@
+import re
+
+BOLD = re.compile(r'\*\*([^*]+)\*\*')
+ITALIC = re.compile(r'\*([^*]+)\*')
+HEADER = re.compile(r'^#+\s*')
+
+
+def clean_line(line: str, at_line_start: bool = True) -> str:
+    """clean_formatting untuk satu baris (atau potongan baris)."""
+    line = BOLD.sub(r'\1', line)
+    line = ITALIC.sub(r'\1', line)
+    if at_line_start:
+        line = HEADER.sub('', line)
+    return line
+
+
+class MarkdownStreamCleaner:
+    """
+    Versi incremental dari clean_formatting untuk response streaming.
+
+    Teks di-emit secepat mungkin, kecuali bagian yang masih bisa berubah:
+    potongan baris mulai dari tanda * yang pasangannya belum pasti, dan awal baris
+    yang masih mungkin berupa header (#...). Hasil akhirnya sama untuk
+    pemotongan chunk apa pun; bold/italic diasumsikan tertutup di baris
+    yang sama.
+    """
+
+    def __init__(self):
+        self._line = ''
+        self._line_start = True
+        self._pending_ws = ''
+        self._started = False
+
+    def feed(self, chunk: str) -> str:
+        """Tambahkan chunk dari model, kembalikan teks bersih yang sudah pasti."""
+        self._line += chunk
+        out = []
+        while '\n' in self._line:
+            line, self._line = self._line.split('\n', 1)
+            out.append(clean_line(line, self._line_start) + '\n')
+            self._line_start = True
+
+        end = self._settled_prefix()
+        if end:
+            out.append(clean_line(self._line[:end], self._line_start))
+            self._line = self._line[end:]
+            self._line_start = False
+        return self._emit(''.join(out))
+
+    def flush(self) -> str:
+        """Emit sisa buffer di akhir stream (trailing whitespace dibuang seperti strip())."""
+        rest = clean_line(self._line, self._line_start) if self._line else ''
+        self._line = ''
+        out = self._emit(rest)
+        self._pending_ws = ''
+        return out
+
+    def _settled_prefix(self) -> int:
+        line = self._line
+        # Pasangan */** yang sudah tertutup boleh di-emit, selama tanda penutupnya
+        # tidak diikuti * lain (yang bisa mengubah pasangan regex-nya)
+        end, pos = len(line), 0
+        while True:
+            star = line.find('*', pos)
+            if star < 0:
+                break
+            match = BOLD.match(line, star) or ITALIC.match(line, star)
+            if match is None or match.end() >= len(line) or line[match.end()] == '*':
+                end = star
+                break
+            pos = match.end()
+
+        # Di awal baris: tahan selama prefix (setelah bold/italic dibuang)
+        # masih bisa jadi bagian dari header
+        if self._line_start:
+            prefix = ITALIC.sub(r'\1', BOLD.sub(r'\1', line[:end]))
+            header = HEADER.match(prefix)
+            if header is not None and header.end() == len(prefix):
+                return 0
+        return end
+
+    def _emit(self, text: str) -> str:
+        # Meniru strip(): whitespace di awal dibuang, di akhir ditahan sampai ada teks lagi
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ''
+            self._started = True
+        text = self._pending_ws + text
+        stripped = text.rstrip()
+        self._pending_ws = text[len(stripped):]
+        return stripped
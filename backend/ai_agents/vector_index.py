@@ -0,0 +1,85 @@
+import json
+import threading
+import numpy as np
+
+
+def parse_embedding(value):
+    """pgvector lewat PostgREST dikirim sebagai string '[0.1,0.2,...]'."""
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+class LocalVectorIndex:
+    """
+    Index vektor in-process untuk rag_documents.
+
+    Semua embedding di-load ke satu matrix float32 contiguous yang sudah
+    di-L2-normalize, sehingga top-k = satu matrix-vector product + argpartition.
+    Index di-load ulang saat version stamp knowledge base berubah. Jika corpus
+    lebih besar dari max_documents, search() mengembalikan None dan caller
+    memakai RPC match_rag_documents.
+    """
+
+    COLUMNS = "id,content,metadata,embedding"
+
+    def __init__(self, client, kb_version, table="rag_documents", max_documents=5000, page_size=1000):
+        self.client = client
+        self.kb_version = kb_version
+        self.table = table
+        self.max_documents = max_documents
+        self.page_size = page_size
+        self.version = None
+        self.matrix = None
+        self.documents = []
+        self._lock = threading.Lock()
+
+    def _fetch_rows(self):
+        rows, offset = [], 0
+        while True:
+            page = (
+                self.client.table(self.table).select(self.COLUMNS)
+                .order("id").range(offset, offset + self.page_size - 1).execute().data
+            )
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+            offset += self.page_size
+
+    def refresh(self, version: str):
+        """Load ulang seluruh embedding untuk version knowledge base ini."""
+        rows = self._fetch_rows()
+        documents = [{k: row.get(k) for k in ("id", "content", "metadata")} for row in rows]
+        if rows:
+            matrix = np.ascontiguousarray(np.stack([parse_embedding(row["embedding"]) for row in rows]))
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1, norms)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        self.matrix, self.documents, self.version = matrix, documents, version
+
+    def ensure_current(self) -> bool:
+        """True jika index siap dipakai untuk version knowledge base saat ini."""
+        version = self.kb_version.get()
+        if self.kb_version.count is not None and self.kb_version.count > self.max_documents:
+            return False
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    self.refresh(version)
+        return len(self.documents) <= self.max_documents
+
+    def search(self, query_emb, top_k: int = 5):
+        """Top-k dokumen dengan cosine similarity tertinggi, atau None (pakai RPC)."""
+        if not self.ensure_current():
+            return None
+        matrix, documents = self.matrix, self.documents
+        if not documents:
+            return []
+        query = np.asarray(query_emb, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        similarity = matrix @ query
+        k = min(top_k, len(documents))
+        top = np.argpartition(-similarity, k - 1)[:k]
+        top = top[np.argsort(-similarity[top])]
+        return [{**documents[i], "similarity": float(similarity[i])} for i in top]
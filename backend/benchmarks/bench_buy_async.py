@@ -0,0 +1,99 @@
+"""
+Load benchmark: sync buy_ticket (threadpool) vs async buy_ticket_async (pooled client).
+
+Menjalankan stand-in PostgREST lokal (latency tetap per request) lalu
+mengirim N request bersamaan ke kedua jalur.
+
+    cd backend && python -m benchmarks.bench_buy_async --concurrency 400 --latency-ms 100
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import time
+import uuid
+
+PORT = 54329
+os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{PORT}"
+os.environ.setdefault("SUPABASE_KEY", "benchmark-key")
+
+
+def serve_stand_in(latency: float):
+    """PostgREST palsu: insert mengembalikan row + id, select mengembalikan []"""
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+
+    async def table(request):
+        await asyncio.sleep(latency)
+        if request.method == "POST":
+            body = await request.json()
+            rows = body if isinstance(body, list) else [body]
+            return JSONResponse([{"id": str(uuid.uuid4()), **row} for row in rows], status_code=201)
+        return JSONResponse([])
+
+    app = Starlette(routes=[Route("/rest/v1/{table}", table, methods=["GET", "POST"])])
+    uvicorn.run(app, port=PORT, log_level="warning", backlog=4096)
+
+
+def start_stand_in_server(latency: float):
+    """Jalankan stand-in di proses terpisah agar tidak berebut GIL dengan client"""
+    process = multiprocessing.Process(target=serve_stand_in, args=(latency,), daemon=True)
+    process.start()
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", PORT), timeout=0.1).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+
+
+def make_ticket(i):
+    from schema.ticket_schema import TicketCreate
+
+    return TicketCreate(
+        transaction_id=uuid.uuid4(), user_id=f"bench-user-{i}", price=200000, num_tickets=2,
+        station_from_id=1, station_to_id=2, payment_method_id=1, booking_channel_id=1,
+        is_refund=0, transaction_time="2025-01-01T08:00:00", is_popular_route=1,
+        price_category=0, tickets_category=0, passenger_name=["A", "B"], seat_number=["1A", "1B"],
+    )
+
+
+async def run(concurrency: int):
+    from starlette.concurrency import run_in_threadpool
+    from config.supabase import init_async_supabase, close_async_supabase
+    from controllers import ticket_controller
+
+    tickets = [make_ticket(i) for i in range(concurrency)]
+    await init_async_supabase()
+
+    # Jalur lama: def route -> threadpool default FastAPI/anyio (40 thread)
+    start = time.perf_counter()
+    await asyncio.gather(*(run_in_threadpool(ticket_controller.buy_ticket, t) for t in tickets))
+    sync_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(*(ticket_controller.buy_ticket_async(t) for t in tickets))
+    async_elapsed = time.perf_counter() - start
+
+    await close_async_supabase()
+
+    print(f"{'mode':<10}{'total':>10}{'req/s':>10}")
+    print(f"{'sync':<10}{sync_elapsed:>9.2f}s{concurrency / sync_elapsed:>10.1f}")
+    print(f"{'async':<10}{async_elapsed:>9.2f}s{concurrency / async_elapsed:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=400)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    start_stand_in_server(args.latency_ms / 1000)
+    asyncio.run(run(args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
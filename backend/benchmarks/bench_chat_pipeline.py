@@ -0,0 +1,91 @@
+"""
+Benchmark pipeline chat: ask (berurutan) vs ask_async (retrieval || stats).
+
+Embedding, match dokumen, stats dan generate di-stub dengan sleep tetap
+sehingga yang diukur hanya critical path pipeline. Cache jawaban dikosongkan
+tiap pertanyaan. Skenario kedua mensimulasikan query stats yang macet.
+
+    cd backend && python -m benchmarks.bench_chat_pipeline --questions 10
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "benchmark-key")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-key")
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def install_stubs(chat_rag, embed_ms, match_ms, stats_ms, generate_ms):
+    def sleep_then(ms, value):
+        def stub(*args, **kwargs):
+            time.sleep(ms / 1000)
+            return value
+        return stub
+
+    chat_rag.kb_version.get = lambda: "benchmark"
+    chat_rag.query_embedding = sleep_then(embed_ms, [1.0, 0.0, 0.0])
+    chat_rag.match_documents = sleep_then(match_ms, [{"id": 1, "content": "dokumen benchmark"}])
+    chat_rag.get_realtime_stats = sleep_then(stats_ms, "[Real-time Stats: Total 100 transaksi, 5 anomali terdeteksi]")
+    chat_rag.model.generate_content = sleep_then(generate_ms, StubResponse("Jawaban **benchmark**"))
+    chat_rag.print = lambda *args, **kwargs: None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--embed-ms", type=float, default=150)
+    parser.add_argument("--match-ms", type=float, default=80)
+    parser.add_argument("--stats-ms", type=float, default=200)
+    parser.add_argument("--generate-ms", type=float, default=300)
+    parser.add_argument("--slow-stats-ms", type=float, default=5000)
+    args = parser.parse_args()
+
+    from ai_agents import chat_rag
+
+    def run_sync():
+        start = time.perf_counter()
+        for i in range(args.questions):
+            chat_rag.answer_cache.clear()
+            chat_rag.ask(f"pertanyaan {i}")
+        return (time.perf_counter() - start) * 1000 / args.questions, None
+
+    def run_async():
+        async def go():
+            metas = []
+            start = time.perf_counter()
+            for i in range(args.questions):
+                chat_rag.answer_cache.clear()
+                metas.append((await chat_rag.ask_async(f"pertanyaan {i}"))[1])
+            return (time.perf_counter() - start) * 1000 / args.questions, metas[-1]
+        return asyncio.run(go())
+
+    install_stubs(chat_rag, args.embed_ms, args.match_ms, args.stats_ms, args.generate_ms)
+    sync_ms, _ = run_sync()
+    async_ms, meta = run_async()
+
+    print(f"stub latency: embed {args.embed_ms:.0f}ms, match {args.match_ms:.0f}ms, "
+          f"stats {args.stats_ms:.0f}ms, generate {args.generate_ms:.0f}ms")
+    print(f"{'pipeline':<28}{'ms/question':>12}")
+    print(f"{'ask (sequential)':<28}{sync_ms:>12.1f}")
+    print(f"{'ask_async (concurrent)':<28}{async_ms:>12.1f}")
+    print(f"stages_ms: {meta['stages_ms']}")
+
+    # Stats macet: sequential ikut menunggu, async dipotong CHAT_STATS_TIMEOUT
+    install_stubs(chat_rag, args.embed_ms, args.match_ms, args.slow_stats_ms, args.generate_ms)
+    args.questions = 1
+    slow_sync_ms, _ = run_sync()
+    slow_async_ms, meta = run_async()
+    print(f"\nslow stats ({args.slow_stats_ms:.0f}ms, timeout {chat_rag.STAGE_TIMEOUTS['stats']:.1f}s)")
+    print(f"{'ask (sequential)':<28}{slow_sync_ms:>12.1f}")
+    print(f"{'ask_async (concurrent)':<28}{slow_async_ms:>12.1f}  timed_out={meta['timed_out']}")
+
+
+if __name__ == "__main__":
+    main()
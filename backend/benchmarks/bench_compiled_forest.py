@@ -0,0 +1,60 @@
+"""
+Micro-benchmark: ScalperDetectorAPI.predict dengan sklearn vs CompiledForest.
+
+    cd backend && python -m benchmarks.bench_compiled_forest
+"""
+import os
+import pickle
+import time
+import numpy as np
+from services.scalper_detector import ScalperDetectorAPI
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "canomaly.pkl")
+
+
+def load_detector(compiled: bool) -> ScalperDetectorAPI:
+    with open(MODEL_PATH, "rb") as f:
+        assets = pickle.load(f)
+    detector = ScalperDetectorAPI()
+    detector.model = assets['model']
+    detector.scaler = assets['scaler']
+    detector.feature_names = assets.get('feature_names', detector.feature_names)
+    if compiled:
+        detector.compile()
+    return detector
+
+
+def sample_rows(detector, n, seed=0):
+    rng = np.random.default_rng(seed)
+    mean, scale = detector.scaler.mean_, detector.scaler.scale_
+    return [dict(zip(detector.feature_names, mean + scale * rng.standard_normal(len(mean)))) for _ in range(n)]
+
+
+def timeit(fn, repeat):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    baseline = load_detector(compiled=False)
+    compiled = load_detector(compiled=True)
+
+    print(f"{'case':<20}{'sklearn':>14}{'compiled':>14}{'speedup':>10}")
+    for n, repeat in [(1, 200), (100, 50), (10_000, 3)]:
+        rows = sample_rows(baseline, n)
+        data = rows[0] if n == 1 else rows
+        t_base = timeit(lambda: baseline.predict(data), repeat)
+        t_comp = timeit(lambda: compiled.predict(data), repeat)
+        print(f"{'predict n=' + str(n):<20}{t_base * 1e3:>12.3f}ms{t_comp * 1e3:>12.3f}ms{t_base / t_comp:>9.1f}x")
+
+        X_scaled = baseline.scaler.transform(baseline.prepare_features(rows))
+        t_base = timeit(lambda: baseline.score_samples(X_scaled), repeat)
+        t_comp = timeit(lambda: compiled.score_samples(X_scaled), repeat)
+        print(f"{'score n=' + str(n):<20}{t_base * 1e3:>12.3f}ms{t_comp * 1e3:>12.3f}ms{t_base / t_comp:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark micro-batching: predict single-row langsung vs lewat MicroBatcher.
+
+N client thread masing-masing mengirim request single-row berturut-turut.
+Diukur throughput, latency p50/p99 per request dan CPU time per prediksi.
+
+    cd backend && python -m benchmarks.bench_micro_batching --clients 1 32 --requests 2000
+"""
+import argparse
+import threading
+import time
+import numpy as np
+from services.micro_batcher import MicroBatcher
+from services.model_registry import model_registry
+
+
+def make_rows(detector, n, seed=0):
+    rng = np.random.default_rng(seed)
+    names = detector.feature_names
+    return [dict(zip(names, rng.random(len(names)) * 10)) for _ in range(n)]
+
+
+def run(predict, rows, clients):
+    latencies = []
+    lock = threading.Lock()
+    per_client = len(rows) // clients
+
+    def client(chunk):
+        local = []
+        for row in chunk:
+            start = time.perf_counter()
+            predict(row)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(rows[i * per_client:(i + 1) * per_client],)) for i in range(clients)]
+    cpu, wall = time.process_time(), time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    ms = np.array(latencies) * 1000
+    return len(ms) / wall, np.percentile(ms, 50), np.percentile(ms, 99), cpu / len(ms) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 32])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    detector = model_registry.active.detector
+    rows = make_rows(detector, args.requests)
+    batcher = MicroBatcher(args.max_batch_size, args.max_wait_ms)
+    batcher.start()
+
+    def inline(row):
+        with model_registry.acquire() as model:
+            return model.detector.predict(row)
+
+    # Warm-up
+    run(inline, rows[:200], 1)
+    run(batcher.predict, rows[:200], 1)
+
+    print(f"{'clients':>8}{'backend':>9}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'cpu us/pred':>13}{'mean batch':>12}")
+    for clients in args.clients:
+        for name, predict in (("inline", inline), ("batch", batcher.predict)):
+            before_rows, before_batches = batcher.rows, batcher.batches
+            rps, p50, p99, cpu_us = run(predict, rows, clients)
+            batches = batcher.batches - before_batches
+            mean_batch = (batcher.rows - before_rows) / batches if batches else 1.0
+            print(f"{clients:>8}{name:>9}{rps:>10.0f}{p50:>9.2f}{p99:>9.2f}{cpu_us:>13.0f}{mean_batch:>12.1f}")
+    batcher.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark scoring in-thread vs process pool.
+
+N client thread masing-masing memproses request berturut-turut: parse JSON
++ validasi TicketCreate (pekerjaan request thread yang butuh GIL), lalu
+scoring satu row. Diukur throughput dan latency p50/p99 per request.
+Process pool hanya bisa lebih cepat jika ada core lebih dari satu.
+
+    cd backend && python -m benchmarks.bench_process_scoring --clients 1 4 16 --requests 2000
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+import numpy as np
+from benchmarks.bench_micro_batching import make_rows
+from schema.ticket_schema import TicketCreate
+from services.model_registry import model_registry
+from services.process_scorer import ProcessPoolScorer
+
+
+def make_payload():
+    return json.dumps({
+        "transaction_id": str(uuid.uuid4()), "user_id": "benchmark", "price": 150000, "num_tickets": 2,
+        "station_from_id": 1, "station_to_id": 2, "payment_method_id": 1, "booking_channel_id": 1,
+        "is_refund": 0, "transaction_time": "2025-01-01T08:00:00", "is_popular_route": 1,
+        "price_category": 0, "tickets_category": 0,
+        "passenger_name": ["a", "b"], "seat_number": ["S1", "S2"],
+    })
+
+
+def run(predict, payload, rows, clients):
+    latencies = []
+    lock = threading.Lock()
+    per_client = len(rows) // clients
+
+    def client(chunk):
+        local = []
+        for row in chunk:
+            start = time.perf_counter()
+            TicketCreate.model_validate_json(payload)
+            predict(row)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(rows[i * per_client:(i + 1) * per_client],)) for i in range(clients)]
+    wall = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall
+    ms = np.array(latencies) * 1000
+    return len(ms) / wall, np.percentile(ms, 50), np.percentile(ms, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    detector = model_registry.active.detector
+    rows = make_rows(detector, args.requests)
+    payload = make_payload()
+    scorer = ProcessPoolScorer(max_workers=args.workers)
+    scorer.start()
+
+    def in_thread(row):
+        with model_registry.acquire() as model:
+            return model.detector.predict(row)
+
+    # Warm-up
+    run(in_thread, payload, rows[:200], 1)
+    run(scorer.predict, payload, rows[:200], 1)
+
+    print(f"cpu cores: {os.cpu_count()}, pool workers: {args.workers}")
+    print(f"{'clients':>8}{'backend':>10}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for clients in args.clients:
+        for name, predict in (("thread", in_thread), ("process", scorer.predict)):
+            rps, p50, p99 = run(predict, payload, rows, clients)
+            print(f"{clients:>8}{name:>10}{rps:>10.0f}{p50:>9.2f}{p99:>9.2f}")
+    scorer.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark retrieval RAG: RPC match_rag_documents vs LocalVectorIndex in-process.
+
+Menjalankan stand-in PostgREST lokal (latency tetap per request) yang
+menyimpan corpus embedding sintetis dan menjawab RPC dengan cosine top-k,
+lalu mengukur latency per query kedua backend dan mengecek hasilnya sama.
+
+    cd backend && python -m benchmarks.bench_rag_retrieval --documents 60 --latency-ms 30
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import time
+import numpy as np
+
+PORT = 54330
+os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{PORT}"
+os.environ.setdefault("SUPABASE_KEY", "benchmark-key")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-key")
+
+DIM = 768
+
+
+def make_corpus(n_documents: int):
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(n_documents, DIM)).astype(np.float32)
+    return [
+        {"id": i + 1, "content": f"dokumen {i + 1}", "metadata": {"type": "benchmark"},
+         "embedding": json.dumps(embeddings[i].round(6).tolist())}
+        for i in range(n_documents)
+    ]
+
+
+def serve_stand_in(n_documents: int, latency: float):
+    """PostgREST palsu untuk tabel rag_documents dan RPC match_rag_documents"""
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, Response
+    from starlette.routing import Route
+
+    rows = make_corpus(n_documents)
+    matrix = np.stack([np.asarray(json.loads(r["embedding"]), dtype=np.float32) for r in rows])
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    async def table(request):
+        await asyncio.sleep(latency)
+        params = request.query_params
+        data = rows
+        if params.get("order", "").startswith("id.desc"):
+            data = data[::-1]
+        offset = int(params.get("offset", 0))
+        data = data[offset:offset + int(params.get("limit", len(rows)))]
+        columns = params.get("select", "*").split(",")
+        if columns != ["*"]:
+            data = [{c: r[c] for c in columns} for r in data]
+        headers = {"Content-Range": f"{offset}-{offset + len(data) - 1}/{len(rows)}"}
+        if request.method == "HEAD":
+            return Response(headers=headers)
+        return JSONResponse(data, headers=headers)
+
+    async def match(request):
+        await asyncio.sleep(latency)
+        body = await request.json()
+        query = np.asarray(body["query_embedding"], dtype=np.float32)
+        similarity = matrix @ (query / np.linalg.norm(query))
+        top = np.argsort(-similarity)[:body["match_count"]]
+        return JSONResponse([
+            {"id": rows[i]["id"], "content": rows[i]["content"], "metadata": rows[i]["metadata"],
+             "similarity": float(similarity[i])}
+            for i in top
+        ])
+
+    app = Starlette(routes=[
+        Route("/rest/v1/rag_documents", table, methods=["GET", "HEAD"]),
+        Route("/rest/v1/rpc/match_rag_documents", match, methods=["POST"]),
+    ])
+    uvicorn.run(app, port=PORT, log_level="warning")
+
+
+def start_stand_in_server(n_documents: int, latency: float):
+    """Jalankan stand-in di proses terpisah agar tidak berebut GIL dengan client"""
+    process = multiprocessing.Process(target=serve_stand_in, args=(n_documents, latency), daemon=True)
+    process.start()
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", PORT), timeout=0.1).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+
+
+def timed(fn, queries):
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(fn(q))
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    args = parser.parse_args()
+
+    start_stand_in_server(args.documents, args.latency_ms / 1000)
+    from ai_agents import chat_rag
+
+    queries = np.random.default_rng(1).normal(size=(args.queries, DIM)).astype(np.float32).tolist()
+
+    chat_rag.RAG_BACKEND = "rpc"
+    rpc_ms, rpc_docs = timed(lambda q: chat_rag.match_documents(q, args.top_k), queries)
+
+    start = time.perf_counter()
+    chat_rag.vector_index.ensure_current()
+    load_ms = (time.perf_counter() - start) * 1000
+    chat_rag.RAG_BACKEND = "local"
+    local_ms, local_docs = timed(lambda q: chat_rag.match_documents(q, args.top_k), queries)
+
+    same = sum([d["id"] for d in a] == [d["id"] for d in b] for a, b in zip(rpc_docs, local_docs))
+    print(f"corpus {args.documents} docs x {DIM} dim, {args.queries} queries, top-{args.top_k}, "
+          f"stand-in latency {args.latency_ms:.0f}ms")
+    print(f"local index load (incl. version check): {load_ms:.1f}ms")
+    print(f"{'backend':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, ms in (("rpc", rpc_ms), ("local", local_ms)):
+        print(f"{name:<10}{ms.mean():>10.3f}{np.percentile(ms, 50):>10.3f}{np.percentile(ms, 95):>10.3f}")
+    print(f"identical top-{args.top_k}: {same}/{args.queries}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Benchmark suite hot path scoring dan booking.
+
+Semua akses database memakai fake Supabase in-process (benchmarks/fake_supabase.py),
+jadi yang diukur hanya kode aplikasi. Tiap case dijalankan beberapa round;
+waktu per call (median/min/mean, mikrodetik) ditulis sebagai JSON dan
+dibandingkan dengan baseline yang disimpan. Perbandingan memakai waktu
+minimum per round (paling tidak terpengaruh noise mesin, seperti saran timeit).
+
+    cd backend && python -m benchmarks.bench_suite --output results.json
+    cd backend && python -m benchmarks.bench_suite --save-baseline
+    cd backend && python -m benchmarks.bench_suite --filter predict --tolerance 0.3
+
+Exit code 1 jika ada case yang lebih lambat dari baseline * (1 + tolerance).
+Baseline bergantung mesin: info mesin (machine_info) disimpan di baseline dan
+perbandingan dilewati dengan peringatan jika mesinnya berbeda (--force-compare
+untuk tetap membandingkan). Simpan ulang (--save-baseline) di mesin CI/deploy.
+Cache dan state in-memory (feature store, profile cache, tabel fake) di-reset
+sebelum setiap case sehingga hasil tidak bergantung pada urutan case.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import uuid
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "benchmark-key")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-key")
+os.environ["PERSISTENCE_MODE"] = "sync"
+os.environ["SCORING_BACKEND"] = "inline"
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Info mesin yang harus sama agar angka baseline bisa dibandingkan
+MACHINE_KEYS = ("python", "numpy", "machine", "cpu_model", "cpu_count")
+
+
+def cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or "unknown"
+
+
+def machine_info() -> dict:
+    import numpy as np
+
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_model": cpu_model(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def machine_mismatch(current: dict, baseline: dict) -> list:
+    """Key MACHINE_KEYS yang berbeda antara meta hasil sekarang dan baseline."""
+    return [key for key in MACHINE_KEYS if current.get(key) != baseline.get(key)]
+
+
+def make_ticket(i=0):
+    from schema.ticket_schema import TicketCreate
+
+    return TicketCreate(
+        transaction_id=uuid.uuid4(), user_id=f"bench-user-{i % 1000}", price=200000, num_tickets=2,
+        station_from_id=1, station_to_id=2, payment_method_id=1, booking_channel_id=1,
+        is_refund=0, transaction_time="2025-01-01T08:00:00", is_popular_route=1,
+        price_category=0, tickets_category=0, passenger_name=["A", "B"], seat_number=["1A", "1B"],
+    )
+
+
+def build_cases():
+    """Daftar (nama, fungsi tanpa argumen) untuk setiap hot path, dan fake client-nya."""
+    import httpx
+    from benchmarks.bench_micro_batching import make_rows
+    from benchmarks.fake_supabase import install
+    from controllers import ticket_controller
+    from main import app
+    from services.model_registry import model_registry
+
+    db, _ = install()
+    detector = model_registry.active.detector
+    rows = {n: make_rows(detector, n, seed=n) for n in (1, 1000, 100000)}
+    single = rows[1][0]
+    ticket = make_ticket()
+    counter = iter(range(10 ** 9))
+
+    def buy_ticket():
+        ticket_controller.buy_ticket(make_ticket(next(counter)))
+
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+    payload = json.loads(make_ticket().model_dump_json())
+
+    def post_tickets_buy():
+        payload["user_id"] = f"bench-user-{next(counter) % 1000}"
+        response = loop.run_until_complete(client.post("/tickets/buy", json=payload))
+        if response.status_code != 200:
+            raise RuntimeError(f"/tickets/buy -> {response.status_code}: {response.text[:200]}")
+
+    return db, [
+        ("calculate_ticket_features", lambda: ticket_controller.calculate_ticket_features(ticket)),
+        ("validate_ticket_price", lambda: ticket_controller.validate_ticket_price(2, 150000.0)),
+        ("prepare_features[1]", lambda: detector.prepare_features(single)),
+        ("prepare_features[1k]", lambda: detector.prepare_features(rows[1000])),
+        ("prepare_features[100k]", lambda: detector.prepare_features(rows[100000])),
+        ("predict[1]", lambda: detector.predict(single)),
+        ("predict[1k]", lambda: detector.predict(rows[1000])),
+        ("predict[100k]", lambda: detector.predict(rows[100000])),
+        ("buy_ticket", buy_ticket),
+        ("http_post_tickets_buy", post_tickets_buy),
+    ]
+
+
+def reset_state(db=None):
+    """Kosongkan cache / state singleton agar setiap case mulai dari kondisi yang sama."""
+    from ai_agents.answer_cache import answer_cache
+    from services.feature_store import feature_store
+    from services.profile_cache import profile_cache
+    from services.shadow_scoring import shadow_scorer
+
+    feature_store.clear()
+    profile_cache.clear()
+    answer_cache.clear()
+    shadow_scorer.reset()
+    if db is not None:
+        db.tables.clear()
+        db.calls.clear()
+
+
+def measure(fn, rounds, min_round_time):
+    """Seperti timeit.autorange: number dinaikkan sampai satu round >= min_round_time."""
+    fn()  # warm-up
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_round_time:
+            break
+        number *= 2 if elapsed * 10 > min_round_time else 10
+
+    per_call = [elapsed / number]
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_call.append((time.perf_counter() - start) / number)
+
+    per_call_us = [t * 1e6 for t in per_call]
+    return {
+        "median_us": round(statistics.median(per_call_us), 3),
+        "min_us": round(min(per_call_us), 3),
+        "mean_us": round(statistics.mean(per_call_us), 3),
+        "rounds": rounds,
+        "number": number,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Kembalikan list (nama, baseline, sekarang, rasio, status) dan jumlah regresi."""
+    rows, regressions = [], 0
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            rows.append((name, None, result["min_us"], None, "new"))
+            continue
+        ratio = result["min_us"] / base["min_us"]
+        if ratio > 1 + tolerance:
+            status, regressions = "REGRESSION", regressions + 1
+        elif ratio < 1 / (1 + tolerance):
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, base["min_us"], result["min_us"], ratio, status))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hot path scoring dan booking")
+    parser.add_argument("--filter", default=None, help="Hanya case yang namanya mengandung teks ini")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-round-time", type=float, default=0.2, help="Detik minimal per round")
+    parser.add_argument("--output", default=None, help="Tulis hasil JSON ke file ini")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Simpan hasil sebagai baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Toleransi perlambatan (0.25 = 25%%)")
+    parser.add_argument("--force-compare", action="store_true",
+                        help="Bandingkan dengan baseline walaupun mesinnya berbeda")
+    args = parser.parse_args()
+
+    from services.model_registry import model_registry
+
+    db, cases = build_cases()
+    cases = [(name, fn) for name, fn in cases if not args.filter or args.filter in name]
+    results = {}
+    for name, fn in cases:
+        reset_state(db)
+        results[name] = measure(fn, args.rounds, args.min_round_time)
+        print(f"{name:<28}{results[name]['median_us']:>14,.1f} us", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            **machine_info(),
+            "model_version": model_registry.active.version,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline disimpan ke {args.baseline}", file=sys.stderr)
+        return 0
+    if not args.output:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if not os.path.exists(args.baseline):
+        print("Baseline belum ada, jalankan dengan --save-baseline", file=sys.stderr)
+        return 0
+    with open(args.baseline) as f:
+        saved = json.load(f)
+    baseline = saved["results"]
+
+    mismatch = machine_mismatch(report["meta"], saved.get("meta", {}))
+    if mismatch and not args.force_compare:
+        print("\n⚠️  Baseline direkam di mesin lain, perbandingan dilewati:", file=sys.stderr)
+        for key in mismatch:
+            print(f"   {key}: baseline={saved.get('meta', {}).get(key)!r} sekarang={report['meta'].get(key)!r}",
+                  file=sys.stderr)
+        print("   Simpan ulang dengan --save-baseline di mesin ini, atau pakai --force-compare", file=sys.stderr)
+        return 0
+
+    rows, regressions = compare(results, baseline, args.tolerance)
+    print(f"\n{'case':<28}{'baseline us':>14}{'current us':>14}{'ratio':>8}  status", file=sys.stderr)
+    for name, base, current, ratio, status in rows:
+        base_text = f"{base:,.1f}" if base is not None else "-"
+        ratio_text = f"{ratio:.2f}" if ratio is not None else "-"
+        print(f"{name:<28}{base_text:>14}{current:>14,.1f}{ratio_text:>8}  {status}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+Fake Supabase client in-process untuk benchmark (tanpa jaringan/database).
+
+Mendukung subset query builder postgrest yang dipakai aplikasi: select,
+insert, upsert, update, delete, filter eq/in_/gt/gte/lt, order, limit dan
+execute. Insert mengisi id seperti database. install() mengganti client di
+config.supabase dan di semua modul yang sudah meng-import-nya.
+"""
+import sys
+import uuid
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.op = "select"
+        self.payload = None
+        self.filters = []
+        self.order_by = []
+        self.row_limit = None
+        self.head = False
+        self.on_conflict = "id"
+
+    # ---------------- Builder ---------------- #
+
+    def select(self, columns="*", count=None, head=None):
+        self.op = "select"
+        self.head = bool(head)
+        return self
+
+    def insert(self, data, **kwargs):
+        self.op, self.payload = "insert", data
+        return self
+
+    def upsert(self, data, on_conflict="id", **kwargs):
+        self.op, self.payload, self.on_conflict = "upsert", data, on_conflict
+        return self
+
+    def update(self, data):
+        self.op, self.payload = "update", data
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] >= value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] < value)
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self.row_limit = n
+        return self
+
+    # ---------------- Execute ---------------- #
+
+    def _run(self):
+        self.client.calls[(self.table, self.op)] = self.client.calls.get((self.table, self.op), 0) + 1
+        rows = self.client.tables.setdefault(self.table, {})
+
+        if self.op in ("insert", "upsert"):
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            out = []
+            for row in payload:
+                row = dict(row)
+                row.setdefault("id", str(uuid.uuid4()))
+                key = row.get(self.on_conflict) if self.op == "upsert" else row["id"]
+                rows[key] = {**rows.get(key, {}), **row}
+                out.append(rows[key])
+            return FakeResponse(out)
+
+        matched = [row for row in rows.values() if all(f(row) for f in self.filters)]
+        if self.op == "update":
+            for row in matched:
+                row.update(self.payload)
+            return FakeResponse(matched)
+        if self.op == "delete":
+            for row in matched:
+                rows.pop(row["id"], None)
+            return FakeResponse(matched)
+
+        for column, desc in reversed(self.order_by):
+            matched.sort(key=lambda row: row.get(column), reverse=desc)
+        if self.row_limit is not None:
+            matched = matched[:self.row_limit]
+        return FakeResponse([] if self.head else matched, len(matched))
+
+    def execute(self):
+        return self._run()
+
+
+class AsyncFakeQuery(FakeQuery):
+    async def execute(self):
+        return self._run()
+
+
+class FakeSupabaseClient:
+    """Pengganti supabase.Client; tables: {nama tabel: {id: row}}"""
+
+    query_class = FakeQuery
+
+    def __init__(self, tables=None):
+        self.tables = tables if tables is not None else {}
+        self.calls = {}
+
+    def table(self, name):
+        return self.query_class(self, name)
+
+    def rpc(self, name, params=None):
+        raise NotImplementedError(f"rpc {name} tidak didukung fake client")
+
+
+class AsyncFakeSupabaseClient(FakeSupabaseClient):
+    """Pengganti AsyncClient; berbagi tables dengan client sync jika diberikan."""
+
+    query_class = AsyncFakeQuery
+
+
+def install(client: FakeSupabaseClient = None, async_client: AsyncFakeSupabaseClient = None):
+    """
+    Pasang fake client ke config.supabase dan semua modul yang sudah
+    meng-import `supabase` / `get_async_supabase` dari sana.
+    """
+    import config.supabase as config
+
+    client = client or FakeSupabaseClient()
+    async_client = async_client or AsyncFakeSupabaseClient(client.tables)
+    original_client, original_getter = config.supabase, config.get_async_supabase
+
+    def get_async_supabase():
+        return async_client
+
+    for module in list(sys.modules.values()):
+        if getattr(module, "supabase", None) is original_client:
+            module.supabase = client
+        if getattr(module, "get_async_supabase", None) is original_getter:
+            module.get_async_supabase = get_async_supabase
+    return client, async_client
@@ -1,4 +1,6 @@
-from supabase import create_client
+from supabase import create_client, acreate_client, AsyncClient, AsyncClientOptions
+import httpx
+import itertools
 import os
 from dotenv import load_dotenv
 
@@ -7,4 +9,48 @@ load_dotenv()
 url = os.getenv("SUPABASE_URL")
 key = os.getenv("SUPABASE_KEY")
 
+# Total koneksi HTTP untuk async client, dibagi ke beberapa shard.
+# Pool httpcore men-scan semua koneksi untuk setiap request yang antre,
+# jadi satu pool besar menjadi CPU-bound saat concurrency tinggi.
+pool_size = int(os.getenv("SUPABASE_POOL_SIZE", "100"))
+pool_shards = int(os.getenv("SUPABASE_POOL_SHARDS", "10"))
+
 supabase = create_client(url, key)
+
+# Async clients + connection pool bersama, dibuat di FastAPI lifespan (main.py)
+_async_clients: list[AsyncClient] = []
+_http_pools: list[httpx.AsyncClient] = []
+_client_cycle = None
+
+
+async def init_async_supabase() -> list[AsyncClient]:
+    """Buat async Supabase client(s) di atas connection pool bersama"""
+    global _client_cycle
+    per_shard = max(1, pool_size // pool_shards)
+    for _ in range(pool_shards):
+        http_pool = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=per_shard, max_keepalive_connections=per_shard),
+            timeout=httpx.Timeout(30.0),
+        )
+        _http_pools.append(http_pool)
+        _async_clients.append(
+            await acreate_client(url, key, options=AsyncClientOptions(httpx_client=http_pool))
+        )
+    _client_cycle = itertools.cycle(_async_clients)
+    return _async_clients
+
+
+async def close_async_supabase():
+    global _client_cycle
+    for http_pool in _http_pools:
+        await http_pool.aclose()
+    _http_pools.clear()
+    _async_clients.clear()
+    _client_cycle = None
+
+
+def get_async_supabase() -> AsyncClient:
+    """Ambil async client berikutnya (round-robin antar shard pool)"""
+    if _client_cycle is None:
+        raise RuntimeError("Async Supabase client belum diinisialisasi (lihat lifespan di main.py)")
+    return next(_client_cycle)
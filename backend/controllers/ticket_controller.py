@@ -1,12 +1,27 @@
-from schema.ticket_schema import TicketCreate, TicketResponse
-from models import ticket_model, transaction_model
-from services.model_service import api_detector
-from config.supabase import supabase
+from schema.ticket_schema import TicketCreate
+from models import ticket_model, transaction_model, profile_model
+from services.model_registry import model_registry
+from services.shadow_scoring import shadow_scorer
+from services.micro_batcher import micro_batcher, SCORING_BACKEND
+from services.process_scorer import process_scorer
+from services.metrics import StageTrace
+from services.profile_cache import profile_cache
+from services.write_behind import write_behind_queue, PERSISTENCE_MODE
+from services.feature_store import feature_store, VELOCITY_OBSERVE
+from services.stats_service import transaction_stats
+from functools import lru_cache
+import asyncio
+import base64
+import json
+import os
 import uuid
 from datetime import datetime
 import hashlib
+import logging
 import random
 
+logger = logging.getLogger(__name__)
+
 # Configuration
 TICKET_CLASSES = {
     1: {'name': 'Economy', 'min': 80000, 'max': 140000, 'base': 100000},
@@ -14,6 +29,20 @@ TICKET_CLASSES = {
     3: {'name': 'Executive', 'min': 250000, 'max': 350000, 'base': 300000}
 }
 
+# Upsert-on-conflict untuk profile (tanpa select dulu) jika di-enable
+PROFILE_UPSERT = os.getenv("PROFILE_UPSERT", "false").lower() in ("1", "true", "yes")
+
+# Batas /tickets/buy/batch dan ukuran chunk request ke PostgREST: lookup profile
+# memakai filter in_ di query string GET (~37 byte per UUID), jadi dipecah kecil
+MAX_BATCH_SIZE = int(os.getenv("BUY_BATCH_MAX_SIZE", "500"))
+PROFILE_LOOKUP_CHUNK = int(os.getenv("PROFILE_LOOKUP_CHUNK", "100"))
+INSERT_CHUNK = int(os.getenv("BULK_INSERT_CHUNK", "500"))
+
+
+def chunked(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
 # ---------------- Helper Functions ---------------- #
 
 def generate_dummy_ip() -> str:
@@ -33,6 +62,7 @@ def parse_datetime(value) -> datetime:
         except Exception:
             raise ValueError(f"Invalid datetime format: {value}")
 
+@lru_cache(maxsize=100_000)
 def ensure_uuid(user_id: str) -> str:
     """
     Convert any string into a valid UUID string.
@@ -47,29 +77,55 @@ def ensure_uuid(user_id: str) -> str:
         return str(uuid.UUID(uuid_str))
 
 
-def calculate_ticket_features(ticket: TicketCreate) -> dict:
-    """
-    Calculate 14 features untuk model dari ticket data.
-    """
-    # Get ticket class info
-    ticket_class_id = getattr(ticket, 'ticket_class_id', 1)
-    class_info = TICKET_CLASSES.get(ticket_class_id, TICKET_CLASSES[1])
+def get_passenger_names(ticket: TicketCreate) -> list:
+    return ticket.passenger_name if isinstance(ticket.passenger_name, list) else [ticket.passenger_name]
 
-    final_price = float(ticket.price)
+
+def price_features(ticket_class_id: int, final_price: float, discount_amount: float) -> dict:
+    """Feature harga (base, markup, diskon) berdasarkan kelas tiket."""
+    class_info = TICKET_CLASSES.get(ticket_class_id, TICKET_CLASSES[1])
     base_price = class_info['base']
     max_price = class_info['max']
-    discount_amount = float(getattr(ticket, 'discount_amount', 0))
-
-    # Calculate derived features
-    price_markup_ratio = final_price / base_price if base_price > 0 else 0
-    discount_ratio = discount_amount / base_price if base_price > 0 else 0
-    is_price_above_max = 1 if final_price > max_price else 0
 
     return {
         'final_price': final_price,
         'base_price': base_price,
         'discount_amount': discount_amount,
-        'price_markup_ratio': price_markup_ratio,
+        'price_markup_ratio': final_price / base_price if base_price > 0 else 0,
+        'is_price_above_max': 1 if final_price > max_price else 0,
+        'discount_ratio': discount_amount / base_price if base_price > 0 else 0,
+    }
+
+
+def velocity_features(ticket: TicketCreate) -> dict:
+    """
+    Catat transaksi di feature_store dan kembalikan velocity features
+    (1m/10m/1h per user / device / IP). Kosong jika model aktif tidak
+    memakainya (VELOCITY_OBSERVE=auto), jadi tidak ada biaya per request.
+    """
+    if VELOCITY_OBSERVE != "always" and not model_registry.active.uses_velocity:
+        return {}
+    return feature_store.observe(
+        user_id=ensure_uuid(ticket.user_id),
+        device_id=ticket.device_id,
+        ip_id=ticket.ip_id,
+        num_tickets=ticket.num_tickets,
+        route=(ticket.station_from_id, ticket.station_to_id),
+    )
+
+
+def calculate_ticket_features(ticket: TicketCreate, velocity: dict | None = None) -> dict:
+    """
+    Calculate 14 features untuk model dari ticket data, plus velocity
+    features (hasil velocity_features) jika diberikan. Tanpa side effect.
+    """
+    ticket_class_id = getattr(ticket, 'ticket_class_id', 1)
+    prices = price_features(
+        ticket_class_id, float(ticket.price), float(getattr(ticket, 'discount_amount', 0))
+    )
+
+    return {
+        **prices,
         'num_tickets': ticket.num_tickets,
         'ticket_class_id': ticket_class_id,
         'station_from_id': ticket.station_from_id,
@@ -78,8 +134,7 @@ def calculate_ticket_features(ticket: TicketCreate) -> dict:
         'booking_channel_id': ticket.booking_channel_id,
         'is_refund': int(ticket.is_refund),
         'is_popular_route': int(ticket.is_popular_route),
-        'is_price_above_max': is_price_above_max,
-        'discount_ratio': discount_ratio
+        **(velocity or {})
     }
 
 
@@ -120,37 +175,80 @@ def validate_ticket_price(ticket_class_id: int, final_price: float) -> dict:
         'class_name': class_info['name']
     }
 
-# ---------------- Core Functions ---------------- #
+# ---------------- Profile Functions ---------------- #
 
-def buy_ticket(ticket: TicketCreate) -> dict:
+def dummy_profile(user_uuid: str) -> dict:
+    # Dummy user for testing purposes
+    return {"id": user_uuid, "name": "Test User", "email": "test@example.com", "role": "user"}
+
+
+def ensure_profiles(user_uuids: list[str]):
     """
-    Analisis transaksi tiket dengan ScalperDetectorAPI (14 features)
-    + insert ke database
+    Pastikan semua user ada di profile table.
+    UUID yang sudah terkonfirmasi (profile_cache) tidak dicek ulang ke database.
     """
-    # Calculate features untuk model
-    ticket_features = calculate_ticket_features(ticket)
+    pending = [u for u in dict.fromkeys(user_uuids) if not profile_cache.contains(u)]
+    if not pending:
+        return
 
-    # Prediksi anomaly / scalper
-    result = api_detector.predict(ticket_features)
-    pred_label = -1 if result['prediction'] == 'anomaly' else 1
-    score = result['score'] * -100
-    risk_score = result.get('risk_score', 0)
-    risk_level = result.get('risk_level', 'Low')
-    is_scalper = result.get('is_scalper', False)
+    if PROFILE_UPSERT:
+        for chunk in chunked(pending, INSERT_CHUNK):
+            profile_model.upsert_profiles([dummy_profile(u) for u in chunk])
+    else:
+        existing_ids = set()
+        for chunk in chunked(pending, PROFILE_LOOKUP_CHUNK):
+            existing = profile_model.get_profile_ids(chunk)
+            existing_ids.update(row["id"] for row in (existing.data or []))
+        missing = [u for u in pending if u not in existing_ids]
+        for chunk in chunked(missing, INSERT_CHUNK):
+            profile_model.create_profiles([dummy_profile(u) for u in chunk])
+
+    for u in pending:
+        profile_cache.add(u)
+
+
+async def ensure_profiles_async(user_uuids: list[str]):
+    """Versi async dari ensure_profiles"""
+    pending = [u for u in dict.fromkeys(user_uuids) if not profile_cache.contains(u)]
+    if not pending:
+        return
+
+    if PROFILE_UPSERT:
+        for chunk in chunked(pending, INSERT_CHUNK):
+            await profile_model.upsert_profiles_async([dummy_profile(u) for u in chunk])
+    else:
+        existing_ids = set()
+        for chunk in chunked(pending, PROFILE_LOOKUP_CHUNK):
+            existing = await profile_model.get_profile_ids_async(chunk)
+            existing_ids.update(row["id"] for row in (existing.data or []))
+        missing = [u for u in pending if u not in existing_ids]
+        for chunk in chunked(missing, INSERT_CHUNK):
+            await profile_model.create_profiles_async([dummy_profile(u) for u in chunk])
 
-    # Validasi harga berdasarkan ticket class
-    ticket_class_id = getattr(ticket, 'ticket_class_id', 1)
-    price_validation = validate_ticket_price(ticket_class_id, float(ticket.price))
+    for u in pending:
+        profile_cache.add(u)
+
+# ---------------- Core Functions ---------------- #
+
+def enqueue_booking(ticket: TicketCreate, trx_row: dict, ticket_features: dict) -> str:
+    """
+    Mode write-behind: id transaksi/tiket dibuat di aplikasi, insert
+    diserahkan ke write_behind_queue sehingga response tidak menunggu database.
+    """
+    trx_id = str(uuid.uuid4())
+    trx_row["id"] = trx_id
+    ticket_rows = build_ticket_rows(ticket, trx_id, ticket_features)
+    for row in ticket_rows:
+        row["id"] = str(uuid.uuid4())
+    write_behind_queue.submit(trx_row, ticket_rows)
+    return trx_id
 
-    # Ensure user exists in profile table
-    user_uuid = ensure_uuid(ticket.user_id)
-    user_exists = supabase.table("profile").select("id").eq("id", user_uuid).execute()
-    if not user_exists.data:
-        # Insert dummy user for testing purposes
-        supabase.table("profile").insert({"id": user_uuid, "name": "Test User", "email": "test@example.com", "role": "user"}).execute()
 
-    # Insert ke transactions table
-    trx_data = {
+def build_transaction_row(ticket: TicketCreate, user_uuid: str, result: dict) -> dict:
+    """Susun row untuk tabel transactions dari ticket + hasil model"""
+    pred_label = -1 if result['prediction'] == 'anomaly' else 1
+    score = result['score'] * -100
+    return {
         "user_id": user_uuid,
         "origin_id": 1,
         "station_from_id": ticket.station_from_id,
@@ -163,35 +261,56 @@ def buy_ticket(ticket: TicketCreate) -> dict:
         "device_fingerprint": ticket.device_id,
         "ip_address": ticket.ip_id or generate_dummy_ip(),
         "is_refund": int(ticket.is_refund),
+        # Input model yang tidak bisa diturunkan dari kolom lain (untuk rescoring)
+        "is_popular_route": int(ticket.is_popular_route),
+        "ticket_class_id": getattr(ticket, 'ticket_class_id', 1),
+        "discount_amount": float(getattr(ticket, 'discount_amount', 0)),
         "anomaly_score": float(score),
         "anomaly_label_id": 1 if pred_label == 1 else 2,
-        "fraud_flag": int(is_scalper),
+        "fraud_flag": int(result.get('is_scalper', False)),
+        # Bucket severity saat ditulis; statistik tidak bergeser saat model di-hot-reload
+        "risk_level": result.get('risk_level'),
     }
-    trx = transaction_model.create_transaction(trx_data)
-    # Insert ke tickets table (per penumpang/seat)
-    passenger_names = ticket.passenger_name if isinstance(ticket.passenger_name, list) else [ticket.passenger_name]
+
+
+def build_ticket_rows(ticket: TicketCreate, trx_id: str, ticket_features: dict) -> list[dict]:
+    """Susun row tabel tickets (per penumpang/seat) untuk satu transaksi"""
+    ticket_class_id = getattr(ticket, 'ticket_class_id', 1)
+    passenger_names = get_passenger_names(ticket)
+    seat_numbers = ticket.seat_number or []
 
     base_price = ticket_features['base_price']
     discount = ticket_features['discount_amount']
 
-    for idx, seat in enumerate(seat_numbers):
-        ticket_price = float(ticket.price / ticket.num_tickets)
+    # Harga dan diskon per seat sama untuk semua seat, hitung sekali
+    ticket_price = float(ticket.price / ticket.num_tickets)
+    discount_per_ticket = discount / ticket.num_tickets if discount > 0 else 0
 
-        ticket_model.create_ticket({
+    rows = []
+    for idx, seat in enumerate(seat_numbers):
+        rows.append({
             "transaction_id": str(trx_id),
             "passenger_name": passenger_names[idx] if idx < len(passenger_names) else f"Passenger {idx+1}",
             "seat_number": seat,
             "price": ticket_price,
             "ticket_class_id": ticket_class_id,
             "base_price": base_price,
-            "discount_amount": discount / ticket.num_tickets if discount > 0 else 0,
+            "discount_amount": discount_per_ticket,
             "final_price": ticket_price,
             "status_id": 1,
             "station_from_id": ticket.station_from_id,
             "station_to_id": ticket.station_to_id,
         })
+    return rows
+
+
+def build_ticket_response(ticket: TicketCreate, trx_id: str, user_uuid: str,
+                          ticket_features: dict, result: dict) -> dict:
+    """Susun response TicketResponse dari ticket, hasil model dan validasi harga"""
+    score = result['score'] * -100
+    ticket_class_id = getattr(ticket, 'ticket_class_id', 1)
+    price_validation = validate_ticket_price(ticket_class_id, float(ticket.price))
 
-    # Build response
     t_time = parse_datetime(ticket.transaction_time)
     hour = t_time.hour
     day_of_week = t_time.weekday()
@@ -200,9 +319,9 @@ def buy_ticket(ticket: TicketCreate) -> dict:
     is_peak_hour = 1 if hour in [7, 8, 17, 18] else 0
     price_per_ticket = float(ticket.price) / max(ticket.num_tickets, 1)
 
-    response = {
+    return {
         "transaction_id": str(trx_id),
-        "user_id": ensure_uuid(ticket.user_id),
+        "user_id": user_uuid,
         "price": float(ticket.price),
         "num_tickets": ticket.num_tickets,
         "ticket_class_id": ticket_class_id,
@@ -223,16 +342,18 @@ def buy_ticket(ticket: TicketCreate) -> dict:
         "tickets_category": int(ticket.tickets_category),
         "device_id": ticket.device_id,
         "ip_id": ticket.ip_id,
-        "passenger_name": passenger_names,
-        "seat_number": seat_numbers,
+        "passenger_name": get_passenger_names(ticket),
+        "seat_number": ticket.seat_number or [],
         "id": str(uuid.uuid4()),
         "created_at": datetime.utcnow().isoformat(),
         # Model prediction results
         "prediction": result['prediction'],
         "score": float(score),
-        "risk_score": risk_score,
-        "risk_level": risk_level,
-        "is_scalper": is_scalper,
+        "risk_score": result.get('risk_score', 0),
+        "risk_level": result.get('risk_level', 'Low'),
+        "risk_calibrated": result.get('risk_calibrated'),
+        "is_scalper": result.get('is_scalper', False),
+        "model_version": result.get('model_version'),
         # Price validation results
         "price_validation": {
             "is_valid": price_validation['is_valid'],
@@ -249,7 +370,199 @@ def buy_ticket(ticket: TicketCreate) -> dict:
             "discount_ratio": round(ticket_features['discount_ratio'], 2)
         }
     }
-    return response
+
+
+def score_tickets(features):
+    """
+    Prediksi dengan versi model aktif. Versi dipinjam selama scoring sehingga
+    hot reload tidak mengganti model di tengah request; versi ikut di hasil.
+    Row tunggal lewat micro-batcher jika SCORING_BACKEND=batch; semua scoring
+    di worker process jika SCORING_BACKEND=process.
+    """
+    if SCORING_BACKEND == "batch" and isinstance(features, dict):
+        results = micro_batcher.predict(features)
+    elif SCORING_BACKEND == "process":
+        results = process_scorer.predict(features)
+    else:
+        with model_registry.acquire() as model:
+            results = model.detector.predict(features)
+        for r in results if isinstance(results, list) else [results]:
+            r['model_version'] = model.version
+    # Challenger di-score di background, tidak mempengaruhi response
+    shadow_scorer.submit(features, results)
+    return results
+
+
+async def score_tickets_async(features):
+    """score_tickets tanpa memblokir event loop."""
+    if SCORING_BACKEND == "batch" and isinstance(features, dict):
+        results = await micro_batcher.predict_async(features)
+        shadow_scorer.submit(features, results)
+        return results
+    if SCORING_BACKEND == "process":
+        results = await process_scorer.predict_async(features)
+        shadow_scorer.submit(features, results)
+        return results
+    return await asyncio.to_thread(score_tickets, features)
+
+
+def buy_ticket(ticket: TicketCreate) -> dict:
+    """
+    Analisis transaksi tiket dengan ScalperDetectorAPI (14 features)
+    + insert ke database. Latency tiap stage dicatat ke stage_metrics.
+    """
+    with StageTrace("/tickets/buy") as trace:
+        # Calculate features untuk model
+        trace.stage("features")
+        ticket_features = calculate_ticket_features(ticket, velocity_features(ticket))
+
+        # Prediksi anomaly / scalper
+        trace.stage("score")
+        result = score_tickets(ticket_features)
+        trace.model_version = result.get('model_version')
+
+        # Ensure user exists in profile table
+        trace.stage("profile")
+        user_uuid = ensure_uuid(ticket.user_id)
+        ensure_profiles([user_uuid])
+
+        trx_row = build_transaction_row(ticket, user_uuid, result)
+        if PERSISTENCE_MODE == "write_behind":
+            trace.stage("enqueue")
+            trx_id = enqueue_booking(ticket, trx_row, ticket_features)
+            transaction_stats.record(result)
+            return build_ticket_response(ticket, trx_id, user_uuid, ticket_features, result)
+
+        # Insert ke transactions table
+        trace.stage("transaction_insert")
+        trx = transaction_model.create_transaction(trx_row)
+        trx_id = trx.data[0]["id"]
+
+        # Insert ke tickets table (semua penumpang/seat dalam satu request)
+        trace.stage("tickets_insert")
+        ticket_rows = build_ticket_rows(ticket, trx_id, ticket_features)
+        if ticket_rows:
+            ticket_model.create_tickets(ticket_rows)
+
+        trace.stage(None)
+        transaction_stats.record(result)
+        return build_ticket_response(ticket, trx_id, user_uuid, ticket_features, result)
+
+
+async def buy_ticket_async(ticket: TicketCreate) -> dict:
+    """
+    Versi async dari buy_ticket: tidak memblokir threadpool FastAPI.
+    Scoring (CPU) jalan di thread terpisah bersamaan dengan cek profile,
+    semua tiket per seat dikirim dalam satu bulk insert.
+    """
+    with StageTrace("/tickets/buy") as trace:
+        trace.stage("features")
+        ticket_features = calculate_ticket_features(ticket, velocity_features(ticket))
+        user_uuid = ensure_uuid(ticket.user_id)
+
+        # Prediksi anomaly dan ensure profile tidak saling bergantung
+        trace.stage(None)
+        result, _ = await asyncio.gather(
+            trace.timed("score", score_tickets_async(ticket_features)),
+            trace.timed("profile", ensure_profiles_async([user_uuid])),
+        )
+        trace.model_version = result.get('model_version')
+
+        trx_row = build_transaction_row(ticket, user_uuid, result)
+        if PERSISTENCE_MODE == "write_behind":
+            trace.stage("enqueue")
+            trx_id = enqueue_booking(ticket, trx_row, ticket_features)
+            transaction_stats.record(result)
+            return build_ticket_response(ticket, trx_id, user_uuid, ticket_features, result)
+
+        # Transaksi butuh profile (FK), tiket butuh transaction id
+        trace.stage("transaction_insert")
+        trx = await transaction_model.create_transaction_async(trx_row)
+        trx_id = trx.data[0]["id"]
+
+        trace.stage("tickets_insert")
+        ticket_rows = build_ticket_rows(ticket, trx_id, ticket_features)
+        if ticket_rows:
+            await ticket_model.create_tickets_async(ticket_rows)
+
+        trace.stage(None)
+        transaction_stats.record(result)
+        return build_ticket_response(ticket, trx_id, user_uuid, ticket_features, result)
+
+
+def rollback_batch(trx_ids: list[str]):
+    """
+    Hapus transaksi (dan tickets-nya) yang sudah tertulis dari batch yang gagal,
+    sehingga batch tidak tersimpan setengah. Tiap chunk insert sendiri atomik.
+    """
+    if not trx_ids:
+        return
+    try:
+        for chunk in chunked(trx_ids, INSERT_CHUNK):
+            ticket_model.delete_tickets_by_transactions(chunk)
+            transaction_model.delete_transactions(chunk)
+    except Exception as e:
+        logger.error("Rollback batch gagal, %d transaksi mungkin tertinggal: %s (ids: %s)",
+                     len(trx_ids), e, trx_ids)
+
+
+def buy_tickets_batch(tickets: list[TicketCreate]) -> list[dict]:
+    """
+    Analisis banyak transaksi sekaligus: satu matrix N x 14, satu kali
+    score_samples, lalu bulk insert transactions dan tickets.
+    Urutan response sama dengan urutan input. Maksimal MAX_BATCH_SIZE item;
+    insert dikirim per INSERT_CHUNK row. Jika salah satu chunk gagal, row
+    yang sudah tertulis dihapus lagi (rollback_batch) sebelum error diteruskan.
+    """
+    if not tickets:
+        return []
+    if len(tickets) > MAX_BATCH_SIZE:
+        raise ValueError(f"Batch maksimal {MAX_BATCH_SIZE} tiket, diterima {len(tickets)}")
+
+    # Features + prediksi untuk seluruh batch dalam satu panggilan model
+    features_list = [calculate_ticket_features(t, velocity_features(t)) for t in tickets]
+    results = score_tickets(features_list)
+
+    # Ensure semua user ada di profile table (satu select, satu insert)
+    user_uuids = [ensure_uuid(t.user_id) for t in tickets]
+    ensure_profiles(user_uuids)
+
+    # Bulk insert transactions (PostgREST mengembalikan rows sesuai urutan input)
+    trx_rows = [
+        build_transaction_row(t, u, r) for t, u, r in zip(tickets, user_uuids, results)
+    ]
+    if PERSISTENCE_MODE == "write_behind":
+        trx_ids = [
+            enqueue_booking(t, row, features)
+            for t, row, features in zip(tickets, trx_rows, features_list)
+        ]
+        transaction_stats.record(results)
+        return [
+            build_ticket_response(t, trx_id, u, features, r)
+            for t, trx_id, u, features, r in zip(tickets, trx_ids, user_uuids, features_list, results)
+        ]
+
+    trx_ids = []
+    try:
+        for chunk in chunked(trx_rows, INSERT_CHUNK):
+            trx = transaction_model.create_transactions(chunk)
+            trx_ids.extend(row["id"] for row in trx.data)
+
+        # Bulk insert tickets untuk semua transaksi
+        ticket_rows = []
+        for t, trx_id, features in zip(tickets, trx_ids, features_list):
+            ticket_rows.extend(build_ticket_rows(t, trx_id, features))
+        for chunk in chunked(ticket_rows, INSERT_CHUNK):
+            ticket_model.create_tickets(chunk)
+    except Exception:
+        rollback_batch(trx_ids)
+        raise
+
+    transaction_stats.record(results)
+    return [
+        build_ticket_response(t, trx_id, u, features, r)
+        for t, trx_id, u, features, r in zip(tickets, trx_ids, user_uuids, features_list, results)
+    ]
 
 
 def buy_ticket_auto(ticket: TicketCreate) -> dict:
@@ -258,7 +571,73 @@ def buy_ticket_auto(ticket: TicketCreate) -> dict:
     return {"message": "Ticket created"}
 
 
-def list_tickets() -> list[TicketResponse]:
-    """Ambil semua tiket dari database"""
-    response = ticket_model.get_tickets()
-    return response.data
+TICKET_COLUMNS = (
+    "id", "created_at", "transaction_id", "passenger_name", "seat_number", "price",
+    "ticket_class_id", "base_price", "discount_amount", "final_price", "status_id",
+    "station_from_id", "station_to_id",
+)
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(row: dict) -> str:
+    raw = json.dumps([row["created_at"], row["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """
+    (created_at, id) dari cursor. Cursor berasal dari client dan nilainya
+    masuk ke filter or_ PostgREST, jadi keduanya di-parse lalu di-serialisasi
+    ulang; hanya nilai hasil serialisasi ulang yang dipakai.
+    """
+    try:
+        created_at, ticket_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at).isoformat(), str(uuid.UUID(ticket_id))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def ticket_columns(fields: str | None) -> str:
+    """Projection kolom; id dan created_at selalu ikut karena dipakai cursor."""
+    if not fields:
+        return ",".join(TICKET_COLUMNS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in TICKET_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    columns = ["id", "created_at"] + [f for f in requested if f not in ("id", "created_at")]
+    return ",".join(columns)
+
+
+def list_tickets(fields: str | None = None, filters: dict | None = None,
+                 cursor: str | None = None, limit: int = 100) -> dict:
+    """
+    Satu halaman tiket (keyset pagination, terbaru dulu).
+    next_cursor diisi jika masih ada halaman berikutnya.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = decode_cursor(cursor) if cursor else None
+    filters = {k: v for k, v in (filters or {}).items() if v is not None}
+    # Ambil satu row ekstra untuk tahu apakah ada halaman berikutnya
+    rows = ticket_model.get_tickets_page(ticket_columns(fields), filters, after, limit + 1).data
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "items": rows,
+        "next_cursor": encode_cursor(rows[-1]) if has_more else None,
+    }
+
+
+def iter_tickets(fields: str | None = None, filters: dict | None = None,
+                 cursor: str | None = None, page_size: int = 500):
+    """Generator row tiket halaman per halaman (memory bounded) untuk streaming NDJSON."""
+    columns = ticket_columns(fields)
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    after = decode_cursor(cursor) if cursor else None
+    filters = {k: v for k, v in (filters or {}).items() if v is not None}
+    while True:
+        rows = ticket_model.get_tickets_page(columns, filters, after, page_size).data
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after = (rows[-1]["created_at"], rows[-1]["id"])
@@ -1,8 +1,49 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from routers import ticket_router, chat_router
+from routers import ticket_router, chat_router, admin_router, metrics_router
 from fastapi.middleware.cors import CORSMiddleware
+from config.supabase import init_async_supabase, close_async_supabase
+from services.write_behind import write_behind_queue, PERSISTENCE_MODE
+from services.model_registry import model_registry
+from services.shadow_scoring import shadow_scorer
+from services.stats_service import transaction_stats
+from services.micro_batcher import micro_batcher, SCORING_BACKEND
+from services.process_scorer import process_scorer
+from ai_agents import chat_rag
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_async_supabase()
+    # Load model di startup agar request pertama tidak menanggung load time,
+    # lalu pantau MODELS_DIR untuk hot reload
+    model_registry.start()
+    shadow_scorer.start()
+    transaction_stats.start()
+    if SCORING_BACKEND == "batch":
+        micro_batcher.start()
+    elif SCORING_BACKEND == "process":
+        await asyncio.to_thread(process_scorer.start)
+    if PERSISTENCE_MODE == "write_behind":
+        write_behind_queue.start()
+    if chat_rag.RAG_BACKEND == "local":
+        try:
+            await asyncio.to_thread(chat_rag.vector_index.ensure_current)
+        except Exception as e:
+            print(f"⚠️  Local vector index belum bisa di-load: {e}")
+    yield
+    micro_batcher.stop()
+    process_scorer.stop()
+    transaction_stats.stop()
+    shadow_scorer.stop()
+    model_registry.stop()
+    if PERSISTENCE_MODE == "write_behind":
+        write_behind_queue.stop()
+    await close_async_supabase()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "*"
@@ -18,6 +59,8 @@ app.add_middleware(
 
 app.include_router(ticket_router.router)
 app.include_router(chat_router.router)
+app.include_router(admin_router.router)
+app.include_router(metrics_router.router)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,7 @@
+-- Input model yang ditulis build_transaction_row, dipakai services/rescoring.py
+-- untuk membangun ulang feature tanpa menebak nilai default.
+-- Jalankan sebelum deploy versi backend yang menulis kolom ini.
+alter table transactions
+    add column if not exists is_popular_route smallint,
+    add column if not exists ticket_class_id integer,
+    add column if not exists discount_amount numeric;
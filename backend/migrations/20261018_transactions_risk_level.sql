@@ -0,0 +1,8 @@
+-- Bucket severity (Low/Medium/High/Critical) saat transaksi di-score, ditulis
+-- build_transaction_row dan services/rescoring.py. services/stats_service.py
+-- menghitung statistik severity dari kolom ini, bukan dari threshold model aktif.
+-- Row lama bernilai NULL (dilaporkan sebagai "unclassified") sampai di-rescore.
+alter table transactions
+    add column if not exists risk_level text;
+
+create index if not exists transactions_risk_level_idx on transactions (risk_level);
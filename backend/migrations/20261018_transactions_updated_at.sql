@@ -0,0 +1,19 @@
+-- updated_at di-set setiap kali row transactions berubah (refund, status,
+-- rescoring), sehingga ai_agents/build_knowledge_base.py --incremental tahu
+-- transaksi lama mana yang berubah sejak build terakhir.
+alter table transactions
+    alter column updated_at set default now();
+
+create or replace function set_updated_at() returns trigger as $$
+begin
+    new.updated_at = now();
+    return new;
+end;
+$$ language plpgsql;
+
+drop trigger if exists transactions_set_updated_at on transactions;
+create trigger transactions_set_updated_at
+    before update on transactions
+    for each row execute function set_updated_at();
+
+create index if not exists transactions_updated_at_idx on transactions (updated_at);
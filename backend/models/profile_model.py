@@ -0,0 +1,26 @@
+from config.supabase import supabase, get_async_supabase
+
+
+def get_profile_ids(user_ids: list[str]):
+    return supabase.table("profile").select("id").in_("id", user_ids).execute()
+
+
+def create_profiles(rows: list[dict]):
+    return supabase.table("profile").insert(rows).execute()
+
+
+def upsert_profiles(rows: list[dict]):
+    # Insert jika belum ada, abaikan jika id sudah ada (tanpa select dulu)
+    return supabase.table("profile").upsert(rows, on_conflict="id", ignore_duplicates=True).execute()
+
+
+async def get_profile_ids_async(user_ids: list[str]):
+    return await get_async_supabase().table("profile").select("id").in_("id", user_ids).execute()
+
+
+async def create_profiles_async(rows: list[dict]):
+    return await get_async_supabase().table("profile").insert(rows).execute()
+
+
+async def upsert_profiles_async(rows: list[dict]):
+    return await get_async_supabase().table("profile").upsert(rows, on_conflict="id", ignore_duplicates=True).execute()
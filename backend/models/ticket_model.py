@@ -1,4 +1,4 @@
-from config.supabase import supabase
+from config.supabase import supabase, get_async_supabase
 
 
 def create_ticket(data: dict):
@@ -9,6 +9,25 @@ def get_tickets():
     return supabase.table("tickets").select("*").execute()
 
 
+def get_tickets_page(columns: str = "*", filters: dict | None = None,
+                     after: tuple[str, str] | None = None, limit: int = 100):
+    """
+    Satu halaman tickets, urut created_at/id terbaru dulu (keyset pagination).
+    after = (created_at, id) dari row terakhir halaman sebelumnya; nilai dari
+    client harus lewat decode_cursor dulu karena disisipkan ke filter or_.
+    """
+    query = supabase.table("tickets").select(columns)
+    for column, value in (filters or {}).items():
+        query = query.eq(column, value)
+    if after is not None:
+        created_at, ticket_id = after
+        query = query.or_(
+            f'created_at.lt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.lt.{ticket_id})'
+        )
+    return query.order("created_at", desc=True).order("id", desc=True).limit(limit).execute()
+
+
 def get_ticket_by_id(ticket_id: str):
     return supabase.table("tickets").select("*").eq("id", ticket_id).single().execute()
 
@@ -19,3 +38,19 @@ def update_ticket(ticket_id: str, data: dict):
 
 def delete_ticket(ticket_id: str):
     return supabase.table("tickets").delete().eq("id", ticket_id).execute()
+
+
+def create_tickets(rows: list[dict]):
+    return supabase.table("tickets").insert(rows).execute()
+
+
+def delete_tickets_by_transactions(transaction_ids: list[str]):
+    return supabase.table("tickets").delete().in_("transaction_id", transaction_ids).execute()
+
+
+def upsert_tickets(rows: list[dict]):
+    return supabase.table("tickets").upsert(rows, on_conflict="id", ignore_duplicates=True).execute()
+
+
+async def create_tickets_async(rows: list[dict]):
+    return await get_async_supabase().table("tickets").insert(rows).execute()
@@ -1,10 +1,26 @@
-from config.supabase import supabase
+from config.supabase import supabase, get_async_supabase
 
 
 def create_transaction(data: dict):
     return supabase.table("transactions").insert(data).execute()
 
 
+def create_transactions(rows: list[dict]):
+    return supabase.table("transactions").insert(rows).execute()
+
+
+def upsert_transactions(rows: list[dict]):
+    return supabase.table("transactions").upsert(rows, on_conflict="id", ignore_duplicates=True).execute()
+
+
+def delete_transactions(ids: list[str]):
+    return supabase.table("transactions").delete().in_("id", ids).execute()
+
+
+async def create_transaction_async(data: dict):
+    return await get_async_supabase().table("transactions").insert(data).execute()
+
+
 def get_transactions():
     return supabase.table("transactions").select("*").execute()
 
@@ -0,0 +1,49 @@
+from fastapi import APIRouter
+from ai_agents.answer_cache import answer_cache
+from services.feature_store import feature_store
+from services.model_registry import model_registry
+from services.micro_batcher import micro_batcher, SCORING_BACKEND
+from services.process_scorer import process_scorer
+from services.profile_cache import profile_cache
+from services.shadow_scoring import shadow_scorer
+from services.stats_service import transaction_stats
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+@router.get("/models")
+def model_status():
+    return model_registry.status()
+
+@router.get("/shadow")
+def shadow_report():
+    return shadow_scorer.report()
+
+@router.post("/shadow/reset")
+def shadow_reset():
+    shadow_scorer.reset()
+    return shadow_scorer.report()
+
+@router.get("/stats")
+def transaction_statistics():
+    return transaction_stats.snapshot()
+
+@router.get("/chat-cache")
+def chat_cache_stats():
+    return answer_cache.stats()
+
+@router.get("/profile-cache")
+def profile_cache_stats():
+    return profile_cache.stats()
+
+@router.get("/scoring")
+def scoring_stats():
+    return {
+        "backend": SCORING_BACKEND,
+        "batch": micro_batcher.stats(),
+        "process": process_scorer.stats(),
+    }
+
+@router.get("/feature-store")
+def feature_store_stats():
+    return feature_store.stats()
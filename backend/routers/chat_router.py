@@ -1,15 +1,37 @@
+import json
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from schema.chat_schema import ChatRequest, ChatResponse
-from ai_agents.chat_rag import ask
+from ai_agents.chat_rag import ask_async, ask_stream
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
 
 @router.post("/ask", response_model=ChatResponse)
-def ask_question(request: ChatRequest):
+async def ask_question(request: ChatRequest):
     """Endpoint untuk chat AI assistant anomaly monitoring"""
     try:
-        answer = ask(request.question)
-        return ChatResponse(answer=answer, status="success")
+        answer, metadata = await ask_async(request.question)
+        return ChatResponse(answer=answer, status="success", metadata=metadata)
     except Exception as e:
         return ChatResponse(answer=f"Maaf, terjadi kesalahan: {str(e)}", status="error")
+
+
+def sse_events(question: str):
+    """Format event dari ask_stream sebagai Server-Sent Events"""
+    try:
+        for item in ask_stream(question):
+            yield f"event: {item['event']}\ndata: {json.dumps(item['data'], ensure_ascii=False, default=str)}\n\n"
+    except Exception as e:
+        data = json.dumps({"message": f"Maaf, terjadi kesalahan: {str(e)}"}, ensure_ascii=False)
+        yield f"event: error\ndata: {data}\n\n"
+
+
+@router.post("/ask/stream")
+def ask_question_stream(request: ChatRequest):
+    """Versi streaming (SSE) dari /chat/ask: retrieval dulu, lalu token jawaban"""
+    return StreamingResponse(
+        sse_events(request.question),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from services.metrics import stage_metrics
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics")
+def metrics():
+    """Latency per stage /tickets/buy dan /chat/ask dalam format teks Prometheus."""
+    return Response(stage_metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
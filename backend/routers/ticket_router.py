@@ -1,15 +1,59 @@
-from fastapi import APIRouter
+import json
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from schema.ticket_schema import TicketCreate, TicketResponse
 from controllers import ticket_controller
+from services.write_behind import write_behind_queue
 
 router = APIRouter(prefix="/tickets", tags=["Tickets"])
 
 
 
 @router.post("/buy", response_model=TicketResponse)
-def buy_ticket(ticket: TicketCreate):
-    return ticket_controller.buy_ticket(ticket)
+async def buy_ticket(ticket: TicketCreate):
+    return await ticket_controller.buy_ticket_async(ticket)
 
-@router.get("/", response_model=list[TicketResponse])
-def list_tickets():
-    return ticket_controller.list_tickets()
+@router.post("/buy/batch", response_model=list[TicketResponse])
+def buy_tickets_batch(tickets: list[TicketCreate]):
+    if len(tickets) > ticket_controller.MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch maksimal {ticket_controller.MAX_BATCH_SIZE} tiket, diterima {len(tickets)}",
+        )
+    return ticket_controller.buy_tickets_batch(tickets)
+
+@router.get("/")
+def list_tickets(
+    fields: str | None = Query(None, description="Kolom dipisah koma, mis. id,seat_number,price"),
+    station_from_id: int | None = None,
+    station_to_id: int | None = None,
+    ticket_class_id: int | None = None,
+    status_id: int | None = None,
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=ticket_controller.MAX_PAGE_SIZE),
+    stream: bool = Query(False, description="NDJSON, semua halaman mulai dari cursor"),
+):
+    filters = {
+        "station_from_id": station_from_id,
+        "station_to_id": station_to_id,
+        "ticket_class_id": ticket_class_id,
+        "status_id": status_id,
+    }
+    try:
+        if stream:
+            # Validasi fields/cursor sebelum response mulai dikirim
+            ticket_controller.ticket_columns(fields)
+            if cursor:
+                ticket_controller.decode_cursor(cursor)
+            rows = ticket_controller.iter_tickets(fields, filters, cursor, page_size=limit)
+            return StreamingResponse(
+                (json.dumps(row, default=str) + "\n" for row in rows),
+                media_type="application/x-ndjson",
+            )
+        return ticket_controller.list_tickets(fields, filters, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/persistence/stats")
+def persistence_stats():
+    return write_behind_queue.stats()
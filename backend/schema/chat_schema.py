@@ -11,3 +11,4 @@ class ChatResponse(BaseModel):
     """Schema untuk response chat"""
     answer: str
     status: Optional[str] = "success"
+    metadata: Optional[dict] = None
@@ -66,7 +66,9 @@ class TicketResponse(TicketBase):
     score: float
     risk_score: Optional[float] = None
     risk_level: Optional[str] = None
+    risk_calibrated: Optional[bool] = None
     is_scalper: Optional[bool] = None
+    model_version: Optional[str] = None
     
     # Price validation
     price_validation: Optional[dict] = None
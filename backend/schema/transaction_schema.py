@@ -13,6 +13,10 @@ class TransactionBase(BaseModel):
     status_id: int
     device_fingerprint: str | None = None
     ip_address: str | None = None
+    is_popular_route: int | None = None
+    ticket_class_id: int | None = None
+    discount_amount: float | None = None
+    risk_level: str | None = None
 
 class TransactionCreate(TransactionBase):
     pass
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Window velocity: nama -> (span detik, jumlah bucket ring buffer)
+WINDOWS = {
+    "1m": (60, 12),
+    "10m": (600, 10),
+    "1h": (3600, 12),
+}
+KINDS = ("user", "device", "ip")
+METRICS = ("txn_count", "ticket_sum", "distinct_routes")
+
+VELOCITY_FEATURE_NAMES = [
+    f"{kind}_{metric}_{window}" for kind in KINDS for metric in METRICS for window in WINDOWS
+]
+
+# "auto": transaksi hanya dicatat jika model aktif memakai velocity features;
+# "always": selalu dicatat (mis. untuk warm-up sebelum model velocity dirilis)
+VELOCITY_OBSERVE = os.getenv("VELOCITY_OBSERVE", "auto").lower()
+
+
+def uses_velocity(feature_names) -> bool:
+    return not set(feature_names).isdisjoint(VELOCITY_FEATURE_NAMES)
+
+
+class WindowCounter:
+    """
+    Sliding window berbasis ring buffer time-bucket.
+    Menyimpan jumlah transaksi, jumlah tiket dan rute distinct dalam window;
+    update O(1) (amortized, maksimal n_buckets slot di-expire per advance).
+    """
+
+    __slots__ = ("bucket_seconds", "n_buckets", "head", "counts", "tickets", "routes",
+                 "txn_count", "ticket_sum", "route_counts")
+
+    def __init__(self, span, n_buckets):
+        self.bucket_seconds = span / n_buckets
+        self.n_buckets = n_buckets
+        self.head = None
+        self.counts = [0] * n_buckets
+        self.tickets = [0] * n_buckets
+        self.routes = [None] * n_buckets
+        self.txn_count = 0
+        self.ticket_sum = 0
+        self.route_counts = {}
+
+    def _advance(self, now):
+        bucket = int(now // self.bucket_seconds)
+        if self.head is None:
+            self.head = bucket
+            return
+        if bucket <= self.head:
+            return
+        # Expire slot yang keluar dari window
+        for step in range(1, min(bucket - self.head, self.n_buckets) + 1):
+            slot = (self.head + step) % self.n_buckets
+            self.txn_count -= self.counts[slot]
+            self.ticket_sum -= self.tickets[slot]
+            if self.routes[slot]:
+                for route, count in self.routes[slot].items():
+                    remaining = self.route_counts[route] - count
+                    if remaining:
+                        self.route_counts[route] = remaining
+                    else:
+                        del self.route_counts[route]
+            self.counts[slot] = 0
+            self.tickets[slot] = 0
+            self.routes[slot] = None
+        self.head = bucket
+
+    def add(self, now, num_tickets, route):
+        self._advance(now)
+        # Event dengan timestamp lebih lama dari head masuk ke bucket terbaru
+        slot = self.head % self.n_buckets
+        self.counts[slot] += 1
+        self.tickets[slot] += num_tickets
+        self.txn_count += 1
+        self.ticket_sum += num_tickets
+        if self.routes[slot] is None:
+            self.routes[slot] = {}
+        self.routes[slot][route] = self.routes[slot].get(route, 0) + 1
+        self.route_counts[route] = self.route_counts.get(route, 0) + 1
+
+    def snapshot(self, now):
+        self._advance(now)
+        return self.txn_count, self.ticket_sum, len(self.route_counts)
+
+
+class VelocityFeatureStore:
+    """
+    Feature store streaming in-memory untuk velocity per user / device / IP.
+    Memory dibatasi: key yang idle lebih lama dari idle_ttl atau melebihi
+    max_keys (LRU) di-evict.
+    """
+
+    def __init__(self, max_keys=200_000, idle_ttl=3600.0):
+        self.max_keys = max_keys
+        self.idle_ttl = idle_ttl
+        self._entries = OrderedDict()  # (kind, key) -> (last_seen, {window: WindowCounter})
+        self._lock = threading.Lock()
+        self.observed = 0
+        self.evicted = 0
+
+    def observe(self, user_id, device_id, ip_id, num_tickets, route, now=None) -> dict:
+        """Catat satu transaksi lalu kembalikan velocity features (termasuk transaksi ini)."""
+        now = time.time() if now is None else now
+        features = {}
+        with self._lock:
+            self.observed += 1
+            for kind, key in (("user", user_id), ("device", device_id), ("ip", ip_id)):
+                if key is None:
+                    for metric in METRICS:
+                        for window in WINDOWS:
+                            features[f"{kind}_{metric}_{window}"] = 0
+                    continue
+                counters = self._touch((kind, key), now)
+                for window, counter in counters.items():
+                    counter.add(now, num_tickets, route)
+                    txn_count, ticket_sum, distinct_routes = counter.snapshot(now)
+                    features[f"{kind}_txn_count_{window}"] = txn_count
+                    features[f"{kind}_ticket_sum_{window}"] = ticket_sum
+                    features[f"{kind}_distinct_routes_{window}"] = distinct_routes
+            self._evict(now)
+        return features
+
+    def _touch(self, entry_key, now):
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            counters = {window: WindowCounter(span, n) for window, (span, n) in WINDOWS.items()}
+        else:
+            counters = entry[1]
+            self._entries.move_to_end(entry_key)
+        self._entries[entry_key] = (now, counters)
+        return counters
+
+    def _evict(self, now):
+        # OrderedDict terurut dari key paling lama tidak aktif
+        while self._entries:
+            entry_key, (last_seen, _) = next(iter(self._entries.items()))
+            if len(self._entries) > self.max_keys or now - last_seen > self.idle_ttl:
+                del self._entries[entry_key]
+                self.evicted += 1
+            else:
+                break
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.observed = 0
+            self.evicted = 0
+
+    def stats(self) -> dict:
+        return {
+            "observe_mode": VELOCITY_OBSERVE,
+            "keys": len(self._entries),
+            "max_keys": self.max_keys,
+            "idle_ttl": self.idle_ttl,
+            "observed": self.observed,
+            "evicted": self.evicted,
+        }
+
+
+feature_store = VelocityFeatureStore(
+    max_keys=int(os.getenv("VELOCITY_MAX_KEYS", "200000")),
+    idle_ttl=float(os.getenv("VELOCITY_IDLE_TTL", "3600")),
+)
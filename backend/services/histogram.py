@@ -0,0 +1,42 @@
+import bisect
+import threading
+
+
+class Histogram:
+    """
+    Histogram dengan bucket tetap (upper bound inklusif, gaya Prometheus).
+    observe() O(log n_buckets); snapshot() mengembalikan count kumulatif per bucket.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float):
+        """Perkiraan quantile (upper bound bucket tempat quantile jatuh)."""
+        with self._lock:
+            if not self.count:
+                return None
+            target, running = q * self.count, 0
+            for bound, count in zip(self.buckets + (float("inf"),), self._counts):
+                running += count
+                if running >= target:
+                    return bound
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative, running = {}, 0
+            for bound, count in zip(self.buckets + (float("inf"),), self._counts):
+                running += count
+                cumulative["+Inf" if bound == float("inf") else bound] = running
+            return {"buckets": cumulative, "count": self.count, "sum": self.sum}
@@ -0,0 +1,141 @@
+import threading
+import time
+from services.histogram import Histogram
+
+# Bucket latency per stage (detik), dari 100us sampai 10s
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_bound(bound) -> str:
+    return bound if bound == "+Inf" else repr(float(bound))
+
+
+class StageMetrics:
+    """
+    Histogram latency per (route, stage, model_version).
+
+    Setiap thread mencatat ke recorder miliknya sendiri (dict histogram
+    thread-local), jadi observe() tidak berebut lock dengan request thread
+    lain; lock histogram hanya bertemu scraper. render() menggabungkan semua
+    recorder saat /metrics di-scrape.
+    """
+
+    def __init__(self, name="canomaly_stage_duration_seconds", buckets=STAGE_BUCKETS):
+        self.name = name
+        self.buckets = buckets
+        self._local = threading.local()
+        self._recorders = []
+        self._lock = threading.Lock()
+
+    def _recorder(self) -> dict:
+        recorder = getattr(self._local, "recorder", None)
+        if recorder is None:
+            recorder = self._local.recorder = {}
+            with self._lock:
+                self._recorders.append(recorder)
+        return recorder
+
+    def observe(self, route: str, stage: str, seconds: float, model_version=None):
+        self.observe_many(route, [(stage, seconds)], model_version)
+
+    def observe_many(self, route: str, stages, model_version=None):
+        """Catat banyak (stage, detik) sekaligus; recorder thread cukup dicari sekali."""
+        recorder = self._recorder()
+        version = model_version or ""
+        for stage, seconds in stages:
+            histogram = recorder.get((route, stage, version))
+            if histogram is None:
+                histogram = recorder[(route, stage, version)] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def collect(self) -> dict:
+        """Gabungan snapshot semua thread: {(route, stage, model_version): snapshot}"""
+        with self._lock:
+            recorders = list(self._recorders)
+        merged = {}
+        for recorder in recorders:
+            for key, histogram in list(recorder.items()):
+                snapshot = histogram.snapshot()
+                total = merged.get(key)
+                if total is None:
+                    merged[key] = snapshot
+                    continue
+                for bound, count in snapshot["buckets"].items():
+                    total["buckets"][bound] += count
+                total["count"] += snapshot["count"]
+                total["sum"] += snapshot["sum"]
+        return merged
+
+    def render(self) -> str:
+        """Format teks Prometheus (exposition format 0.0.4)."""
+        lines = [
+            f"# HELP {self.name} Latency per stage pipeline request.",
+            f"# TYPE {self.name} histogram",
+        ]
+        for (route, stage, version), snapshot in sorted(self.collect().items()):
+            labels = f'route="{_escape(route)}",stage="{_escape(stage)}",model_version="{_escape(version)}"'
+            for bound, count in snapshot["buckets"].items():
+                lines.append(f'{self.name}_bucket{{{labels},le="{_format_bound(bound)}"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {snapshot['sum']!r}")
+            lines.append(f"{self.name}_count{{{labels}}} {snapshot['count']}")
+        return "\n".join(lines) + "\n"
+
+
+stage_metrics = StageMetrics()
+
+
+class StageTrace:
+    """
+    Timer per stage untuk satu request.
+
+        with StageTrace("/tickets/buy") as trace:
+            trace.stage("features")   # mulai stage baru, stage sebelumnya selesai
+            ...
+            trace.model_version = result.get('model_version')
+
+    Durasi disimpan di request dan baru dicatat ke stage_metrics saat selesai
+    (juga jika ada exception), sehingga semua stage mendapat label model_version
+    yang baru diketahui setelah scoring. Stage "total" = durasi seluruh request.
+    """
+
+    __slots__ = ("route", "model_version", "stages", "_started", "_current", "_current_start")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.model_version = None
+        self.stages = []
+        self._started = time.perf_counter()
+        self._current = None
+        self._current_start = self._started
+
+    def stage(self, name):
+        """Akhiri stage yang sedang berjalan dan mulai stage `name` (None = tanpa stage)."""
+        now = time.perf_counter()
+        if self._current is not None:
+            self.stages.append((self._current, now - self._current_start))
+        self._current, self._current_start = name, now
+
+    async def timed(self, name, awaitable):
+        """Ukur satu awaitable sebagai stage sendiri (untuk stage yang berjalan paralel)."""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def finish(self):
+        self.stage(None)
+        self.stages.append(("total", time.perf_counter() - self._started))
+        stage_metrics.observe_many(self.route, self.stages, self.model_version)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.finish()
+        return False
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from services.histogram import Histogram
+from services.model_registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+# Backend scoring per request: "inline" (predict langsung) atau "batch" (micro-batching)
+SCORING_BACKEND = os.getenv("SCORING_BACKEND", "inline")
+
+
+class MicroBatcher:
+    """
+    Micro-batching di depan detector.
+
+    Request single-row dari banyak thread/coroutine masuk ke satu queue.
+    Collector thread mengambil row pertama, menunggu row lain paling lama
+    max_wait_ms (dihitung dari row pertama masuk) atau sampai max_batch_size,
+    lalu memanggil predict sekali untuk seluruh batch dan mengisi Future
+    masing-masing caller. Collector hanya menunggu jika ada tanda load
+    (caller lain sedang aktif atau batch sebelumnya berisi >1 row); request
+    tunggal pada load rendah langsung di-score tanpa delay.
+    """
+
+    def __init__(self, max_batch_size=32, max_wait_ms=2.0):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batch_fill = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256])
+        self.queue_delay_ms = Histogram([0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100])
+        self.batches = 0
+        self.rows = 0
+        self._active = 0
+        self._last_batch_size = 1
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(5)
+
+    def submit(self, features: dict) -> Future:
+        """Masukkan satu row features; Future berisi dict hasil predict (plus model_version)."""
+        if self._thread is None:
+            self.start()
+        future = Future()
+        with self._lock:
+            self._active += 1
+        self._queue.put((features, future, time.perf_counter()))
+        return future
+
+    def predict(self, features: dict) -> dict:
+        return self.submit(features).result()
+
+    async def predict_async(self, features: dict) -> dict:
+        return await asyncio.wrap_future(self.submit(features))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = item[2] + self.max_wait
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                # Tidak ada caller lain dan tidak sedang ramai: jangan menunggu
+                idle = self._active <= len(batch) and self._last_batch_size <= 1
+                remaining = 0 if idle else deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._score(batch)
+            if stopping:
+                return
+
+    def _score(self, batch):
+        started = time.perf_counter()
+        for _, _, enqueued in batch:
+            self.queue_delay_ms.observe((started - enqueued) * 1000)
+        self.batch_fill.observe(len(batch))
+        self._last_batch_size = len(batch)
+        self.batches += 1
+        self.rows += len(batch)
+
+        try:
+            with model_registry.acquire() as model:
+                columns = model.detector.predict([features for features, _, _ in batch], columnar=True)
+            columns = {name: values.tolist() for name, values in columns.items()}
+        except Exception as e:
+            self._resolved(len(batch))
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        self._resolved(len(batch))
+        for i, (_, future, _) in enumerate(batch):
+            result = {name: values[i] for name, values in columns.items()}
+            result['model_version'] = model.version
+            future.set_result(result)
+
+    def _resolved(self, n):
+        with self._lock:
+            self._active -= n
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": round(self.rows / self.batches, 2) if self.batches else None,
+            "batch_fill": self.batch_fill.snapshot(),
+            "queue_delay_ms": self.queue_delay_ms.snapshot(),
+        }
+
+
+micro_batcher = MicroBatcher(
+    max_batch_size=int(os.getenv("MICRO_BATCH_SIZE", "32")),
+    max_wait_ms=float(os.getenv("MICRO_BATCH_WAIT_MS", "2")),
+)
@@ -0,0 +1,223 @@
+import glob
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from services.model_service import BASE_DIR, MODEL_PATH, load_detector
+from services.feature_store import uses_velocity
+from services.scalper_detector import ScalperDetectorAPI
+from services.shadow_scoring import SHADOW_MODELS
+
+logger = logging.getLogger(__name__)
+
+# Direktori khusus versi model untuk hot reload. Kosong / belum ada -> MODEL_PATH.
+# Jangan arahkan ke backend/: model challenger atau kandidat rescoring yang
+# ditaruh di sana akan ikut dipromosikan.
+MODELS_DIR = os.getenv("MODELS_DIR", os.path.join(BASE_DIR, "model_versions"))
+MODEL_POLL_INTERVAL = float(os.getenv("MODEL_POLL_INTERVAL", "5"))
+# Jumlah fingerprint artefak gagal yang diingat (yang tertua dibuang)
+MAX_FAILED = 32
+
+
+class ModelVersion:
+    """Satu versi model yang sudah di-load, dengan refcount request in-flight."""
+
+    def __init__(self, version: str, path: str, detector: ScalperDetectorAPI, fingerprint=None):
+        self.version = version
+        self.path = path
+        self.detector = detector
+        self.fingerprint = fingerprint
+        self.uses_velocity = uses_velocity(detector.feature_names)
+        self.loaded_at = time.time()
+        self.in_flight = 0
+
+
+def model_version(path: str) -> str:
+    """Versi = nama file + mtime, sehingga file yang ditimpa juga terdeteksi."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}-{int(os.stat(path).st_mtime)}"
+
+
+def file_fingerprint(path: str) -> tuple:
+    """
+    Identitas isi file untuk deteksi perubahan: path + size + mtime_ns.
+    Lebih teliti dari label versi (detik), jadi file yang di-copy non-atomik
+    lalu selesai di detik yang sama tetap terdeteksi sebagai file baru.
+    """
+    st = os.stat(path)
+    return (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+
+
+class ModelRegistry:
+    """
+    Registry model berversi dengan hot reload.
+
+    Background thread memantau models_dir; artefak .pkl terbaru di-load,
+    divalidasi dan di-warm-up di background, lalu referensi aktif di-swap
+    secara atomik. Request yang sedang berjalan tetap memakai versi lama
+    (lihat acquire()) dan versi lama di-evict setelah semua request selesai.
+    """
+
+    def __init__(self, models_dir=MODELS_DIR, poll_interval=MODEL_POLL_INTERVAL, default_path=MODEL_PATH,
+                 excluded=SHADOW_MODELS):
+        self.models_dir = models_dir
+        self.poll_interval = poll_interval
+        self.default_path = default_path
+        # Model shadow tidak pernah dipromosikan otomatis
+        self.excluded = {os.path.realpath(p.strip()) for p in excluded if p.strip()}
+        self._active = None
+        self._retired = []
+        self._failed = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------------- Serving ---------------- #
+
+    @property
+    def active(self) -> ModelVersion:
+        if self._active is None:
+            with self._load_lock:
+                if self._active is None:
+                    path = self._latest_path() or self.default_path
+                    self._swap(self._load(path))
+        return self._active
+
+    @contextmanager
+    def acquire(self):
+        """Pinjam versi aktif selama satu request; swap tidak mempengaruhi request ini."""
+        self.active  # pastikan versi awal sudah di-load
+        with self._lock:
+            model = self._active
+            model.in_flight += 1
+        try:
+            yield model
+        finally:
+            with self._lock:
+                model.in_flight -= 1
+                self._evict_drained()
+
+    # ---------------- Loading ---------------- #
+
+    def _latest_path(self):
+        paths = [
+            p for p in glob.glob(os.path.join(self.models_dir, "*.pkl"))
+            if os.path.realpath(p) not in self.excluded
+        ]
+        return max(paths, key=os.path.getmtime) if paths else None
+
+    def _load(self, path: str) -> ModelVersion:
+        fingerprint = file_fingerprint(path)
+        version = model_version(path)
+        detector = load_detector(path)
+        self._validate(detector)
+        logger.info("Model version %s ready (%s)", version, detector.load_info)
+        return ModelVersion(version, path, detector, fingerprint)
+
+    def _validate(self, detector: ScalperDetectorAPI):
+        """Cek konsistensi artefak dan warm-up dengan beberapa prediksi sintetis."""
+        if detector.forest is None:
+            raise ValueError("Model artefact has no compiled forest")
+        n_features = len(detector.feature_names)
+        if int(np.max(detector.forest.feature)) >= n_features:
+            raise ValueError("Forest references features outside feature_names")
+
+        rng = np.random.default_rng(0)
+        X = np.vstack([np.zeros(n_features), np.ones(n_features), rng.random((6, n_features)) * 1e5])
+        scores = detector.predict(X, columnar=True)['score']
+        if scores.shape != (len(X),) or not np.all(np.isfinite(scores)) or np.any(scores > 0):
+            raise ValueError("Warm-up predictions are invalid")
+
+    def _swap(self, model: ModelVersion):
+        with self._lock:
+            previous = self._active
+            self._active = model
+            if previous is not None:
+                self._retired.append(previous)
+            self._evict_drained()
+
+    def _evict_drained(self):
+        # Dipanggil dengan self._lock
+        drained = [m for m in self._retired if m.in_flight == 0]
+        for m in drained:
+            self._retired.remove(m)
+            logger.info("Evicted model version %s", m.version)
+
+    def reload(self) -> bool:
+        """Load artefak terbaru jika berbeda dari versi aktif. True jika terjadi swap."""
+        path = self._latest_path()
+        if path is None:
+            return False
+        # File gagal diingat per fingerprint: file yang sama tidak dicoba ulang,
+        # tapi begitu isinya berubah (mis. copy selesai) langsung dicoba lagi
+        fingerprint = file_fingerprint(path)
+        if (self._active is not None and fingerprint == self._active.fingerprint) or fingerprint in self._failed:
+            return False
+        version = model_version(path)
+        try:
+            with self._load_lock:
+                model = self._load(path)
+        except Exception as e:
+            logger.error("Model version %s rejected: %s", version, e)
+            self._failed[fingerprint] = version
+            while len(self._failed) > MAX_FAILED:
+                del self._failed[next(iter(self._failed))]
+            return False
+        self._swap(model)
+        for callback in list(self._listeners):
+            try:
+                callback(model)
+            except Exception as e:
+                logger.error("Model swap listener error: %s", e)
+        return True
+
+    def add_listener(self, callback):
+        """callback(model) dipanggil di thread watcher setiap kali versi baru aktif."""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    # ---------------- Watcher ---------------- #
+
+    def start(self):
+        """Load versi awal lalu pantau models_dir di background."""
+        self.active  # load versi awal
+        if self._thread is not None or self.poll_interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.poll_interval + 1)
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error("Model watcher error: %s", e)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "active": self._active.version if self._active else None,
+                "calibrated": self._active.detector.score_quantiles is not None if self._active else None,
+                "load_info": getattr(self._active.detector, 'load_info', None) if self._active else None,
+                "retired": [{"version": m.version, "in_flight": m.in_flight} for m in self._retired],
+                "failed": sorted(set(self._failed.values())),
+            }
+
+
+model_registry = ModelRegistry()
+
+
+def get_detector() -> ScalperDetectorAPI:
+    """Detector versi aktif (untuk pemakaian di luar request)."""
+    return model_registry.active.detector
@@ -1,17 +1,317 @@
-from services.scalper_detector import ScalperDetectorAPI
+from services.scalper_detector import ScalperDetectorAPI, CompiledForest
+import json
+import logging
 import pickle
+import os
+import shutil
+import time
+from contextlib import contextmanager
 
-# Load model dengan 14 features
-api_detector = ScalperDetectorAPI()
+try:
+    import fcntl
+except ImportError:  # Windows: tanpa lock antar proses
+    fcntl = None
 
-with open("canomaly.pkl", "rb") as f:
-    model_assets = pickle.load(f)
+logger = logging.getLogger(__name__)
 
-api_detector.model = model_assets['model']
-api_detector.scaler = model_assets['scaler']
-api_detector.feature_names = model_assets.get('feature_names', api_detector.feature_names)
-api_detector.contamination = model_assets.get('contamination', 0.05)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.getenv("MODEL_PATH", os.path.join(BASE_DIR, "canomaly.pkl"))
 
-print(f"Model loaded successfully!")
-print(f"Features: {len(api_detector.feature_names)}")
-print(f"Contamination: {api_detector.contamination}")
\ No newline at end of file
+
+def fused_dir(model_path: str) -> str:
+    """
+    Path artefak fused (array .npy) di samping file .pkl. Berupa symlink ke
+    directory versi (<model>.fused.v<ns>-<pid>) yang di-swap atomik saat build.
+    """
+    return os.path.splitext(model_path)[0] + ".fused"
+
+
+# Versi artefak lama yang disimpan selain versi aktif (proses lain mungkin
+# masih membacanya tepat saat swap)
+FUSED_KEEP_VERSIONS = 1
+
+
+@contextmanager
+def _publish_lock(target: str):
+    if fcntl is None:
+        yield
+        return
+    with open(f"{target}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _publish_fused(tmp_dir: str, target: str):
+    """
+    Publish artefak hasil build: tmp_dir di-rename ke directory versi baru,
+    lalu symlink target di-ganti dengan os.replace (atomik), sehingga target
+    tidak pernah hilang atau setengah jadi bagi pembaca. Versi lama di-prune.
+    """
+    prefix = os.path.basename(target) + ".v"
+    version_dir = f"{target}.v{time.time_ns()}-{os.getpid()}"
+    with _publish_lock(target):
+        os.rename(tmp_dir, version_dir)
+        if os.path.isdir(target) and not os.path.islink(target):
+            # Artefak format lama (directory biasa): sekali saja ada jeda saat upgrade
+            shutil.rmtree(target)
+        link = f"{target}.link-{os.getpid()}"
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(os.path.basename(version_dir), link)
+        os.replace(link, target)
+
+        parent = os.path.dirname(target) or "."
+        versions = sorted(
+            (os.path.join(parent, name) for name in os.listdir(parent) if name.startswith(prefix)),
+            key=os.path.getmtime,
+        )
+        stale = [v for v in versions if v != version_dir]
+        for old in stale[:max(len(stale) - FUSED_KEEP_VERSIONS, 0)]:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def reference_path(model_path: str) -> str:
+    """CSV referensi kalibrasi risk score: CALIBRATION_CSV atau <model>.reference.csv di samping pkl."""
+    return os.getenv("CALIBRATION_CSV") or os.path.splitext(model_path)[0] + ".reference.csv"
+
+
+STAMP_KEYS = ('source_mtime', 'source_size', 'reference_mtime', 'reference_size')
+
+
+def _source_stamp(model_path: str) -> dict:
+    """Identitas pkl + CSV referensi; artefak fused di-build ulang jika salah satunya berubah."""
+    stat = os.stat(model_path)
+    stamp = {'source_mtime': stat.st_mtime, 'source_size': stat.st_size,
+             'reference_mtime': None, 'reference_size': None}
+    reference = reference_path(model_path)
+    if os.path.exists(reference):
+        ref_stat = os.stat(reference)
+        stamp.update(reference_mtime=ref_stat.st_mtime, reference_size=ref_stat.st_size)
+    return stamp
+
+
+def read_reference_csv(path: str) -> list[dict]:
+    import csv
+
+    with open(path, newline="") as f:
+        return [{k: float(v) for k, v in row.items() if v != ""} for row in csv.DictReader(f)]
+
+
+def _resident_memory_mb() -> float:
+    """RSS proses saat ini (Linux /proc), fallback ke peak RSS."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build_fused_model(model_path: str = MODEL_PATH) -> str:
+    """
+    Build artefak fused dari canomaly.pkl: CompiledForest dengan StandardScaler
+    dilipat ke threshold, disimpan sebagai array .npy + model.json.
+    Ditulis ke directory sementara lalu di-publish lewat swap symlink
+    (_publish_fused) agar worker lain tidak membaca artefak setengah jadi.
+
+    Kalibrasi risk score diambil dari 'score_quantiles' di pkl; jika belum
+    ada dan CSV referensi tersedia (reference_path), kalibrasi di-fit di sini.
+    """
+    with open(model_path, "rb") as f:
+        assets = pickle.load(f)
+
+    forest = CompiledForest.from_isolation_forest(assets['model']).fuse_scaler(assets['scaler'])
+    feature_names = assets.get('feature_names', ScalperDetectorAPI().feature_names)
+    stamp = _source_stamp(model_path)
+
+    quantiles = assets.get('score_quantiles')
+    calibration = 'pkl' if quantiles is not None else None
+    if quantiles is None and stamp['reference_size'] is not None:
+        detector = ScalperDetectorAPI()
+        detector.feature_names = feature_names
+        detector.forest = forest
+        quantiles = detector.fit_calibration(read_reference_csv(reference_path(model_path)))
+        calibration = 'reference_csv'
+
+    target = fused_dir(model_path)
+    tmp_dir = f"{target}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    forest.save(tmp_dir)
+    if quantiles is not None:
+        import numpy as np
+        np.save(os.path.join(tmp_dir, "score_quantiles.npy"), np.asarray(quantiles))
+    with open(os.path.join(tmp_dir, "model.json"), "w") as f:
+        json.dump({
+            'feature_names': feature_names,
+            'contamination': assets.get('contamination', 0.05),
+            'calibration': calibration,
+            **stamp,
+        }, f)
+
+    _publish_fused(tmp_dir, target)
+    return target
+
+
+def load_detector(model_path: str = MODEL_PATH) -> ScalperDetectorAPI:
+    """
+    Load ScalperDetectorAPI dari artefak fused yang di-mmap.
+    canomaly.pkl hanya di-unpickle jika artefak belum ada atau sudah basi.
+    """
+    start = time.perf_counter()
+
+    def read_meta():
+        # Resolve symlink sekali: meta dan array dibaca dari versi yang sama
+        # walaupun proses lain mem-publish versi baru di tengah load
+        resolved = os.path.realpath(fused_dir(model_path))
+        meta_path = os.path.join(resolved, "model.json")
+        if not os.path.exists(meta_path):
+            return resolved, None
+        with open(meta_path) as f:
+            return resolved, json.load(f)
+
+    target, meta = read_meta()
+    if meta is None or {k: meta.get(k) for k in STAMP_KEYS} != _source_stamp(model_path):
+        build_fused_model(model_path)
+        target, meta = read_meta()
+
+    detector = ScalperDetectorAPI()
+    detector.model = None
+    detector.scaler = None
+    detector.feature_names = meta['feature_names']
+    detector.contamination = meta['contamination']
+    detector.forest = CompiledForest.load(target, mmap_mode='r')
+
+    quantiles_path = os.path.join(target, "score_quantiles.npy")
+    if os.path.exists(quantiles_path):
+        import numpy as np
+        detector.score_quantiles = np.load(quantiles_path, mmap_mode='r')
+
+    detector.load_info = {
+        'model_path': model_path,
+        'load_time_ms': (time.perf_counter() - start) * 1000,
+        'rss_mb': _resident_memory_mb(),
+        'features': len(detector.feature_names),
+        'calibrated': detector.score_quantiles is not None,
+        'calibration': meta.get('calibration'),
+    }
+    logger.info("Model loaded: %s", detector.load_info)
+    return detector
+
+
+def save_calibration(reference_csv: str, model_path: str = MODEL_PATH):
+    """
+    Fit kalibrasi risk score dari CSV referensi (kolom = feature_names)
+    lalu simpan 'score_quantiles' ke canomaly.pkl di samping model/scaler.
+    """
+    rows = read_reference_csv(reference_csv)
+    quantiles = load_detector(model_path).fit_calibration(rows)
+
+    with open(model_path, "rb") as f:
+        assets = pickle.load(f)
+    assets['score_quantiles'] = quantiles
+    with open(model_path, "wb") as f:
+        pickle.dump(assets, f)
+
+    logger.info(f"Calibration fitted on {len(rows)} reference rows -> {model_path}")
+
+
+def export_reference(output_csv: str, model_path: str = MODEL_PATH, limit: int = 100_000):
+    """
+    Tulis CSV referensi kalibrasi dari transaksi tersimpan (feature dibangun
+    ulang seperti rescoring). Simpan sebagai <model>.reference.csv agar
+    build_fused_model mengkalibrasi artefak berikutnya.
+    """
+    import csv
+    from services.rescoring import fetch_transactions, transaction_features
+
+    feature_names = load_detector(model_path).feature_names
+    written = 0
+    with open(output_csv, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=feature_names, extrasaction="ignore")
+        writer.writeheader()
+        for rows in fetch_transactions():
+            for row in rows:
+                features = transaction_features(row)
+                if features is None or any(features.get(name) is None for name in feature_names):
+                    continue
+                writer.writerow(features)
+                written += 1
+                if written >= limit:
+                    break
+            if written >= limit:
+                break
+
+    logger.info(f"Exported {written} reference rows -> {output_csv}")
+    return written
+
+
+def train_model(history_csv: str, model_path: str = MODEL_PATH):
+    """
+    Retrain model dengan 14 features + velocity features.
+    CSV histori berisi kolom feature_names dasar plus user_id, device_id,
+    ip_id dan transaction_time; velocity di-replay berurutan waktu dengan
+    VelocityFeatureStore yang sama seperti online.
+    """
+    import csv
+    from datetime import datetime
+    from services.feature_store import VelocityFeatureStore, VELOCITY_FEATURE_NAMES
+
+    id_columns = ('user_id', 'device_id', 'ip_id', 'transaction_time')
+    with open(history_csv, newline="") as f:
+        rows = list(csv.DictReader(f))
+    rows.sort(key=lambda r: r['transaction_time'])
+
+    detector = ScalperDetectorAPI()
+    base_features = list(detector.feature_names)
+    store = VelocityFeatureStore(max_keys=10_000_000)
+
+    records = []
+    for row in rows:
+        record = {k: float(v) for k, v in row.items() if k not in id_columns and v != ""}
+        record.update(store.observe(
+            user_id=row.get('user_id') or None,
+            device_id=row.get('device_id') or None,
+            ip_id=row.get('ip_id') or None,
+            num_tickets=int(record.get('num_tickets', 1)),
+            route=(record.get('station_from_id'), record.get('station_to_id')),
+            now=datetime.fromisoformat(row['transaction_time']).timestamp(),
+        ))
+        records.append(record)
+
+    detector.feature_names = base_features + VELOCITY_FEATURE_NAMES
+    detector.fit(records)
+    detector.fit_calibration(records)
+
+    with open(model_path, "wb") as f:
+        pickle.dump({
+            'model': detector.model,
+            'scaler': detector.scaler,
+            'feature_names': detector.feature_names,
+            'contamination': detector.contamination,
+            'score_quantiles': detector.score_quantiles,
+        }, f)
+
+    logger.info(f"Model retrained on {len(records)} rows with {len(detector.feature_names)} features -> {model_path}")
+
+
+if __name__ == "__main__":
+    # python -m services.model_service calibrate reference.csv
+    # python -m services.model_service export-reference canomaly.reference.csv
+    # python -m services.model_service train history.csv [output.pkl]
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    command, source = sys.argv[1], sys.argv[2]
+    if command == "calibrate":
+        save_calibration(source)
+    elif command == "export-reference":
+        export_reference(source)
+    elif command == "train":
+        train_model(source, *sys.argv[3:4])
+    else:
+        raise SystemExit(f"Unknown command: {command}")
\ No newline at end of file
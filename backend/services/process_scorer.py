@@ -0,0 +1,296 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+import numpy as np
+from services.model_registry import model_registry
+from services.model_service import load_detector
+
+logger = logging.getLogger(__name__)
+
+# State per worker process (diisi initializer, sekali per process)
+_worker = {}
+
+
+def _init_worker(model_path, version, shm_name, slot_shape):
+    """Load model sekali per worker dan attach ke shared memory feature matrix."""
+    _worker['detector'] = load_detector(model_path)
+    _worker['version'] = version
+    _worker['shm'] = shared_memory.SharedMemory(name=shm_name)
+    _worker['slots'] = np.ndarray(slot_shape, dtype=np.float64, buffer=_worker['shm'].buf)
+
+
+def _score_slot(slot, n_rows):
+    """Score n_rows pertama dari slot shared memory; hanya hasil kecil yang di-pickle balik."""
+    X = _worker['slots'][slot, :n_rows]
+    return _columns(_worker['detector'].predict(X, columnar=True))
+
+
+def _score_matrix(X):
+    """Fallback untuk matrix yang lebih besar dari slot (atau semua slot sedang dipakai)."""
+    return _columns(_worker['detector'].predict(X, columnar=True))
+
+
+def _columns(columns):
+    return {name: values.tolist() for name, values in columns.items()}
+
+
+def rows_from_columns(data, columns, version):
+    """Bentuk ulang hasil columnar seperti ScalperDetectorAPI.predict (dict atau list of dict)."""
+    if isinstance(data, dict):
+        result = {name: values[0] for name, values in columns.items()}
+        result['model_version'] = version
+        return result
+    results = []
+    for i, item in enumerate(data):
+        results.append({
+            'transaction_id': item.get('transaction_id', f'trx_{i}'),
+            'user_id': item.get('user_id', 'unknown'),
+            **{name: values[i] for name, values in columns.items()},
+            'model_version': version,
+        })
+    return results
+
+
+class _PoolState:
+    """
+    Pool worker + shared memory untuk satu versi model.
+
+    Submit meminjam state (acquire/release) selama menulis slot dan memanggil
+    pool.submit; retire() menunggu pinjaman terakhir selesai sebelum pool
+    di-shutdown dan shared memory ditutup, jadi hot reload tidak pernah
+    mematikan pool di tengah submit.
+    """
+
+    __slots__ = ("pool", "shm", "slots", "free", "version", "detector",
+                 "_lock", "_users", "_retired", "_shutdown_args")
+
+    def __init__(self, pool, shm, slots, free, version, detector):
+        self.pool = pool
+        self.shm = shm
+        self.slots = slots
+        self.free = free
+        self.version = version
+        self.detector = detector
+        self._lock = threading.Lock()
+        self._users = 0
+        self._retired = False
+        self._shutdown_args = (False, False)
+
+    def acquire(self) -> bool:
+        """Pinjam state untuk satu submit; False jika sudah di-retire."""
+        with self._lock:
+            if self._retired:
+                return False
+            self._users += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            close = self._retired and self._users == 0
+        if close:
+            self._close()
+
+    def retire(self, wait=False, cancel_futures=False):
+        # Task yang sedang berjalan tetap diselesaikan (kecuali cancel_futures)
+        with self._lock:
+            self._retired = True
+            self._shutdown_args = (wait, cancel_futures)
+            close = self._users == 0
+        if close:
+            self._close()
+
+    def _close(self):
+        wait, cancel_futures = self._shutdown_args
+        self.pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+        # Worker punya mapping sendiri; mapping di process ini bisa langsung ditutup
+        self.slots = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class ProcessPoolScorer:
+    """
+    Scoring detector di pool worker process, di luar GIL request thread.
+
+    Tiap worker me-load model sekali lewat initializer (artefak fused di-mmap,
+    jadi halaman model dibagi antar process). Feature matrix dikirim lewat
+    satu blok shared memory yang dibagi menjadi slot; task hanya membawa
+    (slot, n_rows).
+
+    Pool baru (versi model baru dari model_registry, atau pengganti pool yang
+    rusak karena worker mati) dibangun dan di-warm-up di thread watcher /
+    worker thread, tidak pernah di event loop; request tetap dilayani pool
+    lama sampai pool baru siap. Request yang terkena BrokenProcessPool
+    dicoba ulang sekali di pool pengganti.
+    """
+
+    def __init__(self, max_workers=None, slots=None, slot_rows=256):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.n_slots = slots or self.max_workers * 4
+        self.slot_rows = slot_rows
+        self.tasks = 0
+        self.shm_tasks = 0
+        self.rebuilds = 0
+        self._state = None
+        self._build_lock = threading.Lock()
+
+    def start(self):
+        """Bangun pool dan jalankan initializer semua worker sebelum request pertama."""
+        self._current()
+        model_registry.add_listener(self._on_swap)
+
+    def stop(self):
+        with self._build_lock:
+            state, self._state = self._state, None
+        if state is not None:
+            state.retire(wait=True, cancel_futures=True)
+
+    # ---------------- Pool lifecycle ---------------- #
+
+    def _spawn(self, model) -> _PoolState:
+        """Pool + shared memory baru untuk `model`, semua worker sudah menjalankan initializer."""
+        n_features = len(model.detector.feature_names)
+        shape = (self.n_slots, self.slot_rows, n_features)
+        shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+        pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model.path, model.version, shm.name, shape),
+        )
+        free = queue.SimpleQueue()
+        for slot in range(self.n_slots):
+            free.put(slot)
+        state = _PoolState(pool, shm, np.ndarray(shape, dtype=np.float64, buffer=shm.buf),
+                           free, model.version, model.detector)
+        try:
+            X = np.zeros((1, n_features))
+            for future in [pool.submit(_score_matrix, X) for _ in range(self.max_workers)]:
+                future.result()
+        except BaseException:
+            state.retire(cancel_futures=True)
+            raise
+        logger.info("Process pool scoring: %d worker, model %s", self.max_workers, model.version)
+        return state
+
+    def _publish(self, state: _PoolState):
+        # Dipanggil dengan self._build_lock
+        old, self._state = self._state, state
+        if old is not None:
+            old.retire()
+
+    def _current(self) -> _PoolState:
+        state = self._state
+        if state is None:
+            with self._build_lock:
+                if self._state is None:
+                    self._publish(self._spawn(model_registry.active))
+                state = self._state
+        return state
+
+    def _on_swap(self, model):
+        """Listener model_registry: bangun pool versi baru di thread watcher."""
+        with self._build_lock:
+            if self._state is None or self._state.version == model.version:
+                return
+            self._publish(self._spawn(model))
+
+    def _replace_broken(self, broken: _PoolState):
+        """Ganti pool yang rusak (worker mati); no-op jika thread lain sudah menggantinya."""
+        with self._build_lock:
+            if self._state is not broken:
+                return
+            logger.warning("Process pool scoring rusak (model %s), membangun ulang", broken.version)
+            self.rebuilds += 1
+            self._publish(self._spawn(model_registry.active))
+
+    # ---------------- Scoring ---------------- #
+
+    def _submit(self, features):
+        """
+        Kirim features (dict atau list of dict) ke pool aktif; (state, Future
+        hasil columnar). BrokenProcessPool dari pool.submit dikembalikan
+        sebagai Future yang gagal supaya ditangani sama seperti dari worker.
+        """
+        while True:
+            state = self._current()
+            if state.acquire():
+                break
+            # Baru saja di-retire oleh hot reload / rebuild: state pengganti sudah dipublish
+        try:
+            X = state.detector.prepare_features(features)
+            self.tasks += 1
+
+            slot = None
+            if len(X) <= self.slot_rows:
+                try:
+                    slot = state.free.get_nowait()
+                except queue.Empty:
+                    pass
+            try:
+                if slot is None:
+                    return state, state.pool.submit(_score_matrix, X)
+                state.slots[slot, :len(X)] = X
+                future = state.pool.submit(_score_slot, slot, len(X))
+            except BrokenProcessPool as e:
+                if slot is not None:
+                    state.free.put(slot)
+                future = Future()
+                future.set_exception(e)
+                return state, future
+            self.shm_tasks += 1
+            free = state.free
+            future.add_done_callback(lambda _: free.put(slot))
+            return state, future
+        finally:
+            state.release()
+
+    def predict(self, features):
+        for attempt in range(2):
+            state, future = self._submit(features)
+            try:
+                columns = future.result()
+            except BrokenProcessPool:
+                if attempt:
+                    raise
+                self._replace_broken(state)
+                continue
+            return rows_from_columns(features, columns, state.version)
+
+    async def predict_async(self, features):
+        for attempt in range(2):
+            if self._state is None:
+                # Pool yang belum ada dibangun di worker thread, bukan di event loop
+                await asyncio.to_thread(self._current)
+            state, future = self._submit(features)
+            try:
+                columns = await asyncio.wrap_future(future)
+            except BrokenProcessPool:
+                if attempt:
+                    raise
+                await asyncio.to_thread(self._replace_broken, state)
+                continue
+            return rows_from_columns(features, columns, state.version)
+
+    def stats(self) -> dict:
+        state = self._state
+        return {
+            "max_workers": self.max_workers,
+            "slots": self.n_slots,
+            "slot_rows": self.slot_rows,
+            "model_version": state.version if state is not None else None,
+            "tasks": self.tasks,
+            "shared_memory_tasks": self.shm_tasks,
+            "rebuilds": self.rebuilds,
+        }
+
+
+process_scorer = ProcessPoolScorer(
+    max_workers=int(os.getenv("SCORING_WORKERS", "0")) or None,
+)
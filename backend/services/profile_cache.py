@@ -0,0 +1,61 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class ProfileCache:
+    """
+    Cache in-process untuk profile UUID yang sudah pasti ada di database.
+    Bounded (LRU eviction) dengan TTL per entry, plus counter hit/miss.
+    """
+
+    def __init__(self, maxsize=100_000, ttl=3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def contains(self, user_uuid: str) -> bool:
+        """True jika user_uuid sudah terkonfirmasi ada dan belum expired."""
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._entries.get(user_uuid)
+            if expires_at is not None and expires_at > now:
+                self._entries.move_to_end(user_uuid)
+                self.hits += 1
+                return True
+            if expires_at is not None:
+                del self._entries[user_uuid]
+            self.misses += 1
+            return False
+
+    def add(self, user_uuid: str):
+        """Tandai user_uuid sebagai ada di database."""
+        with self._lock:
+            self._entries[user_uuid] = time.monotonic() + self.ttl
+            self._entries.move_to_end(user_uuid)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+profile_cache = ProfileCache(
+    maxsize=int(os.getenv("PROFILE_CACHE_SIZE", "100000")),
+    ttl=float(os.getenv("PROFILE_CACHE_TTL", "3600")),
+)
@@ -0,0 +1,295 @@
+"""
+Rescoring offline tabel transactions dengan model baru.
+
+    cd backend && python -m services.rescoring --model canomaly.pkl --workers 4
+
+Transaksi dibaca per chunk (keyset pada id), feature dibangun ulang dengan
+price_features yang sama seperti calculate_ticket_features, chunk di-score
+paralel di worker process, dan hanya row yang label/score-nya berubah yang
+di-update (anomaly_score, anomaly_label_id, fraud_flag, risk_level saja). Progress
+disimpan ke checkpoint setiap chunk sehingga proses yang terputus bisa
+dilanjutkan.
+
+Input model (is_popular_route, ticket_class_id, discount_amount) disimpan di
+transactions oleh build_transaction_row; butuh migrations/
+20261018_transactions_model_inputs.sql. Model dengan feature yang tidak
+tersimpan (mis. velocity) ditolak di awal; row lama yang inputnya kosong
+dilewati tanpa diubah, bukan di-score dengan nilai default.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+import numpy as np
+from config.supabase import supabase
+from controllers.ticket_controller import price_features
+from services.model_registry import model_version
+from services.model_service import MODEL_PATH, load_detector
+
+logger = logging.getLogger(__name__)
+
+# Kolom input model + hasil model lama; tickets hanya fallback untuk row
+# sebelum kelas/diskon disimpan di transactions
+TRANSACTION_COLUMNS = (
+    "id, total_amount, num_tickets, station_from_id, station_to_id, payment_method_id, "
+    "booking_channel_id, is_refund, is_popular_route, ticket_class_id, discount_amount, "
+    "anomaly_score, anomaly_label_id, fraud_flag, risk_level, tickets(ticket_class_id, discount_amount)"
+)
+CHUNK_SIZE = 5000
+UPDATE_WORKERS = int(os.getenv("RESCORE_UPDATE_WORKERS", "8"))
+SCORE_TOLERANCE = 1e-6
+# Feature yang bisa dibangun ulang transaction_features dari row transactions
+TRANSACTION_FEATURES = (
+    'final_price', 'base_price', 'discount_amount', 'price_markup_ratio', 'is_price_above_max',
+    'discount_ratio', 'num_tickets', 'ticket_class_id', 'station_from_id', 'station_to_id',
+    'payment_method_id', 'booking_channel_id', 'is_refund', 'is_popular_route',
+)
+CHECKPOINT_PATH = os.getenv(
+    "RESCORE_CHECKPOINT_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rescore_checkpoint.json"),
+)
+
+# Detector per worker process (diisi initializer, sekali per process)
+_worker = {}
+
+
+def check_feature_names(feature_names):
+    """ValueError jika model memakai feature yang tidak bisa dibangun dari transactions."""
+    unsupported = [name for name in feature_names if name not in TRANSACTION_FEATURES]
+    if unsupported:
+        raise ValueError(f"Feature model tidak tersimpan di tabel transactions: {', '.join(unsupported)}")
+
+
+def transaction_features(row: dict):
+    """
+    Feature model dari row transactions, seperti calculate_ticket_features.
+    None jika kelas / diskon tiket tidak diketahui; is_popular_route bernilai
+    None jika kolomnya kosong (row sebelum kolom itu disimpan).
+    """
+    tickets = row.get('tickets') or []
+    num_tickets = row.get('num_tickets') or 0
+    ticket_class_id = row.get('ticket_class_id')
+    discount_amount = row.get('discount_amount')
+    if ticket_class_id is None and tickets:
+        ticket_class_id = tickets[0].get('ticket_class_id')
+    if discount_amount is None and tickets and tickets[0].get('discount_amount') is not None:
+        # build_ticket_rows menyimpan diskon per tiket (diskon order / num_tickets)
+        discount_amount = float(tickets[0]['discount_amount']) * num_tickets
+    if ticket_class_id is None or discount_amount is None:
+        return None
+    is_popular_route = row.get('is_popular_route')
+    return {
+        **price_features(ticket_class_id, float(row.get('total_amount') or 0), float(discount_amount)),
+        'num_tickets': num_tickets,
+        'ticket_class_id': ticket_class_id,
+        'station_from_id': row.get('station_from_id') or 0,
+        'station_to_id': row.get('station_to_id') or 0,
+        'payment_method_id': row.get('payment_method_id') or 0,
+        'booking_channel_id': row.get('booking_channel_id') or 0,
+        'is_refund': int(row.get('is_refund') or 0),
+        'is_popular_route': None if is_popular_route is None else int(is_popular_route),
+    }
+
+
+def fetch_transactions(after=None, chunk_size: int = CHUNK_SIZE):
+    """Generator chunk transaksi urut id (keyset), memory hanya satu chunk."""
+    while True:
+        query = supabase.table("transactions").select(TRANSACTION_COLUMNS)
+        if after is not None:
+            query = query.gt("id", after)
+        rows = query.order("id").limit(chunk_size).execute().data
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1]["id"]
+
+
+def _init_worker(model_path):
+    _worker['detector'] = load_detector(model_path)
+
+
+def rescore_matrix(X, old_scores, old_labels, old_flags, old_levels, detector=None):
+    """
+    Score matrix feature dan bandingkan dengan nilai lama. Mengembalikan
+    (index row yang berubah, anomaly_score, anomaly_label_id, fraud_flag, risk_level) baru.
+    """
+    detector = detector or _worker['detector']
+    columns = detector.predict(X, columnar=True)
+    scores = columns['score'] * -100
+    labels = np.where(columns['prediction'] == 'anomaly', 2, 1)
+    flags = columns['is_scalper'].astype(int)
+    levels = np.asarray(columns['risk_level'], dtype=object)
+
+    changed = (
+        (labels != old_labels)
+        | (flags != old_flags)
+        | (levels != old_levels)
+        | np.isnan(old_scores)
+        | (np.abs(scores - np.nan_to_num(old_scores)) > SCORE_TOLERANCE)
+    )
+    index = np.flatnonzero(changed)
+    return index, scores[index], labels[index], flags[index], levels[index]
+
+
+def prepare_chunk(rows: list, feature_names: list):
+    """
+    Matrix feature + nilai lama untuk row yang inputnya lengkap.
+    Mengembalikan (row yang di-score, (X, old_scores, old_labels, old_flags, old_levels)).
+    """
+    kept, values = [], []
+    for row in rows:
+        features = transaction_features(row)
+        if features is None:
+            continue
+        vector = [features[name] for name in feature_names]
+        if None in vector:
+            continue
+        kept.append(row)
+        values.append(vector)
+    X = np.array(values, dtype=float).reshape(len(kept), len(feature_names))
+    old_scores = np.array([np.nan if r.get('anomaly_score') is None else r['anomaly_score'] for r in kept], dtype=float)
+    old_labels = np.array([r.get('anomaly_label_id') or 0 for r in kept])
+    old_flags = np.array([int(bool(r.get('fraud_flag'))) for r in kept])
+    old_levels = np.array([r.get('risk_level') for r in kept], dtype=object)
+    return kept, (X, old_scores, old_labels, old_flags, old_levels)
+
+
+def update_scores(txn_id: str, score: float, label: int, flag: int, level: str):
+    # Hanya kolom hasil model: perubahan lain sejak scan (refund, status) tidak tertimpa
+    supabase.table("transactions").update(
+        {"anomaly_score": score, "anomaly_label_id": label, "fraud_flag": flag, "risk_level": level}
+    ).eq("id", txn_id).execute()
+
+
+def write_changes(rows: list, changes) -> int:
+    """Update hasil model row yang berubah (satu request per row, paralel); kembalikan jumlahnya."""
+    index, scores, labels, flags, levels = changes
+    if not len(index):
+        return 0
+    ids = [rows[i]['id'] for i in index.tolist()]
+    with ThreadPoolExecutor(max_workers=max(1, UPDATE_WORKERS)) as pool:
+        list(pool.map(update_scores, ids, scores.tolist(), labels.tolist(), flags.tolist(), levels.tolist()))
+    return len(ids)
+
+
+def load_checkpoint(path: str, version: str):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('model_version') != version:
+        print(f"⚠️  Checkpoint untuk model {checkpoint.get('model_version')}, mulai dari awal")
+        return None
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def rescore(model_path=MODEL_PATH, workers=None, chunk_size=CHUNK_SIZE,
+            checkpoint_path=CHECKPOINT_PATH, restart=False, dry_run=False):
+    """
+    Rescore semua transaksi. Chunk yang sedang di-score dibatasi 2x jumlah
+    worker sehingga memory tetap terbatas; checkpoint hanya maju setelah
+    semua chunk sebelumnya selesai ditulis (chunk diselesaikan urut).
+    workers=0 men-score di process ini.
+    """
+    version = model_version(model_path)
+    detector = load_detector(model_path)
+    check_feature_names(detector.feature_names)
+    workers = os.cpu_count() if workers is None else workers
+
+    checkpoint = None if restart else load_checkpoint(checkpoint_path, version)
+    if checkpoint is None:
+        checkpoint = {'model_version': version, 'after': None, 'rows': 0, 'changed': 0, 'skipped': 0}
+    else:
+        print(f"↪️  Lanjut dari id > {checkpoint['after']} ({checkpoint['rows']:,} row sudah diproses)")
+
+    pool = None
+    if workers > 0:
+        pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=get_context("spawn"),
+            initializer=_init_worker, initargs=(model_path,),
+        )
+
+    start = time.perf_counter()
+    processed = changed = skipped = 0
+    last_report = start
+    in_flight = deque()
+    limit = max(1, 2 * workers)
+
+    def complete_oldest():
+        nonlocal processed, changed, skipped, last_report
+        rows, scored, result = in_flight.popleft()
+        n_changed = 0
+        if result is not None:
+            changes = result.result() if pool is not None else result
+            n_changed = len(changes[0]) if dry_run else write_changes(scored, changes)
+        n_skipped = len(rows) - len(scored)
+        processed += len(rows)
+        changed += n_changed
+        skipped += n_skipped
+        checkpoint.update(after=rows[-1]['id'], rows=checkpoint['rows'] + len(rows),
+                          changed=checkpoint['changed'] + n_changed,
+                          skipped=checkpoint.get('skipped', 0) + n_skipped)
+        if not dry_run:
+            save_checkpoint(checkpoint_path, checkpoint)
+        now = time.perf_counter()
+        if now - last_report >= 5:
+            last_report = now
+            print(f"   {processed:,} row, {changed:,} berubah, {processed / (now - start):,.0f} row/s")
+
+    try:
+        for rows in fetch_transactions(checkpoint['after'], chunk_size):
+            scored, chunk = prepare_chunk(rows, detector.feature_names)
+            if not scored:
+                in_flight.append((rows, scored, None))
+            elif pool is not None:
+                in_flight.append((rows, scored, pool.submit(rescore_matrix, *chunk)))
+            else:
+                in_flight.append((rows, scored, rescore_matrix(*chunk, detector=detector)))
+            while len(in_flight) >= limit:
+                complete_oldest()
+        while in_flight:
+            complete_oldest()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        'model_version': version,
+        'rows': processed,
+        'changed': changed,
+        'skipped': skipped,
+        'seconds': round(elapsed, 2),
+        'rows_per_second': round(processed / elapsed) if elapsed > 0 else None,
+        'dry_run': dry_run,
+    }
+    if skipped:
+        print(f"⚠️  {skipped:,} row dilewati: input feature tidak tersimpan (is_popular_route / kelas / diskon kosong)")
+    print(f"✅ Rescore selesai: {processed:,} row, {changed:,} berubah, "
+          f"{summary['rows_per_second'] or 0:,} row/s ({elapsed:.1f}s)")
+    return summary
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Rescore transactions dengan model baru")
+    parser.add_argument("--model", default=MODEL_PATH, help="Path model .pkl")
+    parser.add_argument("--workers", type=int, default=None, help="Jumlah worker process (0 = tanpa pool)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--restart", action="store_true", help="Abaikan checkpoint, mulai dari awal")
+    parser.add_argument("--dry-run", action="store_true", help="Hitung perubahan tanpa menulis ke database")
+    args = parser.parse_args()
+    rescore(args.model, args.workers, args.chunk_size, args.checkpoint, args.restart, args.dry_run)
@@ -1,8 +1,182 @@
+import json
+import os
 import numpy as np
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 import pickle
 
+
+class CompiledForest:
+    """
+    Representasi flat dari IsolationForest yang sudah di-fit.
+    Semua node dari semua tree digabung ke array contiguous (feature,
+    threshold, children, path length) sehingga inference cukup satu
+    traversal vectorized untuk semua tree sekaligus, tanpa overhead
+    validasi dan loop per-estimator dari sklearn.
+    Score identik bit-for-bit dengan IsolationForest.score_samples.
+
+    Versi "fused" (lihat fuse_scaler) menerima feature mentah: threshold
+    sudah ditransformasi balik ke ruang feature asli menggunakan StandardScaler.
+    """
+
+    ARRAYS = ('feature', 'threshold', 'left', 'right', 'missing_left', 'leaf_value', 'roots')
+
+    def __init__(self, feature, threshold, left, right, missing_left, leaf_value,
+                 roots, max_depth, denominator, offset=0.0, fused=False):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.denominator = denominator
+        # offset_ IsolationForest: score < offset -> anomaly
+        self.offset = offset
+        self.fused = fused
+        # Non-fused mengikuti sklearn (input float32), fused memakai harga
+        # mentah sehingga dibandingkan dalam float64
+        self.input_dtype = np.float64 if fused else np.float32
+
+    @classmethod
+    def from_isolation_forest(cls, model):
+        """Export semua tree dari IsolationForest ke array global."""
+        features, thresholds, lefts, rights, missing, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for tree_idx, (estimator, tree_features) in enumerate(
+            zip(model.estimators_, model.estimators_features_)
+        ):
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes)
+            is_leaf = tree.children_left == -1
+
+            # Leaf menunjuk dirinya sendiri agar traversal dengan jumlah
+            # langkah tetap (max_depth) berhenti di leaf
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            # Index feature subset per tree -> index feature global
+            features.append(np.where(is_leaf, 0, np.asarray(tree_features)[np.maximum(tree.feature, 0)]))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            missing.append(
+                np.asarray(getattr(tree, 'missing_go_to_left', np.zeros(n_nodes)), dtype=bool)
+            )
+            # Sama persis dengan sklearn: depth + average_path_length(n_node_samples) - 1
+            values.append(
+                model._decision_path_lengths[tree_idx]
+                + model._average_path_length_per_tree[tree_idx]
+                - 1.0
+            )
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n_nodes
+
+        from sklearn.ensemble._iforest import _average_path_length
+        denominator = len(model.estimators_) * float(_average_path_length([model._max_samples])[0])
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            left=np.ascontiguousarray(np.concatenate(lefts), dtype=np.intp),
+            right=np.ascontiguousarray(np.concatenate(rights), dtype=np.intp),
+            missing_left=np.ascontiguousarray(np.concatenate(missing)),
+            leaf_value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=int(max_depth),
+            denominator=denominator,
+            offset=float(model.offset_),
+        )
+
+    def fuse_scaler(self, scaler):
+        """
+        Lipat StandardScaler ke threshold split:
+        (x - mean) / scale <= t  <=>  x <= t * scale + mean  (scale > 0).
+        Hasilnya bisa langsung scoring output calculate_ticket_features.
+        """
+        n_features = int(self.feature.max()) + 1
+        mean = scaler.mean_ if getattr(scaler, 'mean_', None) is not None else np.zeros(n_features)
+        scale = scaler.scale_ if getattr(scaler, 'scale_', None) is not None else np.ones(n_features)
+
+        # Leaf (threshold inf) tetap inf
+        threshold = self.threshold * scale[self.feature] + mean[self.feature]
+
+        return CompiledForest(
+            feature=self.feature,
+            threshold=np.ascontiguousarray(threshold, dtype=np.float64),
+            left=self.left,
+            right=self.right,
+            missing_left=self.missing_left,
+            leaf_value=self.leaf_value,
+            roots=self.roots,
+            max_depth=self.max_depth,
+            denominator=self.denominator,
+            offset=self.offset,
+            fused=True,
+        )
+
+    def save(self, path):
+        """
+        Simpan forest ke directory: satu file .npy per array + meta.json.
+        Format .npy bisa di-load dengan mmap sehingga banyak worker berbagi
+        satu salinan di page cache.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "forest.json"), "w") as f:
+            json.dump({
+                'max_depth': self.max_depth,
+                'denominator': self.denominator,
+                'offset': self.offset,
+                'fused': self.fused,
+            }, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load forest dari directory hasil save() (default: memory-mapped, read-only)."""
+        with open(os.path.join(path, "forest.json")) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in cls.ARRAYS
+        }
+        return cls(**arrays, **meta)
+
+    def apply(self, X, chunk_size=256):
+        """Index leaf global untuk setiap (sample, tree), shape (n_samples, n_trees)."""
+        # sklearn membandingkan input float32 dengan threshold float64
+        X = np.ascontiguousarray(X, dtype=self.input_dtype)
+        n_samples, n_features = X.shape
+        leaves = np.empty((n_samples, len(self.roots)), dtype=np.intp)
+
+        # Diproses per chunk agar array sementara (chunk x n_trees) tetap di cache
+        for start in range(0, n_samples, chunk_size):
+            X_chunk = X[start:start + chunk_size]
+            flat = X_chunk.ravel()
+            row_offset = (np.arange(X_chunk.shape[0]) * n_features)[:, None]
+            node = np.broadcast_to(self.roots, (X_chunk.shape[0], len(self.roots))).copy()
+            for _ in range(self.max_depth):
+                x = flat[row_offset + self.feature[node]]
+                go_left = x <= self.threshold[node]
+                nan_mask = np.isnan(x)
+                if nan_mask.any():
+                    go_left = np.where(nan_mask, self.missing_left[node], go_left)
+                node = np.where(go_left, self.left[node], self.right[node])
+            leaves[start:start + chunk_size] = node
+        return leaves
+
+    def score_samples(self, X):
+        """Equivalent dengan IsolationForest.score_samples (semakin rendah semakin abnormal)."""
+        values = self.leaf_value[self.apply(X)]
+        # cumsum menjumlah berurutan per tree, sama dengan akumulasi di sklearn
+        depths = np.cumsum(values, axis=1)[:, -1]
+        scores = 2 ** (-np.divide(depths, self.denominator))
+        return -scores
+
+
 class ScalperDetectorAPI:
     """
     Scalper detection model dengan 14 features.
@@ -37,57 +211,137 @@ class ScalperDetectorAPI:
             'is_price_above_max',
             'discount_ratio'
         ]
+
+        # Kalibrasi risk score: quantile score_samples dari data referensi
+        # (di-fit offline, disimpan di canomaly.pkl sebagai 'score_quantiles')
+        self.score_quantiles = None
+
+        # Engine inference array-based (lihat compile())
+        self.forest = None
         
     def prepare_features(self, data):
-        """Extract features dari data dict atau list."""
+        """Extract features dari data dict, list of dict, atau matrix numpy."""
+        if isinstance(data, np.ndarray):
+            return np.atleast_2d(data)
         if isinstance(data, dict):
-            features = [data.get(feat, 0) for feat in self.feature_names]
-            return np.array([features])
-        else:
-            features_list = []
-            for item in data:
-                features = [item.get(feat, 0) for feat in self.feature_names]
-                features_list.append(features)
-            return np.array(features_list)
-    
-    def predict(self, data):
-        """Predict anomaly untuk single atau batch data."""
+            data = [data]
+        names = self.feature_names
+        return np.array([[item.get(feat, 0) for feat in names] for item in data], dtype=float)
+
+    def score_features(self, X):
+        """score_samples untuk feature mentah (satu traversal forest)."""
+        if self.forest is not None and self.forest.fused:
+            # Fused model: scoring langsung dari feature mentah, tanpa scaler
+            return self.forest.score_samples(X)
+        return self.score_samples(self.scaler.transform(X))
+
+    @property
+    def offset(self):
+        """Threshold IsolationForest: score < offset -> anomaly."""
+        return self.forest.offset if self.forest is not None else self.model.offset_
+
+    def predict(self, data, columnar=False):
+        """
+        Predict anomaly untuk single atau batch data.
+        Forest hanya dijalankan sekali; label, risk score dan risk level
+        diturunkan dari score yang sama (sama seperti IsolationForest.predict).
+        columnar=True mengembalikan struct-of-arrays (dict of numpy arrays).
+        """
         X = self.prepare_features(data)
-        X_scaled = self.scaler.transform(X)
-        
-        predictions = self.model.predict(X_scaled)
-        scores = self.model.score_samples(X_scaled)
-        
-        # Convert to risk score (0-100)
-        score_range = scores.max() - scores.min()
-        if score_range == 0:
-            risk_scores = np.zeros_like(scores)
-        else:
-            risk_scores = 100 * (1 - (scores - scores.min()) / score_range)
-        
+        scores = self.score_features(X)
+
+        is_scalper = scores - self.offset < 0
+        # Convert to risk score (0-100), tidak bergantung pada isi batch
+        risk_scores = self.risk_scores(scores)
+
+        columns = {
+            'prediction': np.where(is_scalper, 'anomaly', 'normal'),
+            'score': scores,
+            'risk_score': risk_scores,
+            'risk_level': self.risk_levels(risk_scores),
+            'is_scalper': is_scalper,
+            # False = risk score dari fallback heuristik (belum ada kalibrasi quantile)
+            'risk_calibrated': np.full(len(scores), self.score_quantiles is not None),
+        }
+        if columnar:
+            return columns
+
+        rows = {name: values.tolist() for name, values in columns.items()}
         if isinstance(data, dict):
-            risk_score = risk_scores[0]
-            return {
-                'prediction': 'anomaly' if predictions[0] == -1 else 'normal',
-                'score': float(scores[0]),
-                'risk_score': float(risk_score),
-                'risk_level': self._get_risk_level(risk_score),
-                'is_scalper': predictions[0] == -1
-            }
-        else:
-            results = []
-            for i, (pred, score, risk_score) in enumerate(zip(predictions, scores, risk_scores)):
-                results.append({
-                    'transaction_id': data[i].get('transaction_id', f'trx_{i}'),
-                    'user_id': data[i].get('user_id', 'unknown'),
-                    'prediction': 'anomaly' if pred == -1 else 'normal',
-                    'score': float(score),
-                    'risk_score': float(risk_score),
-                    'risk_level': self._get_risk_level(risk_score),
-                    'is_scalper': pred == -1
-                })
-            return results
-    
+            return {name: values[0] for name, values in rows.items()}
+
+        results = []
+        for i, (pred, score, risk_score, risk_level, scalper) in enumerate(zip(
+            rows['prediction'], rows['score'], rows['risk_score'], rows['risk_level'], rows['is_scalper']
+        )):
+            item = data[i] if isinstance(data, list) else {}
+            results.append({
+                'transaction_id': item.get('transaction_id', f'trx_{i}'),
+                'user_id': item.get('user_id', 'unknown'),
+                'prediction': pred,
+                'score': score,
+                'risk_score': risk_score,
+                'risk_level': risk_level,
+                'is_scalper': scalper,
+                'risk_calibrated': rows['risk_calibrated'][i],
+            })
+        return results
+
+    def fit(self, data):
+        """Fit scaler + IsolationForest dengan feature_names saat ini."""
+        X = self.prepare_features(data)
+        self.model.fit(self.scaler.fit_transform(X))
+        # Forest hasil compile sebelumnya sudah tidak berlaku
+        self.forest = None
+        return self
+
+    def compile(self):
+        """Export model yang sudah di-load ke CompiledForest untuk hot path."""
+        self.forest = CompiledForest.from_isolation_forest(self.model)
+        return self.forest
+
+    def score_samples(self, X_scaled):
+        """score_samples lewat CompiledForest jika tersedia, fallback ke sklearn."""
+        if self.forest is not None and not self.forest.fused:
+            return self.forest.score_samples(X_scaled)
+        return self.model.score_samples(X_scaled)
+
+    def fit_calibration(self, data, n_quantiles=1000):
+        """
+        Fit kalibrasi risk score dari distribusi referensi (offline).
+        Menyimpan quantile score_samples sehingga risk score menjadi lookup ECDF.
+        """
+        scores = self.score_features(self.prepare_features(data))
+        self.score_quantiles = np.quantile(scores, np.linspace(0, 1, n_quantiles))
+        return self.score_quantiles
+
+    def risk_scores(self, scores):
+        """
+        Convert score_samples ke risk score 0-100.
+        Dengan kalibrasi: persentil anomali terhadap data referensi (O(log n)
+        via searchsorted). Tanpa kalibrasi: skala absolut Isolation Forest yang
+        di-anchor ke threshold model: -score 0.5 (rata-rata) -> 0, -offset
+        (batas anomaly) -> 30 (Medium) dan -score 1.0 (outlier pasti) -> 100,
+        linear di antaranya. Transaksi yang di-flag anomaly minimal Medium.
+        """
+        scores = np.asarray(scores, dtype=float)
+        if self.score_quantiles is not None:
+            rank = np.searchsorted(self.score_quantiles, scores, side='right')
+            return 100 * (1 - rank / len(self.score_quantiles))
+        anomaly = -scores
+        threshold = -self.offset
+        low, high = min(0.5, threshold), max(1.0, threshold + 1e-9)
+        below = np.interp(anomaly, [low, threshold], [0, self.RISK_BOUNDS[0]]) if threshold > low else 0
+        above = np.interp(anomaly, [threshold, high], [self.RISK_BOUNDS[0], 100])
+        return np.where(anomaly < threshold, below, above)
+
+    RISK_LEVELS = np.array(["Low", "Medium", "High", "Critical"])
+    RISK_BOUNDS = np.array([30, 60, 80])
+
+    def risk_levels(self, risk_scores):
+        """Versi vectorized dari _get_risk_level."""
+        return self.RISK_LEVELS[np.searchsorted(self.RISK_BOUNDS, risk_scores, side='right')]
+
     def _get_risk_level(self, risk_score):
         """Convert risk score to category."""
         if risk_score < 30:
@@ -0,0 +1,146 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from services.model_service import load_detector
+
+logger = logging.getLogger(__name__)
+
+# Path .pkl model challenger, dipisah koma (kosong = shadow scoring nonaktif)
+SHADOW_MODELS = [p for p in os.getenv("SHADOW_MODELS", "").split(",") if p.strip()]
+
+
+class ShadowStats:
+    """Agregat perbandingan satu model shadow terhadap champion."""
+
+    def __init__(self):
+        self.requests = 0
+        self.agree = 0
+        self.champion_anomaly = 0
+        self.shadow_anomaly = 0
+        self.sum_delta = 0.0
+        self.sum_abs_delta = 0.0
+        self.max_abs_delta = 0.0
+        self.errors = 0
+
+    def update(self, champion_scores, champion_anomaly, shadow_scores, shadow_anomaly):
+        delta = shadow_scores - champion_scores
+        self.requests += len(delta)
+        self.agree += int(np.sum(champion_anomaly == shadow_anomaly))
+        self.champion_anomaly += int(np.sum(champion_anomaly))
+        self.shadow_anomaly += int(np.sum(shadow_anomaly))
+        self.sum_delta += float(np.sum(delta))
+        self.sum_abs_delta += float(np.sum(np.abs(delta)))
+        self.max_abs_delta = max(self.max_abs_delta, float(np.max(np.abs(delta), initial=0.0)))
+
+    def as_dict(self) -> dict:
+        n = self.requests
+        return {
+            "requests": n,
+            "agreement_rate": round(self.agree / n, 4) if n else None,
+            "champion_anomaly_rate": round(self.champion_anomaly / n, 4) if n else None,
+            "shadow_anomaly_rate": round(self.shadow_anomaly / n, 4) if n else None,
+            "mean_score_delta": self.sum_delta / n if n else None,
+            "mean_abs_score_delta": self.sum_abs_delta / n if n else None,
+            "max_abs_score_delta": self.max_abs_delta,
+            "errors": self.errors,
+        }
+
+
+class ShadowScorer:
+    """
+    Champion-challenger: request yang sama di-score oleh model shadow di
+    worker thread, di luar request path. Hasil shadow tidak pernah masuk ke
+    response; hanya statistik perbandingan yang disimpan di memory.
+    Jika antrean penuh, sampel di-drop (tidak menahan request).
+    """
+
+    def __init__(self, model_paths=SHADOW_MODELS, max_workers=1, max_pending=1000):
+        self.model_paths = model_paths
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.shadows = {}
+        self.stats = {}
+        self.submitted = 0
+        self.dropped = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._executor is not None
+
+    def start(self):
+        """Load model shadow dan siapkan worker pool."""
+        if self._executor is not None or not self.model_paths:
+            return
+        for path in self.model_paths:
+            name = os.path.splitext(os.path.basename(path.strip()))[0]
+            try:
+                self.shadows[name] = load_detector(path.strip())
+                self.stats[name] = ShadowStats()
+            except Exception as e:
+                logger.error("Shadow model %s gagal di-load: %s", path, e)
+        if self.shadows:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="shadow")
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, features, champion_results):
+        """Jadwalkan shadow scoring; langsung return tanpa menunggu hasil."""
+        if self._executor is None:
+            return
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending += 1
+            self.submitted += 1
+        results = champion_results if isinstance(champion_results, list) else [champion_results]
+        champion_scores = np.array([r['score'] for r in results], dtype=np.float64)
+        champion_anomaly = np.array([r['prediction'] == 'anomaly' for r in results])
+        self._executor.submit(self._compare, features, champion_scores, champion_anomaly)
+
+    def _compare(self, features, champion_scores, champion_anomaly):
+        try:
+            for name, detector in self.shadows.items():
+                try:
+                    out = detector.predict(features, columnar=True)
+                except Exception as e:
+                    logger.warning("Shadow model %s error: %s", name, e)
+                    with self._lock:
+                        self.stats[name].errors += 1
+                    continue
+                with self._lock:
+                    self.stats[name].update(champion_scores, champion_anomaly, out['score'], out['is_scalper'])
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def reset(self):
+        with self._lock:
+            for name in self.stats:
+                self.stats[name] = ShadowStats()
+            self.submitted = 0
+            self.dropped = 0
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "pending": self._pending,
+                "shadows": {name: s.as_dict() for name, s in self.stats.items()},
+            }
+
+
+shadow_scorer = ShadowScorer(
+    max_workers=int(os.getenv("SHADOW_WORKERS", "1")),
+    max_pending=int(os.getenv("SHADOW_MAX_PENDING", "1000")),
+)
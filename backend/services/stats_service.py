@@ -0,0 +1,160 @@
+import logging
+import os
+import threading
+import time
+from config.supabase import supabase
+
+logger = logging.getLogger(__name__)
+
+SEVERITIES = ("low", "medium", "high", "critical")
+# Nilai kolom transactions.risk_level (ditulis build_transaction_row)
+RISK_LEVELS = {"low": "Low", "medium": "Medium", "high": "High", "critical": "Critical"}
+
+
+class TransactionStats:
+    """
+    Counter statistik transaksi (total, anomali, per severity/risk level).
+
+    Counter di-update incremental setiap buy_ticket menulis transaksi, dan
+    di-reconcile berkala dengan count ke database (transaksi dari proses lain,
+    data lama) di background thread. Read selalu lookup O(1) ke snapshot
+    cache; snapshot yang lebih tua dari max_staleness hanya memicu reconcile
+    di background. Severity dihitung dari risk_level yang disimpan saat
+    transaksi ditulis, jadi tidak bergeser saat model di-hot-reload.
+    """
+
+    def __init__(self, max_staleness=300.0, reconcile_interval=60.0):
+        self.max_staleness = max_staleness
+        self.reconcile_interval = reconcile_interval
+        self.total = 0
+        self.anomaly = 0
+        self.severity = dict.fromkeys(SEVERITIES, 0)
+        # Transaksi lama tanpa risk_level tersimpan
+        self.unclassified = 0
+        self._refreshing = False
+        self.reconciled_at = None
+        self.reconciles = 0
+        self._attempted_at = None
+        self._lock = threading.Lock()
+        self._reconcile_lock = threading.Lock()
+        # Increment yang terjadi selama reconcile berjalan
+        self._pending = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, results):
+        """Tambah hasil prediksi transaksi yang baru ditulis (dict atau list of dict)."""
+        results = results if isinstance(results, list) else [results]
+        with self._lock:
+            for target in (self, self._pending) if self._pending is not None else (self,):
+                for r in results:
+                    target.total += 1
+                    target.anomaly += bool(r.get('is_scalper'))
+                    level = str(r.get('risk_level', 'Low')).lower()
+                    if level in target.severity:
+                        target.severity[level] += 1
+
+    # ---------------- Reconcile ---------------- #
+
+    @staticmethod
+    def _count(query) -> int:
+        return query.execute().count or 0
+
+    def reconcile(self):
+        """Hitung ulang counter dari database (count head-only, tanpa ambil rows)."""
+        with self._reconcile_lock:
+            self._attempted_at = time.time()
+            with self._lock:
+                self._pending = _Counts()
+            try:
+                table = lambda: supabase.table("transactions").select("id", count="exact", head=True)
+                total = self._count(table())
+                anomaly = self._count(table().eq("fraud_flag", True))
+                severity = {name: self._count(table().eq("risk_level", level)) for name, level in RISK_LEVELS.items()}
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+
+            with self._lock:
+                pending, self._pending = self._pending, None
+                self.total = total + pending.total
+                self.anomaly = anomaly + pending.anomaly
+                for name in SEVERITIES:
+                    self.severity[name] = severity[name] + pending.severity[name]
+                self.unclassified = max(total - sum(severity.values()), 0)
+                self.reconciled_at = time.time()
+                self.reconciles += 1
+
+    def snapshot(self, max_staleness=None) -> dict:
+        """
+        Statistik saat ini dari cache (tanpa query database). Jika lebih tua
+        dari max_staleness detik, reconcile dijalankan di background dan
+        snapshot berikutnya memakai hasilnya.
+        """
+        max_staleness = self.max_staleness if max_staleness is None else max_staleness
+        # Jika database error, retry paling sering sekali per max_staleness
+        if self._attempted_at is None or time.time() - self._attempted_at > max_staleness:
+            self._reconcile_in_background()
+        with self._lock:
+            age = None if self.reconciled_at is None else time.time() - self.reconciled_at
+            return {
+                "total": self.total,
+                "anomaly": self.anomaly,
+                "normal": self.total - self.anomaly,
+                "severity": dict(self.severity),
+                "unclassified": self.unclassified,
+                "age_seconds": None if age is None else round(age, 1),
+                "stale": age is None or age > max_staleness,
+            }
+
+    def _reconcile_in_background(self):
+        # Satu reconcile sekaligus; request yang datang bersamaan tidak menunggu
+        with self._lock:
+            if self._refreshing or self._reconcile_lock.locked():
+                return
+            self._refreshing = True
+            self._attempted_at = time.time()
+        threading.Thread(target=self._reconcile_logged, name="stats-reconcile-once", daemon=True).start()
+
+    def _reconcile_logged(self):
+        try:
+            self.reconcile()
+        except Exception as e:
+            logger.warning("Reconcile statistik gagal: %s", e)
+        finally:
+            self._refreshing = False
+
+    # ---------------- Background reconcile ---------------- #
+
+    def start(self):
+        if self._thread is not None or self.reconcile_interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stats-reconcile", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            self._reconcile_logged()
+            if self._stop.wait(self.reconcile_interval):
+                return
+
+
+class _Counts:
+    def __init__(self):
+        self.total = 0
+        self.anomaly = 0
+        self.severity = dict.fromkeys(SEVERITIES, 0)
+
+
+transaction_stats = TransactionStats(
+    max_staleness=float(os.getenv("STATS_MAX_STALENESS", "300")),
+    reconcile_interval=float(os.getenv("STATS_RECONCILE_INTERVAL", "60")),
+)
@@ -0,0 +1,288 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from models import ticket_model, transaction_model
+
+try:
+    import fcntl
+except ImportError:  # Windows: hanya lock antar thread
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# "sync" (default): buy_ticket menunggu insert ke database.
+# "write_behind": insert di-antre dan di-flush oleh background worker.
+PERSISTENCE_MODE = os.getenv("PERSISTENCE_MODE", "sync").lower()
+# Absolut (bukan relatif ke CWD) dan dibagi semua worker uvicorn; akses
+# antar process diserialisasi dengan flock
+SPILL_PATH = os.getenv(
+    "WRITE_BEHIND_SPILL_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "write_behind.spill.jsonl"),
+)
+
+
+class WriteBehindQueue:
+    """
+    Antrian write-behind untuk insert transactions + tickets.
+
+    - Bounded queue in-process, di-flush oleh satu background thread per
+      batch_size item atau per flush_interval detik (mana yang lebih dulu).
+    - Flush gagal di-retry dengan exponential backoff; insert memakai
+      upsert on id sehingga retry tidak membuat duplikat.
+    - Jika queue penuh atau retry habis, item ditulis ke spill file
+      (JSONL append-only) dan di-replay oleh worker setelah start(); spill
+      karena queue penuh juga di-replay begitu queue kosong lagi.
+    - Replay memindahkan spill file ke <spill>.replay lebih dulu. File
+      .replay sisa process yang mati di tengah replay ikut di-replay (spill
+      baru di-append, tidak menimpa), dan hanya satu process yang me-replay
+      sekaligus (flock).
+    - stop() yang timeout (worker masih retry) menulis batch yang sedang
+      di-flush dan sisa queue ke spill file, sehingga booking yang sudah
+      di-acknowledge tidak hilang saat process berhenti.
+    """
+
+    def __init__(self, max_size=10_000, batch_size=500, flush_interval=0.05,
+                 max_retries=5, backoff=0.2, spill_path=SPILL_PATH):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.spill_path = os.path.abspath(spill_path)
+        self.replay_path = self.spill_path + ".replay"
+
+        self._queue = queue.Queue(maxsize=max_size)
+        self._spill_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._abandon = threading.Event()
+        self._in_flight = None
+        self._overflowed = threading.Event()
+        self._thread = None
+
+        # Metrics
+        self.flushed_transactions = 0
+        self.flushed_tickets = 0
+        self.spilled = 0
+        self.retries = 0
+        self.flush_count = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self._total_flush_latency = 0.0
+
+    # ---------------- Producer ---------------- #
+
+    def submit(self, transaction: dict, tickets: list[dict]):
+        """Antrekan satu transaksi beserta tiketnya (non-blocking)."""
+        item = {"transaction": transaction, "tickets": tickets}
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._spill([item])
+            self._overflowed.set()
+
+    # ---------------- Lifecycle ---------------- #
+
+    def start(self):
+        """Jalankan worker; spill file dari run sebelumnya di-replay di thread worker."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._abandon.clear()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """
+        Hentikan worker setelah queue di-drain. Jika belum selesai dalam
+        timeout, retry dihentikan dan semua item yang tersisa di-spill.
+        """
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout)
+        if thread.is_alive():
+            # Worker masih retry: batch-nya di-spill oleh worker sendiri begitu
+            # bangun dari backoff, sisa queue di-spill di sini
+            self._abandon.set()
+            thread.join(1.0)
+            self._spill(self._drain())
+            in_flight = self._in_flight
+            if thread.is_alive() and in_flight:
+                # Worker tertahan di request database; replay memakai upsert
+                # on id jadi spill ganda tidak membuat duplikat
+                self._spill(in_flight)
+            logger.warning("Write-behind stop timeout, sisa item ditulis ke %s", self.spill_path)
+        self._thread = None
+
+    def _drain(self) -> list[dict]:
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    # ---------------- Worker ---------------- #
+
+    def _run(self):
+        try:
+            self._replay_spill()
+        except Exception as e:
+            logger.error("Replay write-behind spill file gagal: %s", e)
+        while not self._abandon.is_set() and not (self._stop.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+            elif self._overflowed.is_set() and not self._stop.is_set():
+                # Queue sudah kosong lagi: item yang tadi di-spill karena penuh di-replay
+                self._overflowed.clear()
+                try:
+                    self._replay_spill()
+                except Exception as e:
+                    logger.error("Replay write-behind spill file gagal: %s", e)
+
+    def _collect(self) -> list[dict]:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: list[dict]):
+        transactions = [item["transaction"] for item in batch]
+        tickets = [row for item in batch for row in item["tickets"]]
+
+        start = time.perf_counter()
+        self._in_flight = batch
+        try:
+            for attempt in range(self.max_retries + 1):
+                if self._abandon.is_set():
+                    self._spill(batch)
+                    return
+                try:
+                    # Transactions dulu karena tickets punya FK ke transaction id
+                    transaction_model.upsert_transactions(transactions)
+                    if tickets:
+                        ticket_model.upsert_tickets(tickets)
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        logger.error("Write-behind flush failed after %d retries, spilling %d items: %s",
+                                     self.max_retries, len(batch), e)
+                        self._spill(batch)
+                        return
+                    self.retries += 1
+                    # wait() supaya stop() bisa membangunkan worker di tengah backoff
+                    self._abandon.wait(self.backoff * (2 ** attempt))
+        finally:
+            self._in_flight = None
+
+        latency = time.perf_counter() - start
+        self.flush_count += 1
+        self.flushed_transactions += len(transactions)
+        self.flushed_tickets += len(tickets)
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        self._total_flush_latency += latency
+
+    # ---------------- Spill file ---------------- #
+
+    @contextmanager
+    def _file_lock(self, suffix: str, blocking=True):
+        """flock pada <spill><suffix> (antar process); yield False jika non-blocking dan sedang dipegang."""
+        if fcntl is None:
+            yield True
+            return
+        with open(self.spill_path + suffix, "a") as lock_file:
+            flags = fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB)
+            try:
+                fcntl.flock(lock_file, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _spill(self, items: list[dict]):
+        if not items:
+            return
+        with self._spill_lock, self._file_lock(".lock"):
+            with open(self.spill_path, "a") as f:
+                for item in items:
+                    f.write(json.dumps(item, default=str) + "\n")
+            self.spilled += len(items)
+
+    def _replay_spill(self):
+        # Satu process saja yang me-replay; process lain akan menemukan sisanya nanti
+        with self._file_lock(".replay.lock", blocking=False) as acquired:
+            if not acquired:
+                return
+            with self._spill_lock, self._file_lock(".lock"):
+                if os.path.exists(self.spill_path):
+                    if os.path.exists(self.replay_path):
+                        # .replay sisa replay yang terputus: append, jangan ditimpa
+                        with open(self.spill_path) as src, open(self.replay_path, "a") as dst:
+                            dst.write(src.read())
+                        os.remove(self.spill_path)
+                    else:
+                        # Rename dulu supaya spill baru selama replay tidak ikut terhapus
+                        os.replace(self.spill_path, self.replay_path)
+            if not os.path.exists(self.replay_path):
+                return
+
+            batch = []
+            with open(self.replay_path) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        batch.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # Baris terpotong dari process yang mati saat menulis spill
+                        logger.error("Baris spill file rusak dilewati: %.200s", line)
+                        continue
+                    if len(batch) >= self.batch_size:
+                        self._flush(batch)
+                        batch = []
+            if batch:
+                self._flush(batch)
+            os.remove(self.replay_path)
+            logger.info("Replayed write-behind spill file %s", self.spill_path)
+
+    # ---------------- Metrics ---------------- #
+
+    def stats(self) -> dict:
+        return {
+            "mode": PERSISTENCE_MODE,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "flush_count": self.flush_count,
+            "flushed_transactions": self.flushed_transactions,
+            "flushed_tickets": self.flushed_tickets,
+            "retries": self.retries,
+            "spilled": self.spilled,
+            "last_flush_latency_ms": self.last_flush_latency * 1000,
+            "avg_flush_latency_ms": (self._total_flush_latency / self.flush_count * 1000) if self.flush_count else 0.0,
+            "max_flush_latency_ms": self.max_flush_latency * 1000,
+        }
+
+
+write_behind_queue = WriteBehindQueue(
+    max_size=int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("WRITE_BEHIND_FLUSH_MS", "50")) / 1000,
+    max_retries=int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "5")),
+    spill_path=SPILL_PATH,
+)
@@ -0,0 +1,55 @@
+import os
+import random
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+
+from ai_agents import chat_rag
+from ai_agents.markdown_stream import MarkdownStreamCleaner
+
+SAMPLE_ANSWER = (
+    "  \n## Ringkasan Anomali\nTotal **120** transaksi, *12* anomali 🚨.\n\n"
+    "### Detail\nChannel **mobile app** paling *banyak*.\n5 * 3 = 15 dan a*b\n#tag\n  "
+)
+
+
+def split_randomly(text, rng, max_cuts=12):
+    cuts = sorted(rng.sample(range(1, len(text)), rng.randint(0, max_cuts)))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+
+def test_cleaner_matches_clean_formatting_for_any_chunking():
+    rng = random.Random(0)
+    expected = chat_rag.clean_formatting(SAMPLE_ANSWER)
+    for _ in range(500):
+        cleaner = MarkdownStreamCleaner()
+        parts = split_randomly(SAMPLE_ANSWER, rng)
+        got = "".join(cleaner.feed(p) for p in parts) + cleaner.flush()
+        assert got == expected, parts
+
+
+def test_ask_stream_emits_retrieval_before_tokens(monkeypatch):
+    # Stub generator: chunk 8 karakter, masing-masing 10ms
+    def stub_generate(prompt):
+        for i in range(0, len(SAMPLE_ANSWER), 8):
+            time.sleep(0.01)
+            yield SAMPLE_ANSWER[i:i + 8]
+
+    docs = [{"id": 1, "content": "dokumen", "metadata": {}, "similarity": 0.9}]
+    monkeypatch.setattr(chat_rag.kb_version, "get", lambda: "test")
+    monkeypatch.setattr(chat_rag, "query_embedding", lambda q: [1.0, 0.0])
+    monkeypatch.setattr(chat_rag, "match_documents", lambda emb, top_k=5: docs)
+    monkeypatch.setattr(chat_rag, "get_realtime_stats", lambda: "")
+    monkeypatch.setattr(chat_rag, "generate_stream", stub_generate)
+    chat_rag.answer_cache.clear()
+
+    events = list(chat_rag.ask_stream("pertanyaan stream test"))
+    names = [e["event"] for e in events]
+    assert names[0] == "retrieval" and names[-1] == "done"
+    assert set(names[1:-1]) == {"token"} and len(names) > 3
+    assert "".join(e["data"]["text"] for e in events[1:-1]) == chat_rag.clean_formatting(SAMPLE_ANSWER)
+
+    done = events[-1]["data"]
+    # Token pertama keluar jauh sebelum generation selesai
+    assert done["first_token_ms"] < done["latency_ms"] / 2
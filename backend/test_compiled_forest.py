@@ -0,0 +1,52 @@
+import os
+import pickle
+import numpy as np
+from services.scalper_detector import CompiledForest, ScalperDetectorAPI
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "canomaly.pkl")
+
+
+def load_assets():
+    with open(MODEL_PATH, "rb") as f:
+        return pickle.load(f)
+
+
+def test_compiled_forest_parity():
+    # Score CompiledForest harus identik bit-for-bit dengan sklearn
+    model = load_assets()['model']
+    forest = CompiledForest.from_isolation_forest(model)
+
+    rng = np.random.default_rng(42)
+    X = rng.standard_normal((2000, model.n_features_in_)) * 3
+    X[::97, 2] = np.nan  # jalur missing value juga harus sama
+
+    assert np.array_equal(forest.score_samples(X), model.score_samples(X))
+    assert np.array_equal(forest.score_samples(X[:1]), model.score_samples(X[:1]))
+
+
+def test_detector_predict_parity():
+    # Hasil predict() sama dengan / tanpa engine compiled
+    assets = load_assets()
+    detector = ScalperDetectorAPI()
+    detector.model = assets['model']
+    detector.scaler = assets['scaler']
+    detector.feature_names = assets.get('feature_names', detector.feature_names)
+
+    rng = np.random.default_rng(7)
+    rows = [
+        dict(zip(detector.feature_names, detector.scaler.mean_ + detector.scaler.scale_ * rng.standard_normal(14)))
+        for _ in range(200)
+    ]
+
+    expected = detector.predict(rows)
+    detector.compile()
+    assert detector.predict(rows) == expected
+    single = detector.predict(rows[0])
+    assert single['score'] == expected[0]['score']
+    assert single['prediction'] == expected[0]['prediction']
+
+
+if __name__ == "__main__":
+    test_compiled_forest_parity()
+    test_detector_predict_parity()
+    print("Compiled forest parity OK")
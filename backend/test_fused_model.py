@@ -0,0 +1,125 @@
+import os
+import pickle
+import tempfile
+import numpy as np
+from services.scalper_detector import CompiledForest, ScalperDetectorAPI
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "canomaly.pkl")
+
+
+def load_detector() -> ScalperDetectorAPI:
+    with open(MODEL_PATH, "rb") as f:
+        assets = pickle.load(f)
+    detector = ScalperDetectorAPI()
+    detector.model = assets['model']
+    detector.scaler = assets['scaler']
+    detector.feature_names = assets.get('feature_names', detector.feature_names)
+    return detector
+
+
+def sample_rows(detector, n, seed=0):
+    rng = np.random.default_rng(seed)
+    mean, scale = detector.scaler.mean_, detector.scaler.scale_
+    return [dict(zip(detector.feature_names, mean + scale * rng.standard_normal(len(mean)) * 2)) for _ in range(n)]
+
+
+def test_fused_model_predictions():
+    # Fused model (tanpa scaler.transform) harus memberi prediksi yang sama
+    detector = load_detector()
+    rows = sample_rows(detector, 2000)
+    expected = detector.predict(rows)
+
+    detector.forest = CompiledForest.from_isolation_forest(detector.model).fuse_scaler(detector.scaler)
+    actual = detector.predict(rows)
+
+    assert [r['prediction'] for r in actual] == [r['prediction'] for r in expected]
+    assert np.allclose([r['score'] for r in actual], [r['score'] for r in expected], rtol=0, atol=1e-12)
+
+
+def test_fused_model_roundtrip():
+    # Artefak .npy (di-load dengan mmap) menghasilkan score yang sama dengan forest di memori
+    detector = load_detector()
+    forest = CompiledForest.from_isolation_forest(detector.model).fuse_scaler(detector.scaler)
+    X = detector.prepare_features(sample_rows(detector, 100, seed=1))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "canomaly.fused")
+        forest.save(path)
+        loaded = CompiledForest.load(path, mmap_mode='r')
+
+        assert loaded.fused and loaded.offset == forest.offset
+        assert np.array_equal(loaded.score_samples(X), forest.score_samples(X))
+
+
+
+def test_uncalibrated_risk_anchored_on_offset():
+    # Tanpa kalibrasi, semua yang di-flag anomaly (score < offset) minimal Medium
+    detector = load_detector()
+    detector.compile()
+    detector.score_quantiles = None
+    rows = sample_rows(detector, 2000, seed=1)
+    results = detector.predict(rows, columnar=True)
+    anomaly = results['is_scalper']
+    assert anomaly.any() and (~anomaly).any()
+    assert (results['risk_score'][anomaly] >= 30).all()
+    assert (results['risk_score'][~anomaly] < 30).all()
+    assert set(results['risk_level'][anomaly]) <= {"Medium", "High", "Critical"}
+    # Monoton: score lebih rendah -> risk lebih tinggi
+    order = np.argsort(results['score'])
+    assert (np.diff(results['risk_score'][order]) <= 1e-9).all()
+
+
+def test_reference_csv_calibrates_fused_artefact():
+    # pkl tanpa score_quantiles + <model>.reference.csv -> artefak fused terkalibrasi
+    import csv
+    import shutil
+    from services.model_service import load_detector as load_fused
+
+    detector = load_detector()
+    rows = sample_rows(detector, 500, seed=2)
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = os.path.join(tmp, "model.pkl")
+        shutil.copyfile(MODEL_PATH, model_path)
+        uncalibrated = load_fused(model_path)
+        assert uncalibrated.load_info['calibrated'] is False
+        assert not any(r['risk_calibrated'] for r in uncalibrated.predict(rows[:10]))
+
+        with open(os.path.join(tmp, "model.reference.csv"), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=detector.feature_names)
+            writer.writeheader()
+            writer.writerows(rows)
+        calibrated = load_fused(model_path)
+        assert calibrated.load_info['calibration'] == 'reference_csv'
+        results = calibrated.predict(rows, columnar=True)
+        assert results['risk_calibrated'].all()
+        # ECDF terhadap referensi: ~5% row referensi paling anomali berisiko >= 95
+        assert abs((results['risk_score'] >= 95).mean() - 0.05) < 0.01
+
+
+def test_fused_artefact_swap_keeps_path_resolvable():
+    # Rebuild mem-publish versi baru lewat swap symlink; path fused selalu ada
+    import shutil
+    from services.model_service import FUSED_KEEP_VERSIONS, build_fused_model, fused_dir
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = os.path.join(tmp, "model.pkl")
+        shutil.copyfile(MODEL_PATH, model_path)
+        target = fused_dir(model_path)
+        os.makedirs(target)  # artefak format lama: directory biasa
+
+        seen = []
+        for _ in range(4):
+            build_fused_model(model_path)
+            assert os.path.islink(target)
+            seen.append(os.path.realpath(target))
+            assert os.path.exists(os.path.join(target, "model.json"))
+        assert len(set(seen)) == 4
+        versions = [n for n in os.listdir(tmp) if n.startswith("model.fused.v")]
+        assert len(versions) == 1 + FUSED_KEEP_VERSIONS
+        assert os.path.basename(seen[-1]) in versions
+
+
+if __name__ == "__main__":
+    test_fused_model_predictions()
+    test_fused_model_roundtrip()
+    print("Fused model OK")
@@ -0,0 +1,93 @@
+import os
+import shutil
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+
+from services.model_registry import ModelRegistry
+from services.model_service import MODEL_PATH
+
+BASE_NS = 1_700_000_000 * 10 ** 9
+
+
+def put_model(path, seconds, ns=0):
+    """Copy model asli ke `path` dengan mtime tertentu (detik ke-`seconds` + ns)."""
+    shutil.copyfile(MODEL_PATH, path)
+    os.utime(path, ns=(BASE_NS + seconds * 10 ** 9 + ns,) * 2)
+    return str(path)
+
+
+def make_registry(tmp_path, **kwargs):
+    models_dir = tmp_path / "model_versions"
+    models_dir.mkdir(exist_ok=True)
+    options = dict(models_dir=str(models_dir), poll_interval=0,
+                   default_path=put_model(tmp_path / "default.pkl", 0), excluded=[])
+    options.update(kwargs)
+    return ModelRegistry(**options), models_dir
+
+
+def test_empty_dir_falls_back_to_default_path(tmp_path):
+    registry, _ = make_registry(tmp_path)
+    assert registry.active.path == str(tmp_path / "default.pkl")
+    assert registry.reload() is False
+
+
+def test_swap_keeps_in_flight_request_on_old_version_until_drained(tmp_path):
+    registry, models_dir = make_registry(tmp_path)
+    old = registry.active
+
+    with registry.acquire() as in_flight:
+        new_path = put_model(models_dir / "v2.pkl", 10)
+        assert registry.reload() is True
+        assert in_flight is old
+        assert registry.active.path == new_path
+        assert registry.status()["retired"] == [{"version": old.version, "in_flight": 1}]
+    assert registry.status()["retired"] == []
+
+    # File yang sama tidak di-load ulang
+    assert registry.reload() is False
+
+
+def test_rejected_file_is_retried_once_it_changes(tmp_path):
+    registry, models_dir = make_registry(tmp_path)
+    active = registry.active
+
+    # Copy belum selesai: isi terpotong, versi (detik) sama dengan file final
+    partial = models_dir / "v2.pkl"
+    with open(MODEL_PATH, "rb") as f:
+        partial.write_bytes(f.read(100))
+    os.utime(partial, ns=(BASE_NS + 10 * 10 ** 9,) * 2)
+    assert registry.reload() is False
+    assert registry.active is active
+    assert registry.status()["failed"] == ["v2-1700000010"]
+    assert registry.reload() is False
+
+    put_model(partial, 10, ns=500)
+    assert registry.reload() is True
+    assert registry.active.path == str(partial)
+
+
+def test_shadow_models_are_never_promoted(tmp_path):
+    shadow = tmp_path / "model_versions" / "challenger.pkl"
+    registry, models_dir = make_registry(tmp_path, excluded=[f" {shadow}"])
+    stable = put_model(models_dir / "v2.pkl", 10)
+    put_model(shadow, 20)
+
+    assert registry.active.path == stable
+    assert registry.reload() is False
+    assert registry.active.path == stable
+
+
+def test_failed_fingerprints_are_capped(tmp_path, monkeypatch):
+    from services import model_registry as registry_module
+
+    monkeypatch.setattr(registry_module, "MAX_FAILED", 3)
+    registry, models_dir = make_registry(tmp_path)
+    registry.active
+    broken = models_dir / "v2.pkl"
+    for i in range(5):
+        broken.write_bytes(b"not a pickle")
+        os.utime(broken, ns=(BASE_NS + (10 + i) * 10 ** 9,) * 2)
+        assert registry.reload() is False
+    assert registry.status()["failed"] == ["v2-1700000012", "v2-1700000013", "v2-1700000014"]
+    assert registry.status()["load_info"]["model_path"] == str(tmp_path / "default.pkl")
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import shutil
+import signal
+import threading
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+
+import pytest
+
+from services import process_scorer as process_scorer_module
+from services.model_registry import ModelRegistry
+from services.model_service import MODEL_PATH
+from services.process_scorer import ProcessPoolScorer
+
+FEATURES = {
+    "base_price": 200000, "final_price": 200000, "discount_amount": 0, "price_markup_ratio": 1.0,
+    "is_price_above_max": 0, "is_price_below_min": 0, "price_per_ticket": 100000, "num_tickets": 2,
+    "ticket_class_id": 1, "station_from_id": 1, "station_to_id": 2, "payment_method_id": 1,
+    "booking_channel_id": 1, "is_refund": 0, "is_popular_route": 1,
+}
+
+
+@pytest.fixture
+def scorer(tmp_path, monkeypatch):
+    models_dir = tmp_path / "model_versions"
+    models_dir.mkdir()
+    shutil.copyfile(MODEL_PATH, tmp_path / "default.pkl")
+    registry = ModelRegistry(models_dir=str(models_dir), poll_interval=0,
+                             default_path=str(tmp_path / "default.pkl"), excluded=[])
+    monkeypatch.setattr(process_scorer_module, "model_registry", registry)
+
+    scorer = ProcessPoolScorer(max_workers=1)
+    spawned_on = []
+    spawn = scorer._spawn
+
+    def record_spawn(model):
+        spawned_on.append(threading.current_thread())
+        return spawn(model)
+
+    monkeypatch.setattr(scorer, "_spawn", record_spawn)
+    scorer.start()
+    scorer.registry, scorer.models_dir, scorer.spawned_on = registry, models_dir, spawned_on
+    yield scorer
+    scorer.stop()
+
+
+def kill_workers(scorer):
+    for pid in list(scorer._state.pool._processes):
+        os.kill(pid, signal.SIGKILL)
+
+
+def test_predict_recovers_from_dead_worker(scorer):
+    expected = scorer.predict(FEATURES)
+    kill_workers(scorer)
+    assert scorer.predict(FEATURES) == expected
+    assert scorer.stats()["rebuilds"] == 1
+
+
+def test_predict_async_rebuilds_off_event_loop(scorer):
+    expected = scorer.predict(FEATURES)
+    del scorer.spawned_on[:]
+    kill_workers(scorer)
+
+    async def main():
+        loop_thread = threading.current_thread()
+        result = await scorer.predict_async(FEATURES)
+        return loop_thread, result
+
+    loop_thread, result = asyncio.run(main())
+    assert result == expected
+    assert scorer.stats()["rebuilds"] == 1
+    assert len(scorer.spawned_on) == 1 and loop_thread not in scorer.spawned_on
+
+
+def test_registry_swap_rebuilds_pool_eagerly(scorer):
+    old_state = scorer._state
+    new_path = scorer.models_dir / "v2.pkl"
+    shutil.copyfile(MODEL_PATH, new_path)
+    assert scorer.registry.reload() is True
+
+    # Listener sudah membangun pool versi baru sebelum request berikutnya
+    assert scorer._state is not old_state
+    assert scorer._state.version == scorer.registry.active.version
+    assert scorer.predict(FEATURES)["model_version"] == scorer.registry.active.version
+    assert old_state.slots is None
+
+
+def test_hot_reload_between_state_read_and_submit(scorer, monkeypatch):
+    old_state = scorer._state
+    prepare = old_state.detector.prepare_features
+
+    def prepare_then_reload(features):
+        # Hot reload tepat setelah request membaca state, sebelum pool.submit
+        shutil.copyfile(MODEL_PATH, scorer.models_dir / "v2.pkl")
+        assert scorer.registry.reload() is True
+        return prepare(features)
+
+    monkeypatch.setattr(old_state.detector, "prepare_features", prepare_then_reload)
+    result = scorer.predict(FEATURES)
+    assert result["model_version"] == old_state.version
+    assert scorer._state is not old_state and old_state.slots is None
+    assert scorer.predict(FEATURES)["model_version"] == scorer.registry.active.version
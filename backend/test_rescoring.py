@@ -0,0 +1,177 @@
+import os
+import random
+import uuid
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+
+import pytest
+
+from benchmarks.fake_supabase import FakeSupabaseClient
+from controllers.ticket_controller import build_ticket_rows, build_transaction_row, calculate_ticket_features
+from schema.ticket_schema import TicketCreate
+from services import rescoring
+from services.model_service import MODEL_PATH, load_detector
+
+N_ROWS = 12000
+
+
+def make_ticket(rng, i):
+    num_tickets = rng.randint(1, 6)
+    # Sebagian pesanan tanpa seat (tidak ada row tickets)
+    seats = [f"{s}A" for s in range(num_tickets)] if rng.random() < 0.8 else None
+    return TicketCreate(
+        transaction_id=uuid.uuid4(), user_id=f"user-{i % 50}", price=rng.uniform(5e4, 9e5),
+        num_tickets=num_tickets, station_from_id=rng.randint(1, 5), station_to_id=rng.randint(1, 5),
+        payment_method_id=rng.randint(1, 3), booking_channel_id=rng.randint(1, 3),
+        is_refund=int(rng.random() < 0.1), transaction_time="2025-01-01T08:00:00",
+        ticket_class_id=rng.randint(1, 3), discount_amount=rng.choice([0, 0, 20000, 45000]),
+        is_popular_route=int(rng.random() < 0.5), seat_number=seats,
+    )
+
+
+def make_transactions(n, seed=0):
+    """Row transactions (+ embed tickets) persis seperti yang ditulis buy_ticket."""
+    rng = random.Random(seed)
+    detector = load_detector(MODEL_PATH)
+    tickets = [make_ticket(rng, i) for i in range(n)]
+    features = [calculate_ticket_features(t) for t in tickets]
+    results = detector.predict([{k: f[k] for k in rescoring.TRANSACTION_FEATURES} for f in features])
+
+    rows = {}
+    for ticket, ticket_features, result in zip(tickets, features, results):
+        row = build_transaction_row(ticket, str(uuid.uuid4()), result)
+        row["id"] = str(uuid.UUID(int=rng.getrandbits(128)))
+        row["tickets"] = [
+            {"ticket_class_id": t["ticket_class_id"], "discount_amount": t["discount_amount"]}
+            for t in build_ticket_rows(ticket, row["id"], ticket_features)
+        ]
+        rows[row["id"]] = row
+    return rows, dict(zip([r["id"] for r in rows.values()], features))
+
+
+@pytest.fixture(scope="module")
+def transactions():
+    return make_transactions(N_ROWS)
+
+
+@pytest.fixture
+def db(transactions, monkeypatch):
+    rows, _ = transactions
+    client = FakeSupabaseClient({"transactions": {k: dict(v) for k, v in rows.items()}})
+    monkeypatch.setattr(rescoring, "supabase", client)
+    return client
+
+
+def rescore(tmp_path, **kwargs):
+    options = dict(workers=0, chunk_size=2500, checkpoint_path=str(tmp_path / "checkpoint.json"))
+    options.update(kwargs)
+    return rescoring.rescore(**options)
+
+
+def stale(db, n, seed=1):
+    """Ubah score n row seolah di-score model lama; kembalikan id-nya."""
+    rng = random.Random(seed)
+    ids = rng.sample(sorted(db.tables["transactions"]), n)
+    for txn_id in ids:
+        db.tables["transactions"][txn_id]["anomaly_score"] += 5.0
+    return ids
+
+
+def test_features_match_live_path(transactions):
+    rows, features = transactions
+    for row in rows.values():
+        expected = {k: features[row["id"]][k] for k in rescoring.TRANSACTION_FEATURES}
+        assert rescoring.transaction_features(row) == pytest.approx(expected)
+
+        # Row sebelum kelas/diskon disimpan: fallback ke row tickets (diskon per tiket x num_tickets)
+        legacy = {k: v for k, v in row.items() if k not in ("ticket_class_id", "discount_amount")}
+        if row["tickets"]:
+            assert rescoring.transaction_features(legacy) == pytest.approx(expected)
+        else:
+            assert rescoring.transaction_features(legacy) is None
+
+
+def test_rescore_updates_only_changed_rows(tmp_path, db):
+    summary = rescore(tmp_path)
+    assert summary["rows"] == N_ROWS and summary["skipped"] == 0
+    assert summary["changed"] == 0
+
+    stale(db, 300)
+    summary = rescore(tmp_path, restart=True)
+    assert summary["changed"] == 300
+    assert db.calls[("transactions", "update")] == 300
+    assert ("transactions", "upsert") not in db.calls
+    assert rescore(tmp_path, restart=True)["changed"] == 0
+
+
+def test_rescore_does_not_overwrite_concurrent_changes(tmp_path, db, monkeypatch):
+    ids = stale(db, 50)
+    fetch = rescoring.fetch_transactions
+
+    def fetch_then_refund(*args, **kwargs):
+        for rows in fetch(*args, **kwargs):
+            # Refund terjadi setelah scan, sebelum hasil rescoring ditulis
+            for row in rows:
+                if row["id"] in ids:
+                    db.tables["transactions"][row["id"]] = {**row, "is_refund": 1, "status_id": 3}
+            yield rows
+
+    monkeypatch.setattr(rescoring, "fetch_transactions", fetch_then_refund)
+    assert rescore(tmp_path)["changed"] == 50
+    for txn_id in ids:
+        row = db.tables["transactions"][txn_id]
+        assert row["is_refund"] == 1 and row["status_id"] == 3
+
+
+def test_rescore_resumes_from_checkpoint(tmp_path, db, monkeypatch):
+    stale(db, 1000)
+    write_changes = rescoring.write_changes
+    calls = []
+
+    def interrupted(rows, changes):
+        calls.append(len(rows))
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return write_changes(rows, changes)
+
+    monkeypatch.setattr(rescoring, "write_changes", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        rescore(tmp_path)
+    monkeypatch.setattr(rescoring, "write_changes", write_changes)
+
+    summary = rescore(tmp_path)
+    assert summary["rows"] == N_ROWS - 2 * 2500
+    assert rescore(tmp_path, restart=True)["changed"] == 0
+
+
+def test_rows_without_stored_inputs_are_skipped(tmp_path, db):
+    rows = sorted(db.tables["transactions"].values(), key=lambda r: r["id"])
+    legacy = [r for r in rows if not r["tickets"]][:100]
+    for row in legacy:
+        row.update(ticket_class_id=None, discount_amount=None)
+    for row in rows[-50:]:
+        row["is_popular_route"] = None
+    for row in legacy + rows[-50:]:
+        row["anomaly_score"] += 5.0
+    untouched = {row["id"]: dict(row) for row in legacy + rows[-50:]}
+
+    summary = rescore(tmp_path)
+    assert summary["skipped"] == len(untouched)
+    assert summary["rows"] == N_ROWS and summary["changed"] == 0
+    for row_id, before in untouched.items():
+        assert db.tables["transactions"][row_id] == before
+
+
+def test_unknown_feature_names_fail_fast(tmp_path, db, monkeypatch):
+    load = rescoring.load_detector
+
+    def with_velocity(path):
+        detector = load(path)
+        detector.feature_names = detector.feature_names + ["user_txn_count_1h"]
+        return detector
+
+    monkeypatch.setattr(rescoring, "load_detector", with_velocity)
+    with pytest.raises(ValueError, match="user_txn_count_1h"):
+        rescore(tmp_path)
+    assert ("transactions", "select") not in db.calls
@@ -0,0 +1,62 @@
+import os
+import threading
+import uuid
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+
+import pytest
+
+from benchmarks.fake_supabase import FakeSupabaseClient
+from services import stats_service
+from services.stats_service import TransactionStats
+
+
+def make_rows(levels):
+    rows = {}
+    for level in levels:
+        txn_id = str(uuid.uuid4())
+        rows[txn_id] = {"id": txn_id, "risk_level": level, "fraud_flag": int(level in ("High", "Critical"))}
+    return rows
+
+
+@pytest.fixture
+def db(monkeypatch):
+    client = FakeSupabaseClient({"transactions": make_rows(["Low"] * 5 + ["Medium"] * 3 + ["Critical"] * 2 + [None])})
+    monkeypatch.setattr(stats_service, "supabase", client)
+    return client
+
+
+def test_snapshot_never_queries_on_request_path(db, monkeypatch):
+    stats = TransactionStats(max_staleness=0)
+    started = threading.Event()
+    release = threading.Event()
+    reconcile = stats.reconcile
+
+    def slow_reconcile():
+        started.set()
+        release.wait(5)
+        reconcile()
+
+    monkeypatch.setattr(stats, "reconcile", slow_reconcile)
+    snapshot = stats.snapshot()
+    assert started.wait(5)
+    # Reconcile masih berjalan di background; snapshot tetap langsung kembali
+    assert snapshot["total"] == 0 and snapshot["stale"] is True
+    stats.snapshot()
+    assert ("transactions", "select") not in db.calls
+
+    release.set()
+    for thread in threading.enumerate():
+        if thread.name == "stats-reconcile-once":
+            thread.join(5)
+    assert stats.snapshot()["total"] == 11
+
+
+def test_severity_uses_stored_risk_level(db):
+    stats = TransactionStats()
+    stats.reconcile()
+    snapshot = stats.snapshot()
+    assert snapshot["total"] == 11 and snapshot["anomaly"] == 2
+    assert snapshot["severity"] == {"low": 5, "medium": 3, "high": 0, "critical": 2}
+    assert snapshot["unclassified"] == 1 and snapshot["stale"] is False
@@ -0,0 +1,56 @@
+import os
+import uuid
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+
+import pytest
+
+from benchmarks.fake_supabase import FakeSupabaseClient
+from controllers import ticket_controller
+from models import profile_model, ticket_model, transaction_model
+from schema.ticket_schema import TicketCreate
+
+
+def make_ticket(i):
+    return TicketCreate(
+        transaction_id=uuid.uuid4(), user_id=f"user-{i % 3}", price=200000, num_tickets=2,
+        station_from_id=1, station_to_id=2, payment_method_id=1, booking_channel_id=1,
+        is_refund=0, transaction_time="2025-01-01T08:00:00", is_popular_route=1,
+        price_category=1, tickets_category=1, seat_number=["1A", "1B"],
+    )
+
+
+@pytest.fixture
+def db(monkeypatch):
+    client = FakeSupabaseClient()
+    for module in (profile_model, ticket_model, transaction_model):
+        monkeypatch.setattr(module, "supabase", client)
+    monkeypatch.setattr(ticket_controller, "PERSISTENCE_MODE", "sync")
+    monkeypatch.setattr(ticket_controller, "INSERT_CHUNK", 4)
+    return client
+
+
+def test_batch_writes_all_rows(db):
+    responses = ticket_controller.buy_tickets_batch([make_ticket(i) for i in range(10)])
+    assert len(responses) == 10
+    assert len(db.tables["transactions"]) == 10 and len(db.tables["tickets"]) == 20
+
+
+@pytest.mark.parametrize("fail_on", ["transactions", "tickets"])
+def test_failed_chunk_rolls_back_written_rows(db, monkeypatch, fail_on):
+    module, name = (transaction_model, "create_transactions") if fail_on == "transactions" else (ticket_model, "create_tickets")
+    create = getattr(module, name)
+    calls = []
+
+    def fail_second_chunk(rows):
+        calls.append(len(rows))
+        if len(calls) == 2:
+            raise RuntimeError("insert gagal")
+        return create(rows)
+
+    monkeypatch.setattr(module, name, fail_second_chunk)
+    with pytest.raises(RuntimeError, match="insert gagal"):
+        ticket_controller.buy_tickets_batch([make_ticket(i) for i in range(10)])
+    assert db.tables["transactions"] == {}
+    assert db.tables.get("tickets", {}) == {}
@@ -0,0 +1,37 @@
+import base64
+import json
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+
+import pytest
+
+from controllers.ticket_controller import decode_cursor, encode_cursor
+
+TICKET_ID = "1b4e28ba-2fa1-11d2-883f-0016d3cca427"
+
+
+def make_cursor(created_at, ticket_id):
+    return base64.urlsafe_b64encode(json.dumps([created_at, ticket_id]).encode()).decode()
+
+
+def test_cursor_round_trip():
+    row = {"created_at": "2025-01-01T08:00:00.123456+00:00", "id": TICKET_ID}
+    assert decode_cursor(encode_cursor(row)) == (row["created_at"], TICKET_ID)
+
+
+@pytest.mark.parametrize("created_at, ticket_id", [
+    ('2025-01-01",id.gt.0,status_id.eq."1', TICKET_ID),
+    ("2025-01-01T08:00:00", "1),or(id.gt.0"),
+    (["2025-01-01"], TICKET_ID),
+    (None, TICKET_ID),
+])
+def test_crafted_cursor_rejected(created_at, ticket_id):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(make_cursor(created_at, ticket_id))
+
+
+def test_garbage_cursor_rejected():
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor("not-base64!!")
@@ -0,0 +1,56 @@
+import csv
+import os
+import random
+from datetime import datetime, timedelta
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+
+from services.feature_store import VELOCITY_FEATURE_NAMES, VelocityFeatureStore
+from services.model_registry import ModelVersion
+from services.model_service import load_detector, train_model
+from services.scalper_detector import ScalperDetectorAPI
+
+BASE_FEATURES = ScalperDetectorAPI().feature_names
+
+
+def write_history(path, n=600, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, 8)
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=BASE_FEATURES + ["user_id", "device_id", "ip_id", "transaction_time"])
+        writer.writeheader()
+        for i in range(n):
+            row = {name: rng.randint(0, 3) for name in BASE_FEATURES}
+            row.update(final_price=rng.uniform(8e4, 4e5), base_price=100000, num_tickets=rng.randint(1, 6))
+            # Satu user bot: banyak transaksi beruntun dari device yang sama
+            bot = i % 10 == 0
+            row.update(
+                user_id="bot" if bot else f"user-{rng.randint(1, 200)}",
+                device_id="bot-device" if bot else f"device-{rng.randint(1, 200)}",
+                ip_id="" if i % 7 == 0 else f"10.0.0.{rng.randint(1, 50)}",
+                transaction_time=(start + timedelta(seconds=30 * i)).isoformat(),
+            )
+            writer.writerow(row)
+
+
+def test_train_model_with_velocity_features(tmp_path):
+    history = tmp_path / "history.csv"
+    model_path = str(tmp_path / "velocity.pkl")
+    write_history(history)
+    train_model(str(history), model_path)
+
+    detector = load_detector(model_path)
+    assert detector.feature_names == BASE_FEATURES + VELOCITY_FEATURE_NAMES
+    assert detector.load_info["calibration"] == "pkl"
+    assert ModelVersion("v", model_path, detector).uses_velocity
+
+    store = VelocityFeatureStore()
+    normal = {name: 1 for name in BASE_FEATURES}
+    normal.update(final_price=120000, base_price=100000, num_tickets=2)
+    quiet = detector.predict({**normal, **store.observe("u1", "d1", "ip1", 2, (1, 2), now=0)})
+    for t in range(60):
+        velocity = store.observe("bot", "bot-device", "ip9", 6, (1, t % 5), now=t)
+    burst = detector.predict({**normal, **velocity})
+    assert burst["risk_calibrated"] and quiet["risk_calibrated"]
+    assert burst["score"] < quiet["score"]
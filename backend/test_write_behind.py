@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+
+from services import write_behind
+from services.write_behind import WriteBehindQueue
+
+
+class FakeDatabase:
+    """Pengganti upsert_transactions/upsert_tickets; gagal `failures` kali pertama."""
+
+    def __init__(self, monkeypatch, failures=0, delay=0.0):
+        self.failures = failures
+        self.delay = delay
+        self.transactions = {}
+        self.tickets = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+        monkeypatch.setattr(write_behind.transaction_model, "upsert_transactions", self.upsert_transactions)
+        monkeypatch.setattr(write_behind.ticket_model, "upsert_tickets", self.upsert_tickets)
+
+    def upsert_transactions(self, rows):
+        time.sleep(self.delay)
+        with self._lock:
+            self.calls += 1
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("database down")
+            self.transactions.update((row["id"], row) for row in rows)
+
+    def upsert_tickets(self, rows):
+        self.tickets.update((row["id"], row) for row in rows)
+
+
+def make_queue(tmp_path, **kwargs):
+    options = dict(batch_size=10, flush_interval=0.01, max_retries=3, backoff=0.01,
+                   spill_path=str(tmp_path / "spill.jsonl"))
+    options.update(kwargs)
+    return WriteBehindQueue(**options)
+
+
+def submit(wb, n, start=0):
+    for i in range(start, start + n):
+        wb.submit({"id": f"trx-{i}"}, [{"id": f"ticket-{i}", "transaction_id": f"trx-{i}"}])
+
+
+def spilled_ids(wb):
+    if not os.path.exists(wb.spill_path):
+        return set()
+    with open(wb.spill_path) as f:
+        return {json.loads(line)["transaction"]["id"] for line in f if line.strip()}
+
+
+def test_flush_retries_then_succeeds(tmp_path, monkeypatch):
+    db = FakeDatabase(monkeypatch, failures=2)
+    wb = make_queue(tmp_path)
+    wb.start()
+    submit(wb, 25)
+    wb.stop()
+    assert len(db.transactions) == 25 and len(db.tickets) == 25
+    assert wb.retries == 2
+    assert not os.path.exists(wb.spill_path)
+
+
+def test_spill_after_retries_and_replay_on_start(tmp_path, monkeypatch):
+    db = FakeDatabase(monkeypatch, failures=10 ** 6)
+    wb = make_queue(tmp_path, max_retries=1)
+    wb.start()
+    submit(wb, 15)
+    wb.stop()
+    assert db.transactions == {}
+    assert spilled_ids(wb) == {f"trx-{i}" for i in range(15)}
+
+    db.failures = 0
+    wb = make_queue(tmp_path)
+    wb.start()
+    wb.stop()
+    assert set(db.transactions) == {f"trx-{i}" for i in range(15)}
+    assert not os.path.exists(wb.spill_path)
+    assert not os.path.exists(wb.spill_path + ".replay")
+
+
+def test_stop_timeout_spills_everything_left(tmp_path, monkeypatch):
+    # Database down dengan backoff panjang: stop() tidak boleh kehilangan item
+    db = FakeDatabase(monkeypatch, failures=10 ** 6)
+    wb = make_queue(tmp_path, max_retries=5, backoff=5.0)
+    wb.start()
+    submit(wb, 40)
+    time.sleep(0.1)
+    started = time.perf_counter()
+    wb.stop(timeout=0.2)
+    assert time.perf_counter() - started < 3
+    assert spilled_ids(wb) | set(db.transactions) == {f"trx-{i}" for i in range(40)}
+
+
+def test_start_does_not_block_on_replay(tmp_path, monkeypatch):
+    FakeDatabase(monkeypatch, failures=10 ** 6, delay=0.05)
+    wb = make_queue(tmp_path, max_retries=5, backoff=1.0)
+    with open(wb.spill_path, "w") as f:
+        for i in range(30):
+            f.write(json.dumps({"transaction": {"id": f"trx-{i}"}, "tickets": []}) + "\n")
+
+    started = time.perf_counter()
+    wb.start()
+    assert time.perf_counter() - started < 0.5
+    wb.stop(timeout=0.2)
+    assert spilled_ids(wb) == {f"trx-{i}" for i in range(30)}
+
+
+def write_spill(path, ids):
+    with open(path, "a") as f:
+        for i in ids:
+            f.write(json.dumps({"transaction": {"id": f"trx-{i}"}, "tickets": []}) + "\n")
+
+
+def test_leftover_replay_file_is_not_lost(tmp_path, monkeypatch):
+    # Process sebelumnya mati di tengah replay, lalu spill baru masuk
+    db = FakeDatabase(monkeypatch)
+    wb = make_queue(tmp_path)
+    write_spill(wb.replay_path, range(10))
+    write_spill(wb.spill_path, range(10, 20))
+
+    wb.start()
+    wb.stop()
+    assert set(db.transactions) == {f"trx-{i}" for i in range(20)}
+    assert not os.path.exists(wb.spill_path)
+    assert not os.path.exists(wb.replay_path)
+
+
+def test_overflow_spill_replayed_once_queue_drains(tmp_path, monkeypatch):
+    db = FakeDatabase(monkeypatch, delay=0.05)
+    wb = make_queue(tmp_path, max_size=5, batch_size=5)
+    wb.start()
+    submit(wb, 40)
+    assert spilled_ids(wb)
+
+    deadline = time.monotonic() + 5
+    while len(db.transactions) < 40 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    # Di-replay tanpa menunggu restart
+    assert set(db.transactions) == {f"trx-{i}" for i in range(40)}
+    wb.stop()
+    assert not os.path.exists(wb.spill_path)
+
+
+def test_spill_path_is_absolute(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    wb = WriteBehindQueue(spill_path="spill.jsonl")
+    assert wb.spill_path == str(tmp_path / "spill.jsonl")